@@ -0,0 +1,99 @@
+import os
+import gzip
+import hashlib
+import mimetypes
+import threading
+from app.utils import BUILD_DIR
+
+ASSET_DIR = os.path.join(BUILD_DIR, ".static")
+# Files of static/ served under fingerprinted /assets/ URLs
+ASSET_FILES = ("script.js", "style.css", "help.md")
+# Served with a far-future lifetime: a changed file gets a new URL
+IMMUTABLE = "public, max-age=31536000, immutable"
+# Precompressed variants in order of preference: (Accept-Encoding token, suffix)
+ENCODINGS = (("br", ".br"), ("gzip", ".gz"))
+
+def _brotli():
+    try:
+        import brotli
+        return brotli
+    except ImportError:
+        return None # Only gzip variants are generated
+
+def _fingerprinted(name, digest):
+    stem, ext = os.path.splitext(name)
+    return f"{stem}.{digest[:12]}{ext}"
+
+class AssetStore:
+    """Fingerprinted, precompressed copies of the web UI's static files.
+
+    Each file is copied to build/.static/<stem>.<hash><ext> with .gz (and
+    .br when the brotli package is installed) variants next to it. Sources
+    are re-checked by mtime on lookup, so an edited file gets a new URL
+    without a restart.
+    """
+
+    def __init__(self, static_folder, out_dir=ASSET_DIR, names=ASSET_FILES):
+        self.static_folder = static_folder
+        self.out_dir = os.path.abspath(out_dir)
+        self.names = names
+        self.built = {} # name -> (mtime_ns, size, fingerprinted name)
+        self.served = {} # fingerprinted name -> name
+        self.lock = threading.Lock()
+
+    def build(self):
+        """Fingerprint and compress every asset, run once at startup"""
+        for name in self.names:
+            self.url(name)
+
+    def _build(self, name):
+        with open(os.path.join(self.static_folder, name), 'rb') as f:
+            data = f.read()
+        target = _fingerprinted(name, hashlib.sha256(data).hexdigest())
+        path = os.path.join(self.out_dir, target)
+        os.makedirs(self.out_dir, exist_ok=True)
+        if not os.path.exists(path):
+            variants = [("", data), (".gz", gzip.compress(data, compresslevel=9, mtime=0))]
+            brotli = _brotli()
+            if brotli:
+                variants.append((".br", brotli.compress(data, quality=11)))
+            # The plain copy is written last, its presence means the set is complete
+            for suffix, content in reversed(variants):
+                tmp = f"{path}{suffix}.tmp{os.getpid()}"
+                with open(tmp, 'wb') as f:
+                    f.write(content)
+                os.replace(tmp, path + suffix)
+        return target
+
+    def url(self, name):
+        """/assets/ URL of a static file, or its plain /static/ URL if it isn't an asset"""
+        if name not in self.names:
+            return f"/static/{name}"
+        try:
+            st = os.stat(os.path.join(self.static_folder, name))
+        except OSError:
+            return f"/static/{name}"
+        with self.lock:
+            entry = self.built.get(name)
+            if not entry or entry[:2] != (st.st_mtime_ns, st.st_size):
+                # Earlier fingerprints stay served for pages rendered before the edit
+                target = self._build(name)
+                self.built[name] = (st.st_mtime_ns, st.st_size, target)
+                self.served[target] = name
+                entry = self.built[name]
+        return f"/assets/{entry[2]}"
+
+    def lookup(self, target, accept_encodings):
+        """(path, mimetype, content encoding or None) of a fingerprinted file, or None if unknown"""
+        with self.lock:
+            name = self.served.get(target)
+        if name is None:
+            return None
+        path = os.path.join(self.out_dir, target)
+        mimetype = mimetypes.guess_type(name)[0] or "text/plain"
+        if name.endswith(".md"):
+            mimetype = "text/markdown"
+        for token, suffix in ENCODINGS:
+            if accept_encodings[token] and os.path.exists(path + suffix):
+                return path + suffix, mimetype, token
+        return path, mimetype, None
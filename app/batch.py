@@ -0,0 +1,145 @@
+import os
+import csv
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from app.utils import BUILD_DIR, TESTS_DIR
+from app.config import get_jobs, get_problem_spec
+from app.runner import prepare_problem, submit_cases, collect_cases
+from app.results import count_cases
+
+# Per-student binaries and score files live under build/batch/<student>
+BATCH_BUILD_DIR = os.path.join(BUILD_DIR, "batch")
+
+RESULT_FIELDS = ["student", "problem", "status", "score", "total_points", "passed", "total", "max_wall_ms", "max_cpu_ms", "max_peak_rss_kb"]
+
+def load_submissions(path):
+    """List of (student, src_dir) from a directory of submissions or a manifest file.
+
+    A directory holds one sub-directory per student; its src/ folder is used
+    when present, otherwise the sub-directory itself. A manifest lists one
+    submission path per line (`student<TAB>path` to set the name), relative
+    paths are resolved against the manifest's directory.
+    """
+    entries = []
+    if os.path.isdir(path):
+        with os.scandir(path) as it:
+            for entry in it:
+                if entry.is_dir() and not entry.name.startswith('.'):
+                    entries.append((entry.name, entry.path))
+    else:
+        base = os.path.dirname(os.path.abspath(path))
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                line = line.strip()
+                if not line or line.startswith('#'):
+                    continue
+                if '\t' in line:
+                    student, root = [x.strip() for x in line.split('\t', 1)]
+                else:
+                    root = line
+                    student = os.path.basename(os.path.normpath(root))
+                entries.append((student, os.path.join(base, root)))
+
+    submissions = []
+    for student, root in sorted(entries):
+        src_dir = os.path.join(root, "src")
+        submissions.append((student, src_dir if os.path.isdir(src_dir) else root))
+    return submissions
+
+def batch_problems(config):
+    """Problems every submission is graded on: the configured ones, else every tests/ folder"""
+    problems = config.get('problems')
+    if isinstance(problems, dict) and problems:
+        return sorted(problems)
+    if not os.path.isdir(TESTS_DIR):
+        return []
+    return sorted(d for d in os.listdir(TESTS_DIR) if os.path.isdir(os.path.join(TESTS_DIR, d)))
+
+def _result_row(config, student, prob, result):
+    fail_count, score, total_points, details = result
+    passed, total = count_cases(details)
+    if details and details[0]["case"] == "Compilation":
+        status = "compile_error"
+    elif details and details[0]["case"] == "Keyword Check":
+        status = "keyword_violation"
+    elif not details:
+        status = "no_source" if total_points == 0 and fail_count == 0 else "no_tests"
+    elif fail_count:
+        status = "failed"
+    else:
+        status = "passed"
+    def peak(key):
+        values = [d[key] for d in details if d.get(key) is not None]
+        return max(values) if values else None
+    
+    if status == "no_source":
+        total_points = get_problem_spec(config, prob).points # Missing work still counts against the total
+    return {
+        "student": student,
+        "problem": prob,
+        "status": status,
+        "score": score,
+        "total_points": total_points,
+        "passed": passed,
+        "total": total,
+        "max_wall_ms": peak("wall_ms"),
+        "max_cpu_ms": peak("cpu_ms"),
+        "max_peak_rss_kb": peak("peak_rss_kb"),
+    }
+
+def grade_batch(submissions, problems, config, jobs=None, force=False, fail_fast=None):
+    """Grade every (student, problem) pair on one shared compile pool and case pool.
+
+    Yields result rows grouped by student, in submission order. Identical
+    sources (and every problem's tests / expected digests) are shared across
+    students through the compile cache and the test manifest.
+    """
+    jobs = get_jobs(config, jobs)
+
+    # Compiles and cases both take a slot, at most `jobs` of them run at once
+    cpu_slots = threading.Semaphore(jobs)
+
+    # compile_pool is shut down first, it is the only one feeding case_pool
+    with ThreadPoolExecutor(max_workers=jobs) as case_pool, \
+         ThreadPoolExecutor(max_workers=jobs) as compile_pool:
+
+        def stage(student, src_dir, prob):
+            build_dir = os.path.join(BATCH_BUILD_DIR, student)
+            plan, result = prepare_problem(prob, config, capture_logs=True, src_dir=src_dir, build_dir=build_dir, submission=student, fail_fast=fail_fast, cpu_slots=cpu_slots)
+            futures = submit_cases(plan, case_pool, force=force) if plan else None
+            return plan, result, futures
+
+        staged = [
+            (student, prob, compile_pool.submit(stage, student, src_dir, prob))
+            for student, src_dir in submissions
+            for prob in problems
+        ]
+
+        for student, prob, future in staged:
+            plan, result, futures = future.result()
+            if result is None:
+                result = collect_cases(plan, futures, capture_logs=True)
+            yield _result_row(config, student, prob, result)
+
+def open_writer(path, fmt=None):
+    """Return (write_row, close) for a JSONL or CSV results file, picked by fmt or extension"""
+    if fmt is None:
+        fmt = "csv" if path.lower().endswith(".csv") else "jsonl"
+    parent = os.path.dirname(path)
+    if parent:
+        os.makedirs(parent, exist_ok=True)
+    f = open(path, 'w', encoding='utf-8', newline='')
+
+    if fmt == "csv":
+        writer = csv.DictWriter(f, fieldnames=RESULT_FIELDS)
+        writer.writeheader()
+        write = writer.writerow
+    else:
+        def write(row):
+            f.write(json.dumps(row, ensure_ascii=False) + "\n")
+
+    def write_row(row):
+        write(row)
+        f.flush() # Rows of finished students survive an interrupted run
+    return write_row, f.close
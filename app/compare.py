@@ -0,0 +1,393 @@
+import os
+import re
+import math
+import hashlib
+import threading
+from app.fixtures import open_fixture, split_ref
+
+# Outputs are compared in chunks of this size, whatever their total size
+CHUNK_SIZE = 64 * 1024
+# Failing outputs are only kept up to this size for display
+PREVIEW_LIMIT = 1024 * 1024
+# Expected / got text kept with a FAIL verdict, the diff window shows the rest
+FAIL_PREVIEW_LIMIT = 4096
+# Appended to a preview that stops before the end of its file
+TRUNCATION_MARKER = "\n... (output truncated)"
+# Lines shown around the first mismatch, and characters kept of each
+DIFF_CONTEXT = 3
+DIFF_WIDTH = 200
+WHITESPACE = b" \t\n\r\x0b\x0c"
+TOKEN_RE = re.compile(rb"[^ \t\n\r\x0b\x0c]+")
+DEFAULT_EPS = 1e-6
+
+# Digest of each expected output per (path, member, mtime, size, digest kind)
+_expected_digests = {}
+_digest_lock = threading.Lock()
+
+def normalized_chunks(f, chunk_size=CHUNK_SIZE):
+    """Yield the bytes of a binary file with CRLF/CR turned into LF and
+    leading/trailing whitespace removed, i.e. a streaming `.strip()`."""
+    started = False
+    pending = b""  # whitespace held back until we know more content follows
+    carry_cr = False
+    while True:
+        chunk = f.read(chunk_size)
+        if not chunk:
+            break
+        if carry_cr:
+            chunk = b"\r" + chunk
+            carry_cr = False
+        # A CR at the chunk edge may be the first half of a CRLF
+        if chunk.endswith(b"\r"):
+            chunk = chunk[:-1]
+            carry_cr = True
+        chunk = chunk.replace(b"\r\n", b"\n").replace(b"\r", b"\n")
+
+        if not started:
+            chunk = chunk.lstrip(WHITESPACE)
+            if not chunk:
+                continue
+            started = True
+
+        body = chunk.rstrip(WHITESPACE)
+        if body:
+            yield pending + body
+            pending = chunk[len(body):]
+        else:
+            pending += chunk
+
+def stream_digest(f):
+    """SHA-256 of the normalized content of a binary file"""
+    h = hashlib.sha256()
+    for chunk in normalized_chunks(f):
+        h.update(chunk)
+    return h.hexdigest()
+
+def digest_kind(mode):
+    """Name of the digest used as the pass fast path of a compare mode"""
+    if mode not in COMPARATORS:
+        raise ValueError(f"Unknown compare mode '{mode}' (expected one of: {', '.join(COMPARATORS)})")
+    return COMPARATORS[mode][0]
+
+def file_digest(ref, kind):
+    """Digest of kind ("exact", "line" or "token") over a whole fixture"""
+    with open_fixture(ref) as f:
+        return _digest_kinds[kind][1](f)
+
+def expected_digest(ref, mode="exact"):
+    """Digest of an expected output fixture for a compare mode, computed once per file version"""
+    kind, digest_fn = _digest_kinds[digest_kind(mode)]
+    path, member = split_ref(ref)
+    st = os.stat(path)
+    key = (os.path.abspath(path), member, st.st_mtime_ns, st.st_size, kind)
+    with _digest_lock:
+        digest = _expected_digests.get(key)
+    if digest is None:
+        with open_fixture(ref) as f:
+            digest = digest_fn(f)
+        with _digest_lock:
+            _expected_digests[key] = digest
+    return digest
+
+def first_mismatch(expected_f, got_f):
+    """Compare two binary files chunk by chunk after normalization.
+
+    Returns None when they match, otherwise {"offset", "line"} of the first
+    differing byte in the normalized expected output (line is 1-based).
+    """
+    expected_chunks = normalized_chunks(expected_f)
+    got_chunks = normalized_chunks(got_f)
+    a = b = b""
+    offset = 0
+    line = 1
+    while True:
+        if not a:
+            a = next(expected_chunks, b"")
+        if not b:
+            b = next(got_chunks, b"")
+        if not a and not b:
+            return None
+
+        n = min(len(a), len(b))
+        if n and a[:n] == b[:n]:
+            line += a.count(b"\n", 0, n)
+            offset += n
+            a = a[n:]
+            b = b[n:]
+            continue
+
+        # Either one side ended early or the common part differs
+        i = 0
+        while i < n and a[i] == b[i]:
+            i += 1
+        return {"offset": offset + i, "line": line + a.count(b"\n", 0, i)}
+
+def iter_tokens(f, chunk_size=CHUNK_SIZE):
+    """Yield (token, line, offset) for every whitespace separated token of a binary file.
+
+    Each chunk is scanned once. A token longer than chunk_size is yielded as
+    b" " + its SHA-256 instead of its bytes (no real token holds a space),
+    so one huge token never sits in memory whole.
+    """
+    line = 1
+    base = 0  # file offset of chunk[0]
+    token = None  # token still open at the end of the previous chunk
+    start = start_line = 0
+    h = None
+
+    def finish():
+        return token if h is None else b" " + h.digest()
+
+    while True:
+        chunk = f.read(chunk_size)
+        if not chunk:
+            if token is not None:
+                yield finish(), start_line, start
+            return
+        if token is not None and chunk[:1] in WHITESPACE:
+            yield finish(), start_line, start
+            token = None
+        pos = 0  # newlines before pos are already counted
+        for m in TOKEN_RE.finditer(chunk):
+            part = m.group()
+            if token is not None and m.start() == 0:
+                # Continues the token left open by the previous chunk
+                if h is None and len(token) + len(part) > chunk_size:
+                    h = hashlib.sha256(token)
+                if h is None:
+                    token += part
+                else:
+                    h.update(part)
+            else:
+                line += chunk.count(b"\n", pos, m.start())
+                token, start, start_line, h = part, base + m.start(), line, None
+            pos = m.end()
+            # A token touching the end of the chunk may continue in the next one
+            if m.end() < len(chunk):
+                yield finish(), start_line, start
+                token = None
+        line += chunk.count(b"\n", pos)
+        base += len(chunk)
+
+def _capped_lines(f):
+    """Yield (head, key) per line of a binary file: its first CHUNK_SIZE
+    bytes, and a value equal for lines equal up to trailing whitespace.
+    Long lines are hashed chunk by chunk, never read whole; their key is
+    b"\\n" + the hash, which no short line's key can be."""
+    while True:
+        line = f.readline(CHUNK_SIZE)
+        if not line:
+            return
+        if len(line) < CHUNK_SIZE or line.endswith(b"\n"):
+            yield line, line.rstrip(WHITESPACE)
+        else:
+            h = hashlib.sha256()
+            kept = b""  # the stripped line while it is shorter than CHUNK_SIZE
+            pending = b""
+            chunk = line
+            while chunk:
+                body = chunk.rstrip(WHITESPACE)
+                if body:
+                    h.update(pending + body)
+                    if len(kept) < CHUNK_SIZE:
+                        kept += pending + body
+                    pending = chunk[len(body):]
+                else:
+                    pending += chunk
+                if chunk.endswith(b"\n"):
+                    break
+                chunk = f.readline(CHUNK_SIZE)
+            # Keyed like a short line unless the stripped text itself is long
+            yield line, kept if len(kept) < CHUNK_SIZE else b"\n" + h.digest()
+
+def iter_lines(f):
+    """Yield (line_key, line_number) with trailing whitespace removed from each
+    line and trailing blank lines dropped. line_key is the line itself, or
+    a hash for lines longer than CHUNK_SIZE (see _capped_lines)"""
+    blank = []
+    for number, (_, line) in enumerate(_capped_lines(f), 1):
+        if not line:
+            blank.append(number)
+            continue
+        for n in blank:
+            yield b"", n
+        blank = []
+        yield line, number
+
+def token_digest(f):
+    h = hashlib.sha256()
+    for token, _, _ in iter_tokens(f):
+        h.update(token + b" ")
+    return h.hexdigest()
+
+def line_digest(f):
+    h = hashlib.sha256()
+    for line, _ in iter_lines(f):
+        h.update(line + b"\n")
+    return h.hexdigest()
+
+def _tokens_mismatch(expected_f, got_f, equal):
+    expected_tokens = iter_tokens(expected_f)
+    got_tokens = iter_tokens(got_f)
+    line, offset = 1, 0
+    while True:
+        a = next(expected_tokens, None)
+        b = next(got_tokens, None)
+        if a is None and b is None:
+            return None
+        if a is not None:
+            _, line, offset = a
+        if a is None or b is None or not equal(a[0], b[0]):
+            return {"offset": offset, "line": line}
+
+def token_mismatch(expected_f, got_f):
+    return _tokens_mismatch(expected_f, got_f, bytes.__eq__)
+
+def float_mismatch(expected_f, got_f, abs_eps=DEFAULT_EPS, rel_eps=DEFAULT_EPS):
+    def equal(a, b):
+        if a == b:
+            return True
+        try:
+            x, y = float(a), float(b)
+        except ValueError:
+            return False
+        if math.isnan(x) or math.isnan(y):
+            return math.isnan(x) and math.isnan(y)
+        diff = abs(x - y)
+        return diff <= abs_eps or diff <= rel_eps * abs(x)
+    return _tokens_mismatch(expected_f, got_f, equal)
+
+def line_mismatch(expected_f, got_f):
+    expected_lines = iter_lines(expected_f)
+    got_lines = iter_lines(got_f)
+    while True:
+        a = next(expected_lines, None)
+        b = next(got_lines, None)
+        if a is None and b is None:
+            return None
+        if a is None or b is None or a[0] != b[0]:
+            line = a[1] if a is not None else (b[1] if b is not None else 1)
+            return {"offset": None, "line": line}
+
+# mode -> (digest kind, mismatch function). Equal digests always mean a pass
+# for the mode; float shares the token digest since identical tokens pass.
+COMPARATORS = {
+    "exact": ("exact", first_mismatch),
+    "line": ("line", line_mismatch),
+    "token": ("token", token_mismatch),
+    "float": ("token", float_mismatch),
+}
+_digest_kinds = {
+    "exact": ("exact", stream_digest),
+    "line": ("line", line_digest),
+    "token": ("token", token_digest),
+}
+
+def get_comparator(spec):
+    """Resolve a compare spec ({"mode", "abs_eps", "rel_eps"}) to (mode, digest_fn, mismatch_fn)"""
+    spec = spec or {}
+    mode = spec.get("mode", "exact")
+    if mode not in COMPARATORS:
+        raise ValueError(f"Unknown compare mode '{mode}' (expected one of: {', '.join(COMPARATORS)})")
+    kind, mismatch = COMPARATORS[mode]
+    if mode == "float":
+        abs_eps = float(spec.get("abs_eps", DEFAULT_EPS))
+        rel_eps = float(spec.get("rel_eps", DEFAULT_EPS))
+        mismatch = lambda e, g: float_mismatch(e, g, abs_eps, rel_eps)
+    return mode, _digest_kinds[kind][1], mismatch
+
+class _NormalizedReader:
+    """readline() over normalized_chunks(f), so lines are split and numbered
+    the way first_mismatch counts them"""
+    def __init__(self, f):
+        self._chunks = normalized_chunks(f)
+        self._buf = b""
+        self._pos = 0
+
+    def readline(self, limit):
+        while True:
+            end = self._buf.find(b"\n", self._pos, self._pos + limit)
+            if end >= 0:
+                end += 1
+            elif len(self._buf) - self._pos >= limit:
+                end = self._pos + limit
+            else:
+                chunk = next(self._chunks, b"")
+                if chunk:
+                    self._buf = self._buf[self._pos:] + chunk
+                    self._pos = 0
+                    continue
+                end = len(self._buf)
+            line = self._buf[self._pos:end]
+            self._pos = end
+            return line
+
+def _diff_text(head, width):
+    text = head.rstrip(WHITESPACE)
+    if len(text) > width:
+        return text[:width].decode('utf-8', errors='replace') + "…"
+    return text.decode('utf-8', errors='replace')
+
+def diff_window(expected_f, got_f, first_line, mode="exact", context=DIFF_CONTEXT, width=DIFF_WIDTH):
+    """Bounded line diff of two binary files, in one linear pass.
+
+    first_line is the comparator's first mismatching line (1-based), lines
+    before it already matched under the compare mode. Lines are numbered
+    like that comparator: in exact mode after normalization (CRLF, leading
+    and trailing whitespace), otherwise as raw lines of the file. Lines from there on
+    are compared position by position (trailing whitespace ignored, no
+    realignment after an inserted line). Returns {"summary", "first_line",
+    "differing_lines", "expected_lines", "got_lines", "rows"}, rows being
+    {"line", "expected", "got", "same"} for the context lines around
+    first_line; a side is None past its last line, text is cut at width.
+    """
+    first_line = max(first_line or 1, 1)
+    start, end = first_line - context, first_line + context
+    if mode == "exact":
+        expected_f, got_f = _NormalizedReader(expected_f), _NormalizedReader(got_f)
+    expected_lines = _capped_lines(expected_f)
+    got_lines = _capped_lines(got_f)
+    rows = []
+    differing = 0
+    counts = [0, 0]
+    number = 0
+    while True:
+        a = next(expected_lines, None)
+        b = next(got_lines, None)
+        if a is None and b is None:
+            break
+        number += 1
+        if a is not None:
+            counts[0] = number
+        if b is not None:
+            counts[1] = number
+        same = a is not None and b is not None and a[1] == b[1]
+        if number >= first_line and not same:
+            differing += 1
+        if start <= number <= end:
+            rows.append({
+                "line": number,
+                "expected": _diff_text(a[0], width) if a is not None else None,
+                "got": _diff_text(b[0], width) if b is not None else None,
+                "same": same or number < first_line
+            })
+
+    summary = f"{differing} line{'s differ' if differing != 1 else ' differs'}, first at line {first_line}"
+    if counts[0] != counts[1]:
+        summary += f" (expected {counts[0]} lines, got {counts[1]})"
+    return {
+        "summary": summary,
+        "first_line": first_line,
+        "differing_lines": differing,
+        "expected_lines": counts[0],
+        "got_lines": counts[1],
+        "rows": rows
+    }
+
+def read_preview(f, limit=PREVIEW_LIMIT):
+    """Read at most limit bytes of a binary file as text for display"""
+    data = f.read(limit)
+    text = data.decode('utf-8', errors='replace').replace('\r\n', '\n')
+    if f.read(1):
+        text += TRUNCATION_MARKER
+    return text
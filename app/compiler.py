@@ -1,17 +1,43 @@
 import os
 import glob
+import shutil
+import hashlib
 import platform
+import threading
+import contextlib
 import subprocess
+try:
+    import fcntl
+except ImportError:
+    fcntl = None # Windows: only threads of one process are kept from compiling the same source
 from app.utils import SRC_DIR, get_prefixes
-from app.config import load_config
+from app.metrics import COMPILE_CACHE
+from app.config import load_config, get_compiler_path, get_compiler_flags, get_compile_cache, get_pch_headers
 
-def find_source(prob):
+# Compiler identity per (path, mtime, size), so `--version` runs once per process
+_compiler_ids = {}
+# One lock per cache key, so concurrent runs never compile the same source twice
+_key_locks = {}
+_key_locks_guard = threading.Lock()
+# Lock files (one per key prefix) under the cache dir, shared with other processes
+LOCK_DIR = ".locks"
+# Precompiled header include dir per (compiler, flags, headers)
+_pch_dirs = {}
+_pch_lock = threading.Lock()
+# Number of precompiled header sets kept in the cache
+PCH_KEEP = 2
+# sha256 of binaries per (device, inode, mtime, size), shared by every hardlink of a cache entry
+_binary_digests = {}
+# Compiler output of failures that say nothing about the source (OOM-killed cc1plus, full disk)
+TRANSIENT_FAILURE_MARKERS = ("Killed signal terminated program", "internal compiler error: Killed", "No space left on device")
+
+def find_source(prob, src_dir=SRC_DIR):
     # Exact match
-    p = os.path.join(SRC_DIR, f"{prob}.cpp")
+    p = os.path.join(src_dir, f"{prob}.cpp")
     if os.path.exists(p):
         return p
     # Prefix match
-    matches = glob.glob(os.path.join(SRC_DIR, f"{prob}_*.cpp"))
+    matches = glob.glob(os.path.join(glob.escape(src_dir), f"{prob}_*.cpp"))
     if len(matches) == 1:
         return matches[0]
     elif len(matches) > 1:
@@ -19,66 +45,305 @@ def find_source(prob):
         return None
     return None
 
+def get_compiler_identity(compiler):
+    """Fingerprint of the compiler binary and its version, None if it can't be run"""
+    path = shutil.which(compiler) or compiler
+    try:
+        st = os.stat(path)
+        stamp = (path, st.st_mtime_ns, st.st_size)
+    except OSError:
+        stamp = (path,)
+
+    if stamp not in _compiler_ids:
+        try:
+            version = subprocess.run([compiler, "--version"], capture_output=True, timeout=10).stdout
+        except (OSError, subprocess.SubprocessError):
+            return None
+        _compiler_ids[stamp] = hashlib.sha256(repr(stamp).encode() + b"\0" + version).hexdigest()
+    return _compiler_ids[stamp]
+
+def compile_key(src, compiler_id, flags):
+    """Cache key: hash of the source bytes, the compiler identity and the flags"""
+    h = hashlib.sha256()
+    h.update(compiler_id.encode())
+    h.update(b"\0" + "\0".join(flags).encode() + b"\0")
+    with open(src, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+@contextlib.contextmanager
+def _key_lock(key, cache_dir):
+    """Held while a key is looked up and compiled, by threads and by other processes
+    (server workers, batch runs) using the same cache"""
+    with _key_locks_guard:
+        lock = _key_locks.setdefault(key, threading.Lock())
+    with lock:
+        if fcntl is None:
+            yield
+            return
+        lock_dir = os.path.join(cache_dir, LOCK_DIR)
+        os.makedirs(lock_dir, exist_ok=True)
+        with open(os.path.join(lock_dir, key[:2]), "a") as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            yield
+
+def _cache_entry(cache_dir, key):
+    return os.path.join(cache_dir, key[:2], key)
+
+def _publish(entry, bin_path):
+    """Atomically place the cached binary at bin_path (hardlink, or copy as fallback)"""
+    if os.path.exists(bin_path):
+        try:
+            if os.path.samefile(entry, bin_path):
+                return
+        except OSError:
+            pass
+    tmp = f"{bin_path}.tmp{os.getpid()}.{threading.get_ident()}"
+    try:
+        os.link(entry, tmp)
+    except OSError:
+        shutil.copy2(entry, tmp)
+    os.replace(tmp, bin_path)
+
+def _touch(path):
+    # Entry mtime doubles as the last-use time for LRU eviction
+    try:
+        os.utime(path, None)
+    except OSError:
+        pass
+
+def evict_cache(cache_dir, max_bytes):
+    """Delete least recently used entries until the cache fits in max_bytes"""
+    entries = []
+    total = 0
+    for root, dirs, files in os.walk(cache_dir):
+        # Precompiled headers are managed by get_pch_dir; lock files and the
+        # usage helper (app/usage.py) are never evicted
+        if root == cache_dir:
+            dirs[:] = [d for d in dirs if d not in ("pch", "helpers", LOCK_DIR)]
+        for name in files:
+            path = os.path.join(root, name)
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            entries.append((st.st_mtime, st.st_size, path))
+            total += st.st_size
+
+    entries.sort()
+    for _, size, path in entries:
+        if total <= max_bytes:
+            break
+        try:
+            os.remove(path)
+            total -= size
+        except OSError:
+            pass
+
+def _build_pch(compiler, flags, headers, pch_dir):
+    """Precompile headers into pch_dir, returns True if at least one header was built.
+
+    Each header gets a wrapper that #include_next's the real one, and the .gch
+    next to it. With `-I pch_dir` GCC picks the .gch when it is the first
+    include of a source and was built with the same flags; otherwise the
+    wrapper falls through to the system header, so results never change.
+    """
+    tmp_dir = f"{pch_dir}.tmp{os.getpid()}.{threading.get_ident()}"
+    built = 0
+    for header in headers:
+        wrapper = os.path.join(tmp_dir, header)
+        os.makedirs(os.path.dirname(wrapper), exist_ok=True)
+        with open(wrapper, "w") as f:
+            f.write(f"#include_next <{header}>\n")
+        cmd = [compiler] + flags + ["-x", "c++-header", wrapper, "-o", wrapper + ".gch"]
+        try:
+            proc = subprocess.run(cmd, capture_output=True)
+        except OSError:
+            break
+        if proc.returncode == 0:
+            built += 1
+        elif os.path.exists(wrapper + ".gch"):
+            os.remove(wrapper + ".gch")
+
+    try:
+        os.rename(tmp_dir, pch_dir)
+    except OSError:
+        # Another process published the same set first
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+    return built > 0
+
+def get_pch_dir(compiler, compiler_id, flags, headers, cache_dir):
+    """Include dir with precompiled headers for this compiler and flags, None if unavailable.
+
+    The set is keyed by compiler identity, flags and header list, so changing
+    any of them builds a fresh set; only the PCH_KEEP most recent sets are kept.
+    """
+    if not headers:
+        return None
+    h = hashlib.sha256()
+    h.update(compiler_id.encode())
+    h.update(b"\0" + "\0".join(flags).encode() + b"\0" + "\0".join(headers).encode())
+    key = h.hexdigest()[:16]
+
+    with _pch_lock:
+        if key in _pch_dirs:
+            return _pch_dirs[key]
+
+        pch_root = os.path.join(cache_dir, "pch")
+        pch_dir = os.path.join(pch_root, key)
+        os.makedirs(pch_root, exist_ok=True)
+        if not os.path.isdir(pch_dir):
+            _build_pch(compiler, flags, headers, pch_dir)
+            # Drop precompiled header sets of old compilers / flags
+            sets = sorted(
+                (os.path.getmtime(os.path.join(pch_root, d)), d)
+                for d in os.listdir(pch_root) if os.path.isdir(os.path.join(pch_root, d))
+            )
+            for _, d in sets[:-PCH_KEEP]:
+                if d != key:
+                    shutil.rmtree(os.path.join(pch_root, d), ignore_errors=True)
+
+        has_pch = any(name.endswith(".gch") for _, _, files in os.walk(pch_dir) for name in files)
+        _pch_dirs[key] = os.path.abspath(pch_dir) if has_pch else None
+        return _pch_dirs[key]
+
+def _is_compile_error(returncode, log_content):
+    """True if a failed compile is the source's fault and will fail the same way again.
+
+    A compiler killed by a signal, or whose cc1plus was (e.g. by the OOM
+    killer or a full disk), is retried on the next run instead of cached.
+    """
+    if returncode <= 0:
+        return False
+    return not any(marker in log_content for marker in TRANSIENT_FAILURE_MARKERS)
+
+def _cached_compile(src, bin_path, log_path):
+    """Compile src through the shared cache.
+
+    Returns (ok, log_content). Both successful binaries and compile errors
+    are cached, so an identical source is never handed to the compiler twice;
+    transient failures (see _is_compile_error) are not.
+    """
+    config = load_config()
+    compiler = get_compiler_path(config)
+    flags = get_compiler_flags(config)
+    cache_dir, max_bytes = get_compile_cache(config)
+
+    compiler_id = get_compiler_identity(compiler)
+    if compiler_id is None:
+        return False, f"Compiler not found: '{compiler}'. Please check your PATH or update 'compiler_path' in config/config.yaml"
+
+    key = compile_key(src, compiler_id, flags)
+    entry = _cache_entry(cache_dir, key)
+    entry_log = entry + ".log"
+    entry_fail = entry + ".fail"
+
+    with _key_lock(key, cache_dir):
+        if os.path.exists(entry):
+            COMPILE_CACHE.inc("hit")
+            _touch(entry)
+            _publish(entry, bin_path)
+            if os.path.exists(entry_log):
+                _touch(entry_log)
+                shutil.copyfile(entry_log, log_path)
+            return True, ""
+
+        if os.path.exists(entry_fail):
+            COMPILE_CACHE.inc("fail_hit")
+            _touch(entry_fail)
+            with open(entry_fail, 'r') as f:
+                log_content = f.read()
+            with open(log_path, "w") as f:
+                f.write(log_content)
+            return False, log_content
+
+        COMPILE_CACHE.inc("miss")
+        os.makedirs(os.path.dirname(entry), exist_ok=True)
+        tmp = f"{entry}.tmp{os.getpid()}.{threading.get_ident()}"
+        cmd = [compiler] + flags + [src, "-o", tmp]
+        pch_dir = get_pch_dir(compiler, compiler_id, flags, get_pch_headers(config), cache_dir)
+        if pch_dir:
+            cmd[1:1] = ["-I", pch_dir]
+
+        try:
+            with open(log_path, "w") as log:
+                proc = subprocess.run(cmd, stdout=log, stderr=log)
+        except FileNotFoundError:
+            return False, f"Compiler not found: '{compiler}'. Please check your PATH or update 'compiler_path' in config/config.yaml"
+
+        with open(log_path, 'r') as f:
+            log_content = f.read()
+
+        if proc.returncode != 0 or not os.path.exists(tmp):
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            if _is_compile_error(proc.returncode, log_content):
+                with open(entry_fail + ".tmp", "w") as f:
+                    f.write(log_content)
+                os.replace(entry_fail + ".tmp", entry_fail)
+            return False, log_content
+
+        with open(entry_log + ".tmp", "w") as f:
+            f.write(log_content)
+        os.replace(entry_log + ".tmp", entry_log)
+        # Entries are shared by every run through hardlinks, none may write to them
+        os.chmod(tmp, 0o555)
+        os.replace(tmp, entry)
+        _publish(entry, bin_path)
+
+    evict_cache(cache_dir, max_bytes)
+    return True, ""
+
+def binary_digest(bin_path):
+    """sha256 of a compiled binary, rehashed only when the file changes"""
+    st = os.stat(bin_path)
+    stamp = (st.st_dev, st.st_ino, st.st_mtime_ns, st.st_size)
+    digest = _binary_digests.get(stamp)
+    if digest is None:
+        h = hashlib.sha256()
+        with open(bin_path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                h.update(chunk)
+        digest = _binary_digests[stamp] = h.hexdigest()
+    return digest
+
 def compile_problem(prob, src, build_dir):
     prefixes = get_prefixes()
-    config = load_config()
-    compiler = config.get("compiler_path", "g++")
-    
+
     bin_path = os.path.join(build_dir, prob)
     if platform.system() == "Windows":
         bin_path += ".exe"
-    
+
     print(f"{prefixes['BUILD']} Compiling {src}...")
     log_path = os.path.join(build_dir, f"{prob}.compile.log")
-    
-    cmd = [compiler, "-std=c++17", "-O2", src, "-o", bin_path]
-    
-    try:
-        with open(log_path, "w") as log:
-            subprocess.check_call(cmd, stdout=log, stderr=log)
+
+    ok, log_content = _cached_compile(src, bin_path, log_path)
+    if ok:
         print(f"{prefixes['PASS']} Compilation successful")
         return bin_path
-    except subprocess.CalledProcessError:
-        print(f"{prefixes['FAIL']} Compilation failed for {prob}. See {log_path}")
-        return None
-    except FileNotFoundError:
-        print(f"{prefixes['FAIL']} Compiler not found: '{compiler}'")
+    if log_content.startswith("Compiler not found"):
+        print(f"{prefixes['FAIL']} Compiler not found: '{get_compiler_path(load_config())}'")
         print(f"  Please check your PATH or update 'compiler_path' in config/config.yaml")
-        return None
+    else:
+        print(f"{prefixes['FAIL']} Compilation failed for {prob}. See {log_path}")
+    return None
 
-def compile_problem_with_log(prob, src, build_dir):
-    """Compile and return both bin_path and log content"""
-    bin_path = os.path.join(build_dir, prob)
+def compile_problem_with_log(prob, src, workspace):
+    """Compile into a run's workspace and return both bin_path and log content.
+
+    The binary is a hardlink to the read-only cache entry, so concurrent runs
+    of the same source share it and a later compile never replaces it while
+    it executes.
+    """
+    bin_path = os.path.join(workspace, prob)
     if platform.system() == "Windows":
         bin_path += ".exe"
-    
-    log_path = os.path.join(build_dir, f"{prob}.compile.log")
-    
-    # Check if we need to recompile
-    needs_compile = True
-    if os.path.exists(bin_path):
-        src_mtime = os.path.getmtime(src)
-        bin_mtime = os.path.getmtime(bin_path)
-        if bin_mtime > src_mtime:
-            needs_compile = False
-            
-    if not needs_compile:
-        return bin_path, ""
 
-    config = load_config()
-    compiler = config.get("compiler_path", "g++")
-    cmd = [compiler, "-std=c++17", "-O2", src, "-o", bin_path]
-    
-    try:
-        with open(log_path, "w") as log:
-            subprocess.check_call(cmd, stdout=log, stderr=log)
+    log_path = os.path.join(workspace, f"{prob}.compile.log")
+
+    # Rebuilds are decided by the compile cache (source, compiler, flags), not mtimes
+    ok, log_content = _cached_compile(src, bin_path, log_path)
+    if ok:
         return bin_path, ""
-    except subprocess.CalledProcessError:
-        # Read log content
-        log_content = ""
-        if os.path.exists(log_path):
-            with open(log_path, 'r') as f:
-                log_content = f.read()
-        return None, log_content
-    except FileNotFoundError:
-        return None, f"Compiler not found: '{compiler}'. Please check your PATH or update 'compiler_path' in config/config.yaml"
+    return None, log_content
@@ -1,5 +1,15 @@
 import os
-from app.utils import CONFIG_DIR
+import shlex
+import threading
+from app.utils import CONFIG_DIR, BUILD_DIR
+
+DEFAULT_COMPILER_FLAGS = "-std=c++17 -O2"
+DEFAULT_CACHE_SIZE_MB = 256
+DEFAULT_WORKSPACE_KEEP_MB = 64
+
+# Parsed config and resolved problem specs, reused until the file changes
+_config_cache = {"stamp": None, "config": None, "specs": {}}
+_config_lock = threading.Lock()
 
 def parse_simple_yaml(path):
     """Simple YAML parser for basic config structure"""
@@ -43,8 +53,8 @@ def parse_simple_yaml(path):
         print(f"Error parsing YAML manually: {e}")
     return config
 
-def load_config():
-    """Load configuration from YAML or legacy conf file"""
+def read_config():
+    """Read configuration from YAML or legacy conf file (uncached)"""
     yaml_path = os.path.join(CONFIG_DIR, "config.yaml")
     conf_path = os.path.join(CONFIG_DIR, "points.conf")
     
@@ -74,6 +84,59 @@ def load_config():
                     config[key.strip()] = val.strip()
     return config
 
+def _config_stamp():
+    stamp = []
+    for name in ("config.yaml", "points.conf"):
+        try:
+            st = os.stat(os.path.join(CONFIG_DIR, name))
+            stamp.append((name, st.st_mtime_ns, st.st_size))
+        except OSError:
+            stamp.append((name, None))
+    return tuple(stamp)
+
+def load_config():
+    """Load configuration, re-parsing only when config.yaml / points.conf change.
+
+    The returned dict is shared by every caller and must not be modified.
+    """
+    stamp = _config_stamp()
+    with _config_lock:
+        if _config_cache["stamp"] == stamp:
+            return _config_cache["config"]
+    
+    config = read_config()
+    with _config_lock:
+        _config_cache.update(stamp=stamp, config=config, specs={})
+    return config
+
+class ProblemSpec:
+    """Settings of one problem, resolved once from the nested or legacy flat config"""
+    __slots__ = ("prob", "name", "points", "timeout", "forbidden", "required", "cases", "compare")
+
+    def __init__(self, config, prob):
+        self.prob = prob
+        self.name = _resolve_problem_name(config, prob)
+        self.points = _resolve_problem_points(config, prob)
+        self.timeout = _resolve_timeout(config, prob)
+        self.forbidden = _resolve_keywords(config, prob, "forbidden")
+        self.required = _resolve_keywords(config, prob, "required")
+        self.cases = _resolve_cases(config, prob)
+        self.compare = _resolve_compare(config, prob)
+
+def get_problem_spec(config, prob):
+    """ProblemSpec for prob, cached while config is the current load_config() result"""
+    with _config_lock:
+        cached = _config_cache["config"] is config
+        if cached and prob in _config_cache["specs"]:
+            return _config_cache["specs"][prob]
+    
+    spec = ProblemSpec(config, prob)
+    if cached:
+        with _config_lock:
+            if _config_cache["config"] is config:
+                _config_cache["specs"][prob] = spec
+    return spec
+
 def get_config_val(config, key, default=None):
     """Get config value supporting both YAML nested structure and flat key format"""
     # For YAML nested structure
@@ -90,7 +153,7 @@ def get_config_val(config, key, default=None):
     # For flat key format (legacy)
     return config.get(key, default)
 
-def get_problem_points(config, prob):
+def _resolve_problem_points(config, prob):
     # Try YAML nested structure first
     if 'problems' in config and isinstance(config['problems'], dict):
         if prob in config['problems'] and isinstance(config['problems'][prob], dict):
@@ -110,7 +173,7 @@ def get_case_points(config, prob, case_base):
         return int(val)
     return None
 
-def get_timeout(config, prob):
+def _resolve_timeout(config, prob):
     # Try YAML nested structure first
     if 'problems' in config and isinstance(config['problems'], dict):
         if prob in config['problems'] and isinstance(config['problems'][prob], dict):
@@ -135,6 +198,155 @@ def get_timeout(config, prob):
         return int(val)
     return 1
 
+def _resolve_compare(config, prob):
+    """Output comparison spec {"mode", ...} from problems.<prob>.compare or defaults.compare.
+
+    Accepts either a mode name (`compare: token`) or a mapping
+    (`compare: {mode: float, abs_eps: 1e-6, rel_eps: 1e-6}`).
+    """
+    compare = None
+    if 'problems' in config and isinstance(config['problems'], dict):
+        if prob in config['problems'] and isinstance(config['problems'][prob], dict):
+            compare = config['problems'][prob].get('compare')
+    if compare is None and 'defaults' in config and isinstance(config['defaults'], dict):
+        compare = config['defaults'].get('compare')
+    if compare is None:
+        compare = get_config_val(config, f"compare.{prob}")
+    
+    if not compare:
+        return {"mode": "exact"}
+    if isinstance(compare, dict):
+        spec = dict(compare)
+        spec.setdefault("mode", "exact")
+        return spec
+    return {"mode": str(compare).strip()}
+
+def _resolve_keywords(config, prob, kind):
+    """forbidden / required keywords as a list, from the nested list or a comma separated string"""
+    keywords = None
+    if 'problems' in config and isinstance(config['problems'], dict):
+        if prob in config['problems'] and isinstance(config['problems'][prob], dict):
+            keywords = config['problems'][prob].get(kind)
+    if keywords is None:
+        keywords = get_config_val(config, f"{kind}.{prob}")
+    
+    if not keywords:
+        return []
+    if isinstance(keywords, str):
+        keywords = keywords.split(',')
+    return [str(k).strip() for k in keywords if str(k).strip()]
+
+def _resolve_cases(config, prob):
+    """Per-case points from problems.<prob>.cases, keyed by case name without extension"""
+    cases = {}
+    if 'problems' in config and isinstance(config['problems'], dict):
+        if prob in config['problems'] and isinstance(config['problems'][prob], dict):
+            nested = config['problems'][prob].get('cases')
+            if isinstance(nested, dict):
+                for case, points in nested.items():
+                    if str(points).isdigit():
+                        cases[str(case)] = int(points)
+    return cases
+
+def get_problem_points(config, prob):
+    return get_problem_spec(config, prob).points
+
+def get_timeout(config, prob):
+    return get_problem_spec(config, prob).timeout
+
+def get_problem_name(config, prob):
+    """Get display name for a problem, fallback to problem ID"""
+    return get_problem_spec(config, prob).name
+
+def get_compare(config, prob):
+    return get_problem_spec(config, prob).compare
+
+def get_jobs(config, override=None):
+    """Number of test cases to run concurrently, 0 or missing means one per CPU.
+
+    override (e.g. `--jobs`) wins over the config when given; it too is
+    taken as one per CPU when 0 or negative.
+    """
+    if override is not None:
+        return override if override > 0 else os.cpu_count() or 1
+    jobs = None
+    # Try YAML defaults
+    if 'defaults' in config and isinstance(config['defaults'], dict):
+        jobs = config['defaults'].get('jobs')
+    
+    # Try flat key default
+    if jobs is None:
+        jobs = get_config_val(config, "jobs.default")
+    
+    if jobs is not None and str(jobs).isdigit() and int(jobs) > 0:
+        return int(jobs)
+    return os.cpu_count() or 1
+
+def get_fail_fast(config):
+    """test.stop_on_first_fail: stop a problem's run at its first non-PASS case"""
+    val = get_config_val(config, "test.stop_on_first_fail", False)
+    if isinstance(val, str):
+        return val.strip().lower() in ("true", "yes", "1", "on")
+    return bool(val)
+
+def get_job_limits(config):
+    """Return (workers, max_queued) for background grading jobs of the web server"""
+    workers = get_config_val(config, "server.job_workers", 2)
+    max_queued = get_config_val(config, "server.max_queued", 32)
+    workers = int(workers) if str(workers).isdigit() and int(workers) > 0 else 2
+    max_queued = int(max_queued) if str(max_queued).isdigit() and int(max_queued) > 0 else 32
+    return workers, max_queued
+
+def get_serve_options(config):
+    """host, port, workers, threads and graceful_timeout of the production server (--serve)"""
+    def positive(key, default):
+        value = get_config_val(config, key, default)
+        return int(value) if str(value).isdigit() and int(value) > 0 else default
+
+    workers = get_config_val(config, "server.workers", 0)
+    workers = int(workers) if str(workers).isdigit() and int(workers) > 0 else (os.cpu_count() or 1)
+    return {
+        "host": str(get_config_val(config, "server.host", "0.0.0.0")),
+        "port": positive("server.port", 8080),
+        "workers": workers,
+        "threads": positive("server.threads", 16),
+        "graceful_timeout": positive("server.graceful_timeout", 30),
+    }
+
+def get_compiler_path(config):
+    return config.get("compiler_path", "g++")
+
+def get_compiler_flags(config):
+    """Compiler flags as an argument list, from compiler.flags"""
+    flags = get_config_val(config, "compiler.flags", DEFAULT_COMPILER_FLAGS)
+    if isinstance(flags, list):
+        return [str(f) for f in flags]
+    return shlex.split(str(flags))
+
+def get_compile_cache(config):
+    """Return (cache_dir, max_bytes) of the shared compile cache"""
+    cache_dir = get_config_val(config, "compiler.cache_dir") or os.path.join(BUILD_DIR, ".cache")
+    size_mb = get_config_val(config, "compiler.cache_size_mb", DEFAULT_CACHE_SIZE_MB)
+    if not str(size_mb).isdigit():
+        size_mb = DEFAULT_CACHE_SIZE_MB
+    return cache_dir, int(size_mb) * 1024 * 1024
+
+def get_workspace_keep(config):
+    """Bytes of finished run workspaces (build/.runs) kept for inspection"""
+    keep_mb = get_config_val(config, "compiler.workspace_keep_mb", DEFAULT_WORKSPACE_KEEP_MB)
+    if not str(keep_mb).isdigit():
+        keep_mb = DEFAULT_WORKSPACE_KEEP_MB
+    return int(keep_mb) * 1024 * 1024
+
+def get_pch_headers(config):
+    """Standard headers to precompile, from compiler.pch (list or comma separated)"""
+    headers = get_config_val(config, "compiler.pch")
+    if not headers:
+        return []
+    if isinstance(headers, str):
+        headers = headers.split(',')
+    return [str(h).strip().strip('<>') for h in headers if str(h).strip()]
+
 def get_app_title(config):
     # Try YAML nested
     if 'app' in config and isinstance(config['app'], dict):
@@ -153,7 +365,7 @@ def get_app_description(config):
     # Fallback to flat key
     return get_config_val(config, "app.description", "C++ Programming Lab Test System")
 
-def get_problem_name(config, prob):
+def _resolve_problem_name(config, prob):
     """Get display name for a problem, fallback to problem ID"""
     # Try YAML nested
     if 'problems' in config and isinstance(config['problems'], dict):
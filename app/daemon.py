@@ -0,0 +1,132 @@
+import os
+import sys
+import json
+import signal
+import socket
+import threading
+import contextlib
+from app.utils import BUILD_DIR, Colors
+
+# One daemon per project: it grades the src/ and tests/ of the directory it was started in
+SOCKET_PATH = os.path.join(BUILD_DIR, ".daemon.sock")
+
+class _SocketWriter:
+    """File-like object sending everything written to it as {"out": ...} messages"""
+
+    def __init__(self, conn):
+        self.conn = conn
+
+    def write(self, text):
+        if text:
+            _send(self.conn, {"out": text})
+        return len(text)
+
+    def flush(self):
+        pass
+
+    def isatty(self):
+        return False
+
+def _send(conn, message):
+    conn.sendall(json.dumps(message, ensure_ascii=False).encode('utf-8') + b"\n")
+
+def forward(argv, color, path=SOCKET_PATH):
+    """Run a CLI invocation on the daemon, streaming its output to stdout.
+
+    Returns the exit code, or None when no daemon is listening (the caller
+    then grades in-process).
+    """
+    if not hasattr(socket, "AF_UNIX") or not os.path.exists(path):
+        return None
+    try:
+        conn = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        conn.connect(path)
+    except OSError:
+        return None
+
+    with conn:
+        _send(conn, {"argv": argv, "color": color})
+        with conn.makefile('r', encoding='utf-8') as f:
+            for line in f:
+                message = json.loads(line)
+                if "out" in message:
+                    sys.stdout.write(message["out"])
+                    sys.stdout.flush()
+                elif "exit" in message:
+                    return message["exit"]
+    print("❌ Grading daemon closed the connection")
+    return 1
+
+def is_running(path=SOCKET_PATH):
+    """True if a daemon accepts connections on path"""
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as conn:
+            conn.connect(path)
+        return True
+    except OSError:
+        return False
+
+def serve(handler, path=SOCKET_PATH):
+    """Serve CLI invocations on a Unix socket until interrupted.
+
+    handler(argv) runs one invocation, printing to stdout, and returns its
+    exit code. Requests are graded one at a time, so colors and stdout can
+    be switched per client; config, test manifests and compiler state stay
+    warm in this process between requests.
+    """
+    if not hasattr(socket, "AF_UNIX"):
+        print("❌ The grading daemon needs Unix domain sockets")
+        return 1
+
+    if os.path.exists(path):
+        if is_running(path):
+            print(f"❌ A grading daemon is already listening on {path}")
+            return 1
+        os.unlink(path) # Left over from a daemon that didn't shut down cleanly
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    server.bind(path)
+    os.chmod(path, 0o600)
+    server.listen()
+    lock = threading.Lock()
+
+    def handle(conn):
+        with conn:
+            try:
+                with conn.makefile('r', encoding='utf-8') as f:
+                    line = f.readline()
+                if not line:
+                    return # is_running() probe
+                request = json.loads(line)
+                with lock:
+                    if request.get("color"):
+                        Colors.enable()
+                    else:
+                        Colors.disable()
+                    with contextlib.redirect_stdout(_SocketWriter(conn)):
+                        try:
+                            code = handler(request.get("argv", []))
+                        except SystemExit as e:
+                            code = e.code if isinstance(e.code, int) else 1
+                _send(conn, {"exit": code or 0})
+            except (OSError, ValueError):
+                pass # Client went away (e.g. Ctrl+C in the editor)
+
+    def stop(signum, frame):
+        raise KeyboardInterrupt
+
+    # `kill` shuts down as cleanly as Ctrl+C, removing the socket
+    signal.signal(signal.SIGTERM, stop)
+    print(f"🛰️  Grading daemon listening on {path} (Ctrl+C to stop)")
+    try:
+        while True:
+            conn, _ = server.accept()
+            threading.Thread(target=handle, args=(conn,), daemon=True).start()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.close()
+        with contextlib.suppress(OSError):
+            os.unlink(path)
+    return 0
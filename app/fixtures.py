@@ -0,0 +1,204 @@
+import io
+import os
+import gzip
+import mmap
+import zipfile
+import threading
+
+# Loose fixtures may be compressed: 01.in, 01.in.gz or 01.in.zst (first one found wins)
+COMPRESSED_SUFFIXES = ("", ".gz", ".zst")
+# Packed fixtures of a problem: tests/<prob>/cases.zip holding inputs/*.in and outputs/*.out
+PACK_NAME = "cases.zip"
+# A packed fixture is referenced as "tests/<prob>/cases.zip!inputs/01.in"
+MEMBER_SEP = "!"
+# Bytes copied into a child's stdin per write
+FEED_CHUNK = 64 * 1024
+# Inputs up to this size fit in any pipe buffer, they are written without a feeder thread
+SMALL_INPUT = 16 * 1024
+
+# archive path -> (size, mtime_ns, ZipFile over the mapped archive)
+_archives = {}
+_archives_lock = threading.Lock()
+# (path, size, mtime_ns) -> decompressed size of a .gz / .zst fixture
+_sizes = {}
+_sizes_lock = threading.Lock()
+
+class _MappedFile(mmap.mmap):
+    # zipfile wants a seekable() file object, mmap only lacks the method
+    def seekable(self):
+        return True
+
+def split_ref(ref):
+    """(archive, member) of a packed fixture reference, (ref, None) for a file"""
+    archive, sep, member = ref.rpartition(MEMBER_SEP)
+    if sep and archive.endswith(".zip"):
+        return archive, member
+    return ref, None
+
+def is_plain(ref):
+    """True if ref is an uncompressed file that can be handed to a child as is"""
+    return split_ref(ref)[1] is None and not ref.endswith(COMPRESSED_SUFFIXES[1:])
+
+def open_archive(path):
+    """ZipFile over the mmap of an archive, shared by every thread until the file changes"""
+    st = os.stat(path)
+    with _archives_lock:
+        entry = _archives.get(path)
+        if entry and entry[:2] == (st.st_size, st.st_mtime_ns):
+            return entry[2]
+        with open(path, 'rb') as f:
+            mapped = _MappedFile(f.fileno(), 0, access=mmap.ACCESS_READ)
+        # Streams opened on a replaced archive keep their own reference to its map
+        archive = zipfile.ZipFile(mapped)
+        _archives[path] = (st.st_size, st.st_mtime_ns, archive)
+        return archive
+
+def _open_zstd(path):
+    try:
+        import zstandard
+    except ImportError:
+        raise RuntimeError(f"{path}: .zst fixtures need the zstandard package (pip install zstandard)")
+    reader = zstandard.ZstdDecompressor().stream_reader(open(path, 'rb'), read_across_frames=True, closefd=True)
+    # Buffered for readline(), which the line comparator iterates with
+    return io.BufferedReader(reader)
+
+def open_fixture(ref):
+    """Binary stream of a fixture's content, decompressed chunk by chunk as it is read"""
+    path, member = split_ref(ref)
+    if member is not None:
+        return open_archive(path).open(member)
+    if path.endswith(".gz"):
+        return gzip.open(path, 'rb')
+    if path.endswith(".zst"):
+        return _open_zstd(path)
+    return open(path, 'rb')
+
+def preview(ref, limit):
+    """First limit bytes of a fixture as text, nothing past them is read or decompressed"""
+    with open_fixture(ref) as f:
+        data = f.read(limit + 1)
+    text = data[:limit].decode('utf-8', errors='replace').replace('\r\n', '\n')
+    if len(data) > limit:
+        text += "\n... (truncated)"
+    return text
+
+def fixture_size(ref):
+    """Content size of a fixture in bytes. Compressed files are measured by
+    decompressing them once per file version."""
+    path, member = split_ref(ref)
+    if member is not None:
+        return open_archive(path).getinfo(member).file_size
+    st = os.stat(path)
+    if is_plain(ref):
+        return st.st_size
+    key = (path, st.st_size, st.st_mtime_ns)
+    with _sizes_lock:
+        size = _sizes.get(key)
+    if size is None:
+        size = 0
+        with open_fixture(ref) as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                size += len(chunk)
+        with _sizes_lock:
+            _sizes[key] = size
+    return size
+
+def iter_range(ref, start=0, stop=None):
+    """Yield bytes [start, stop) of a fixture in chunks; bytes before start are skipped, not kept"""
+    with open_fixture(ref) as f:
+        if is_plain(ref):
+            f.seek(start)
+        else:
+            skip = start
+            while skip > 0:
+                chunk = f.read(min(FEED_CHUNK, skip))
+                if not chunk:
+                    return
+                skip -= len(chunk)
+        remaining = None if stop is None else stop - start
+        while remaining is None or remaining > 0:
+            chunk = f.read(FEED_CHUNK if remaining is None else min(FEED_CHUNK, remaining))
+            if not chunk:
+                return
+            if remaining is not None:
+                remaining -= len(chunk)
+            yield chunk
+
+def _feed(src, pipe, thread, head):
+    try:
+        pipe.write(head)
+        while True:
+            chunk = src.read(FEED_CHUNK)
+            if not chunk:
+                break
+            pipe.write(chunk)
+    except (BrokenPipeError, ConnectionResetError):
+        pass # The child exited or closed stdin without reading everything
+    except Exception as e:
+        thread.error = e
+    finally:
+        src.close()
+        try:
+            pipe.close()
+        except OSError:
+            pass
+
+def start_feed(src, pipe):
+    """Copy the binary stream src into pipe (a child's stdin), closing both.
+
+    Small inputs are written right away; larger ones are copied on a
+    thread, which is returned (None otherwise). Its error attribute is set
+    if reading src failed, e.g. on a corrupt archive.
+    """
+    try:
+        head = src.read(SMALL_INPUT + 1)
+    except BaseException:
+        src.close()
+        pipe.close()
+        raise
+    if len(head) <= SMALL_INPUT:
+        src.close()
+        try:
+            pipe.write(head)
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+        finally:
+            try:
+                pipe.close()
+            except OSError:
+                pass
+        return None
+    thread = threading.Thread(target=lambda: _feed(src, pipe, thread, head), daemon=True)
+    thread.error = None
+    thread.start()
+    return thread
+
+def scan_loose(directory, suffix):
+    """name -> (path, size, mtime_ns) for the files of directory named <name><suffix>[.gz|.zst]"""
+    files = {}
+    ranks = {}
+    with os.scandir(directory) as it:
+        for entry in it:
+            for rank, extra in enumerate(COMPRESSED_SUFFIXES):
+                ending = suffix + extra
+                if entry.name.endswith(ending) and entry.is_file():
+                    name = entry.name[:-len(ending)]
+                    if rank < ranks.get(name, len(COMPRESSED_SUFFIXES)):
+                        st = entry.stat()
+                        files[name] = (entry.path, st.st_size, st.st_mtime_ns)
+                        ranks[name] = rank
+                    break
+    return files
+
+def scan_pack(path):
+    """(inputs, outputs) of a packed archive, each name -> (ref, size, crc32)"""
+    inputs, outputs = {}, {}
+    for info in open_archive(path).infolist():
+        if info.is_dir():
+            continue
+        folder, _, filename = info.filename.partition("/")
+        for files, expected_folder, suffix in ((inputs, "inputs", ".in"), (outputs, "outputs", ".out")):
+            if folder == expected_folder and filename.endswith(suffix) and "/" not in filename:
+                ref = f"{path}{MEMBER_SEP}{info.filename}"
+                files[filename[:-len(suffix)]] = (ref, info.file_size, info.CRC)
+    return inputs, outputs
@@ -0,0 +1,172 @@
+import os
+import json
+import time
+import uuid
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from app.results import get_db
+
+# Finished jobs stay readable (for late or reconnecting clients) this long
+JOB_RETENTION_SEC = 600
+# Seconds between SSE keep-alive comments while a job is quiet
+KEEPALIVE_SEC = 15
+# How often a stream checks the results store for events published by another process
+POLL_SEC = 0.25
+
+# Jobs and their events live in the results store, so any server worker
+# process can report or stream a job queued by another one. Publishes in
+# this process wake local streams right away instead of at the next poll.
+_published = threading.Condition()
+
+class QueueFull(Exception):
+    pass
+
+class Job:
+    """A queued grading run and the ordered events it has published"""
+
+    def __init__(self, job_id, name, done=False, result=None):
+        self.id = job_id
+        self.name = name
+        self.done = done
+        self.result = result
+        self.seq = 0 # Next event index, only used by the process running the job
+
+    def _append(self, conn, event, data):
+        conn.execute(
+            "INSERT INTO job_events (job_id, seq, event, data) VALUES (?, ?, ?, ?)",
+            (self.id, self.seq, event, json.dumps(data, ensure_ascii=False))
+        )
+        self.seq += 1
+
+    def publish(self, event, data):
+        conn = get_db()
+        with conn:
+            self._append(conn, event, data)
+        with _published:
+            _published.notify_all()
+
+    def finish(self, event, data):
+        conn = get_db()
+        with conn:
+            self._append(conn, event, data)
+            conn.execute(
+                "UPDATE jobs SET state = 'done', result = ?, finished_at = ? WHERE id = ?",
+                (json.dumps(data, ensure_ascii=False), time.time(), self.id)
+            )
+        self.result = data
+        self.done = True
+        with _published:
+            _published.notify_all()
+
+    def stream(self, start=0):
+        """Yield server-sent events from index start until the job finishes"""
+        index = start
+        quiet_since = time.monotonic()
+        while True:
+            conn = get_db()
+            # Read the state first: every event of a done job is already stored
+            done = conn.execute("SELECT state FROM jobs WHERE id = ?", (self.id,)).fetchone()
+            done = done is None or done["state"] == "done"
+            rows = conn.execute(
+                "SELECT seq, event, data FROM job_events WHERE job_id = ? AND seq >= ? ORDER BY seq",
+                (self.id, index)
+            ).fetchall()
+            for row in rows:
+                yield f"id: {row['seq']}\nevent: {row['event']}\ndata: {row['data']}\n\n"
+                index = row["seq"] + 1
+            if done:
+                return
+            if rows:
+                quiet_since = time.monotonic()
+            elif time.monotonic() - quiet_since >= KEEPALIVE_SEC:
+                yield ": keep-alive\n\n"
+                quiet_since = time.monotonic()
+            with _published:
+                _published.wait(timeout=POLL_SEC)
+
+class JobQueue:
+    """Bounded background executor for grading jobs.
+
+    Jobs run on this process' threads; max_pending counts unfinished jobs
+    of every process sharing the results store.
+    """
+
+    def __init__(self, max_workers=2, max_pending=32):
+        self.executor = ThreadPoolExecutor(max_workers=max_workers)
+        self.max_pending = max_pending
+
+    def submit(self, name, target):
+        """Queue target(job) and return the Job.
+
+        target publishes progress with job.publish() and returns the final
+        result, sent to clients as a `done` event (`failed` if it raises).
+        """
+        job = Job(uuid.uuid4().hex, name)
+        conn = get_db()
+        # IMMEDIATE takes the write lock first, so two workers can't both
+        # take the last free slot
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            self._prune(conn)
+            pending = conn.execute("SELECT COUNT(*) FROM jobs WHERE state != 'done'").fetchone()[0]
+            if pending >= self.max_pending:
+                raise QueueFull(f"Too many queued runs ({pending}), try again later")
+            conn.execute(
+                "INSERT INTO jobs (id, name, pid, state, created_at) VALUES (?, ?, ?, 'queued', ?)",
+                (job.id, name, os.getpid(), time.time())
+            )
+        except BaseException:
+            conn.rollback()
+            raise
+        conn.commit()
+
+        def run():
+            run_conn = get_db()
+            with run_conn:
+                run_conn.execute("UPDATE jobs SET state = 'running' WHERE id = ?", (job.id,))
+            try:
+                job.finish("done", target(job))
+            except Exception as e:
+                job.finish("failed", {"error": str(e)})
+
+        self.executor.submit(run)
+        return job
+
+    def queued_count(self):
+        """Jobs accepted but not started yet"""
+        return get_db().execute("SELECT COUNT(*) FROM jobs WHERE state = 'queued'").fetchone()[0]
+
+    def running_count(self):
+        """Jobs being graded"""
+        return get_db().execute("SELECT COUNT(*) FROM jobs WHERE state = 'running'").fetchone()[0]
+
+    def get(self, job_id):
+        row = get_db().execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if row is None:
+            return None
+        result = json.loads(row["result"]) if row["result"] else None
+        return Job(row["id"], row["name"], done=row["state"] == "done", result=result)
+
+    def shutdown(self):
+        """Finish the jobs already accepted, used on graceful shutdown"""
+        self.executor.shutdown(wait=True)
+
+    def _prune(self, conn):
+        cutoff = time.time() - JOB_RETENTION_SEC
+        conn.execute("DELETE FROM jobs WHERE state = 'done' AND finished_at < ?", (cutoff,))
+
+def abandon_jobs(pid=None):
+    """Fail the unfinished jobs of a server process that exited (every process if pid is None).
+
+    Their streams end with a `failed` event instead of waiting forever, and
+    they stop counting against max_queued.
+    """
+    conn = get_db()
+    query = "SELECT id FROM jobs WHERE state != 'done'" + ("" if pid is None else " AND pid = ?")
+    ids = [row["id"] for row in conn.execute(query, () if pid is None else (pid,))]
+    for job_id in ids:
+        seq = conn.execute("SELECT COUNT(*) FROM job_events WHERE job_id = ?", (job_id,)).fetchone()[0]
+        job = Job(job_id, "")
+        job.seq = seq
+        job.finish("failed", {"error": "The server stopped before this run finished"})
+    return len(ids)
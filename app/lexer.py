@@ -0,0 +1,92 @@
+import re
+import hashlib
+import threading
+
+# One alternation scanned left to right: comments and literals are consumed
+# whole so nothing inside them is ever reported as an identifier
+TOKEN_RE = re.compile(r'''
+    (?P<comment>//(?:\\\n|[^\n])*|/\*.*?(?:\*/|\Z))
+  | (?P<include>\#[ \t]*include[ \t]*(?:<[^>\n]*>|"[^"\n]*"))
+  | (?P<literal>(?:u8|u|U|L)?R"(?P<delim>[^()\\\s"]{0,16})\(.*?\)(?P=delim)"
+              |(?:u8|u|U|L)?"(?:\\.|[^"\\\n])*"?
+              |(?:u8|u|U|L)?'(?:\\.|[^'\\\n])*'?)
+  | (?P<ident>[A-Za-z_]\w*)
+  | (?P<number>\.?\d(?:[eEpP][+-]|[\w.'])*)
+''', re.S | re.X)
+IDENT_RE = re.compile(r'[A-Za-z_]\w*')
+
+# Sources scanned recently, keyed by the sha256 of their bytes
+LEX_CACHE_SIZE = 1024
+_lex_cache = {}
+_lex_lock = threading.Lock()
+
+class SourceTokens:
+    """Identifiers of a C++ source, and its code with comments / literals blanked"""
+    __slots__ = ("identifiers", "code")
+
+    def __init__(self, identifiers, code):
+        self.identifiers = identifiers
+        self.code = code
+
+def tokenize(text):
+    """Scan text once, return SourceTokens.
+
+    Header names of #include lines count as code (`algorithm`, `bits`,
+    `stdc`, `h`), string / char literals and comments do not.
+    """
+    identifiers = set()
+    code = []
+    pos = 0
+    for m in TOKEN_RE.finditer(text):
+        kind = m.lastgroup if m.lastgroup != "delim" else "literal"
+        if kind == "ident":
+            identifiers.add(m.group())
+            continue
+        if kind == "include":
+            identifiers.update(IDENT_RE.findall(m.group()))
+            continue
+        if kind == "number":
+            continue
+        # Blank comments and literals in the code text, keeping the quotes
+        code.append(text[pos:m.start()])
+        if kind == "comment":
+            code.append(" ")
+        else:
+            code.append('""' if '"' in m.group() else "''")
+        pos = m.end()
+    code.append(text[pos:])
+    return SourceTokens(frozenset(identifiers), "".join(code))
+
+def scan_source(path):
+    """SourceTokens of a source file, cached by content hash"""
+    with open(path, 'rb') as f:
+        data = f.read()
+    key = hashlib.sha256(data).hexdigest()
+    with _lex_lock:
+        tokens = _lex_cache.get(key)
+    if tokens is None:
+        tokens = tokenize(data.decode('utf-8', errors='ignore'))
+        with _lex_lock:
+            if len(_lex_cache) >= LEX_CACHE_SIZE:
+                _lex_cache.pop(next(iter(_lex_cache)))
+            _lex_cache[key] = tokens
+    return tokens
+
+def _pattern(keyword):
+    parts = [re.escape(p) for p in keyword.split()]
+    pattern = r'\s*'.join(parts)
+    if re.match(r'\w', keyword):
+        pattern = r'\b' + pattern
+    if re.search(r'\w$', keyword):
+        pattern += r'\b'
+    return re.compile(pattern)
+
+def has_keyword(tokens, keyword):
+    """True if keyword appears in the code (outside comments and literals).
+
+    Plain identifiers (`for`, `sort`) are a set lookup; anything else
+    (`std::sort`, `#include <algorithm>`) is searched in the blanked code.
+    """
+    if IDENT_RE.fullmatch(keyword):
+        return keyword in tokens.identifiers
+    return _pattern(keyword).search(tokens.code) is not None
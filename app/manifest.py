@@ -0,0 +1,190 @@
+import os
+import json
+import hashlib
+import threading
+from app.utils import BUILD_DIR, TESTS_DIR
+from app.compare import file_digest
+from app.fixtures import PACK_NAME, open_fixture, preview, scan_loose, scan_pack, split_ref
+
+MANIFEST_VERSION = 3
+MANIFEST_DIR = os.path.join(BUILD_DIR, ".manifests")
+# Bytes of each input / expected output kept in the manifest for display
+PREVIEW_BYTES = 4096
+
+# prob -> manifest dict, shared by the runner and the server
+_manifests = {}
+# prob -> directory stamps of the last full scan
+_scanned = {}
+_locks = {}
+_locks_guard = threading.Lock()
+
+def _lock(prob):
+    with _locks_guard:
+        return _locks.setdefault(prob, threading.Lock())
+
+def _manifest_path(prob):
+    return os.path.join(MANIFEST_DIR, f"{prob}.json")
+
+def _sha256(ref):
+    # Hash of the decompressed content, so repacking a case keeps its cached results
+    h = hashlib.sha256()
+    with open_fixture(ref) as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+def _dir_stamps(prob):
+    """Stamps of tests/<prob>/inputs, outputs and cases.zip; any file added, removed or renamed changes them"""
+    stamps = []
+    for name in ("inputs", "outputs", PACK_NAME):
+        try:
+            st = os.stat(os.path.join(TESTS_DIR, prob, name))
+            stamps.append((st.st_ino, st.st_mtime_ns, st.st_size))
+        except OSError:
+            stamps.append(None)
+    return tuple(stamps)
+
+def _unchanged(ref, size, stamp):
+    """True if a loose fixture still has the size and mtime it was indexed with.
+
+    Packed members are covered by the stamp of cases.zip itself.
+    """
+    if split_ref(ref)[1] is not None:
+        return True
+    try:
+        st = os.stat(ref)
+    except OSError:
+        return False
+    return st.st_size == size and st.st_mtime_ns == stamp
+
+def _is_fresh(prob, stamps, kinds):
+    """True if the in-memory manifest of prob can be returned without listing its directories.
+
+    Files added, removed or renamed change the directory stamps; files
+    rewritten in place (`cp new.out outputs/1.out`) don't, so every loose
+    fixture is still stat'ed before its cached digests are trusted.
+    """
+    manifest = _manifests.get(prob)
+    if not manifest or _scanned.get(prob) != stamps:
+        return False
+    for c in manifest["cases"]:
+        if not _unchanged(c["input"], c["in_size"], c["in_stamp"]):
+            return False
+        if c["output"]:
+            if not _unchanged(c["output"], c["out_size"], c["out_stamp"]):
+                return False
+            if any(kind not in c["digests"] for kind in kinds):
+                return False
+    return True
+
+def _scan(prob):
+    """(inputs, outputs) of tests/<prob>, each name -> (ref, size, stamp), or None without tests.
+
+    Cases come from tests/<prob>/cases.zip and the inputs/ outputs/
+    directories; a loose file overrides the packed case of the same name.
+    The stamp is the mtime of a file or the CRC-32 of a packed member.
+    """
+    inputs_dir = os.path.join(TESTS_DIR, prob, "inputs")
+    outputs_dir = os.path.join(TESTS_DIR, prob, "outputs")
+    pack = os.path.join(TESTS_DIR, prob, PACK_NAME)
+    has_dirs = os.path.isdir(inputs_dir) and os.path.isdir(outputs_dir)
+    has_pack = os.path.isfile(pack)
+    if not has_dirs and not has_pack:
+        return None
+
+    inputs, outputs = scan_pack(pack) if has_pack else ({}, {})
+    if os.path.isdir(inputs_dir):
+        inputs.update(scan_loose(inputs_dir, ".in"))
+    if os.path.isdir(outputs_dir):
+        outputs.update(scan_loose(outputs_dir, ".out"))
+    return inputs, outputs
+
+def _load(prob):
+    try:
+        with open(_manifest_path(prob), 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+        if manifest.get("version") == MANIFEST_VERSION:
+            return manifest
+    except (OSError, ValueError):
+        pass
+    return None
+
+def _save(prob, manifest):
+    os.makedirs(MANIFEST_DIR, exist_ok=True)
+    path = _manifest_path(prob)
+    tmp = f"{path}.tmp{os.getpid()}.{threading.get_ident()}"
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False)
+    os.replace(tmp, path)
+
+def _refresh_case(old, name, infile, outfile):
+    """Manifest entry for one case, reusing whatever of old is still valid"""
+    in_ref, in_size, in_stamp = infile
+    case = {
+        "id": name,
+        "case": f"{name}.in",
+        "input": in_ref,
+        "in_size": in_size,
+        "in_stamp": in_stamp,
+        "output": None,
+        "out_size": None,
+        "out_stamp": None,
+        "digests": {},
+    }
+    if old and old.get("input") == in_ref and old.get("in_size") == in_size and old.get("in_stamp") == in_stamp:
+        case["in_digest"] = old["in_digest"]
+        case["in_preview"] = old["in_preview"]
+    else:
+        case["in_digest"] = _sha256(in_ref)
+        case["in_preview"] = preview(in_ref, PREVIEW_BYTES)
+
+    if outfile:
+        out_ref, out_size, out_stamp = outfile
+        case.update(output=out_ref, out_size=out_size, out_stamp=out_stamp)
+        if old and old.get("output") == out_ref and old.get("out_size") == out_size and old.get("out_stamp") == out_stamp:
+            case["out_preview"] = old["out_preview"]
+            case["digests"] = dict(old.get("digests", {}))
+        else:
+            case["out_preview"] = preview(out_ref, PREVIEW_BYTES)
+    return case
+
+def get_manifest(prob, kinds=()):
+    """Case index of tests/<prob>, sorted by case id.
+
+    Returns a list of case dicts (id, fixture refs, sizes, stamps, input
+    digest, expected-output digests per compare kind and short previews), or
+    None if the problem has neither inputs/outputs directories nor a
+    cases.zip (refs are opened with app.fixtures.open_fixture). Only cases
+    whose files changed since the last call (or the last run, via the
+    on-disk copy) are re-read, and the directories are only listed again
+    when they change. The returned list is shared and must not be modified.
+    """
+    with _lock(prob):
+        stamps = _dir_stamps(prob)
+        if _is_fresh(prob, stamps, kinds):
+            return _manifests[prob]["cases"]
+        found = _scan(prob)
+        if found is None:
+            return None
+        inputs, outputs = found
+        manifest = _manifests.get(prob) or _load(prob) or {"version": MANIFEST_VERSION, "cases": []}
+        old_cases = {c["id"]: c for c in manifest["cases"]}
+
+        changed = set(old_cases) != set(inputs)
+        cases = []
+        for name in sorted(inputs):
+            old = old_cases.get(name)
+            case = _refresh_case(old, name, inputs[name], outputs.get(name))
+            if case["output"]:
+                for kind in kinds:
+                    if kind not in case["digests"]:
+                        case["digests"][kind] = file_digest(case["output"], kind)
+            changed = changed or case != old
+            cases.append(case)
+
+        if changed:
+            manifest = {"version": MANIFEST_VERSION, "cases": cases}
+            _save(prob, manifest)
+        _manifests[prob] = manifest
+        _scanned[prob] = stamps
+        return manifest["cases"]
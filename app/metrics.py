@@ -0,0 +1,215 @@
+import os
+import json
+import time
+import bisect
+import threading
+import contextlib
+
+# Latency buckets in seconds, from a cache hit to a slow compile
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+_registry = []
+_registry_lock = threading.Lock()
+# Seconds between snapshots of this process' metrics once they are shared
+SHARE_INTERVAL_SEC = 5
+# Directory of per-process snapshots merged into render_metrics(), see share_metrics()
+_shared = {"dir": None, "path": None}
+
+def _label_text(names, values, extra=()):
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    pairs += [f'{n}="{v}"' for n, v in extra]
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _number(value):
+    if value == float("inf"):
+        return "+Inf"
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value)
+
+class Counter:
+    """Monotonic counter, optionally split by labels"""
+
+    def __init__(self, name, help_text, labels=()):
+        self.name = name
+        self.help = help_text
+        self.labels = tuple(labels)
+        self.values = {}
+        self.lock = threading.Lock()
+        _register(self)
+
+    def inc(self, *label_values, amount=1):
+        with self.lock:
+            self.values[label_values] = self.values.get(label_values, 0) + amount
+
+    def snapshot(self):
+        with self.lock:
+            return [[list(k), v] for k, v in self.values.items()]
+
+    def render(self, others=()):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self.lock:
+            values = dict(self.values)
+        for snapshot in others:
+            for label_values, value in snapshot:
+                key = tuple(label_values)
+                values[key] = values.get(key, 0) + value
+        items = sorted(values.items())
+        for label_values, value in items:
+            lines.append(f"{self.name}{_label_text(self.labels, label_values)} {_number(value)}")
+        return lines
+
+class Gauge:
+    """Value read from a callback when scraped, so updating it costs nothing"""
+
+    def __init__(self, name, help_text, callback=None):
+        self.name = name
+        self.help = help_text
+        self.callback = callback
+        _register(self)
+
+    def snapshot(self):
+        return [] # Read live from the callback, which sees shared state
+
+    def render(self, others=()):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} gauge"]
+        if self.callback:
+            lines.append(f"{self.name} {_number(self.callback())}")
+        return lines
+
+class Histogram:
+    """Cumulative-bucket histogram, optionally split by labels"""
+
+    def __init__(self, name, help_text, labels=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        self.series = {} # label values -> [bucket counts..., sum, count]
+        self.lock = threading.Lock()
+        _register(self)
+
+    def observe(self, value, *label_values):
+        index = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            series = self.series.get(label_values)
+            if series is None:
+                series = self.series[label_values] = [0] * (len(self.buckets) + 2)
+            if index < len(self.buckets):
+                series[index] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    @contextlib.contextmanager
+    def time(self, *label_values):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, *label_values)
+
+    def snapshot(self):
+        with self.lock:
+            return [[list(k), list(v)] for k, v in self.series.items()]
+
+    def render(self, others=()):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self.lock:
+            merged = {k: list(v) for k, v in self.series.items()}
+        for snapshot in others:
+            for label_values, values in snapshot:
+                key = tuple(label_values)
+                if key not in merged:
+                    merged[key] = list(values)
+                elif len(values) == len(merged[key]):
+                    merged[key] = [a + b for a, b in zip(merged[key], values)]
+        items = sorted(merged.items())
+        for label_values, series in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), series[:-2] + [series[-1] - sum(series[:-2])]):
+                cumulative += count
+                labels = _label_text(self.labels, label_values, [("le", _number(float(bound)))])
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _label_text(self.labels, label_values)
+            lines.append(f"{self.name}_sum{labels} {_number(series[-2])}")
+            lines.append(f"{self.name}_count{labels} {series[-1]}")
+        return lines
+
+def _register(metric):
+    with _registry_lock:
+        _registry.append(metric)
+
+def share_metrics(directory):
+    """Make render_metrics() cover every process writing to directory.
+
+    This process saves its counters and histograms to directory/<pid>.<start>.json
+    every SHARE_INTERVAL_SEC (and on flush_metrics()); rendering adds up the
+    files of the other processes. Used by the prefork server, whose /metrics
+    may be answered by any worker.
+    """
+    os.makedirs(directory, exist_ok=True)
+    _shared["dir"] = directory
+    _shared["path"] = os.path.join(directory, f"{os.getpid()}.{time.time_ns()}.json")
+
+    def loop():
+        while True:
+            time.sleep(SHARE_INTERVAL_SEC)
+            flush_metrics()
+
+    threading.Thread(target=loop, daemon=True).start()
+
+def flush_metrics():
+    """Save this process' snapshot now, if metrics are shared"""
+    path = _shared["path"]
+    if not path:
+        return
+    with _registry_lock:
+        metrics = list(_registry)
+    snapshot = {metric.name: metric.snapshot() for metric in metrics}
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(snapshot, f)
+    os.replace(tmp, path)
+
+def _other_snapshots():
+    directory = _shared["dir"]
+    if not directory:
+        return []
+    snapshots = []
+    for name in os.listdir(directory):
+        path = os.path.join(directory, name)
+        # Files of exited workers stay, so counters never go backwards
+        if not name.endswith(".json") or path == _shared["path"]:
+            continue
+        try:
+            with open(path) as f:
+                snapshots.append(json.load(f))
+        except (OSError, ValueError):
+            pass
+    return snapshots
+
+def render_metrics():
+    """Every registered metric in the Prometheus text exposition format"""
+    with _registry_lock:
+        metrics = list(_registry)
+    others = _other_snapshots()
+    lines = []
+    for metric in metrics:
+        lines.extend(metric.render([s.get(metric.name, []) for s in others]))
+    return "\n".join(lines) + "\n"
+
+# Grading pipeline metrics, updated by the runner and the compiler
+PHASE_SECONDS = Histogram(
+    "labtest_phase_seconds",
+    "Time spent per grading phase (discovery, keyword_check, compile, spawn, wait, compare)",
+    labels=("phase",)
+)
+VERDICTS = Counter("labtest_verdicts_total", "Test case results by verdict", labels=("verdict",))
+COMPILE_CACHE = Counter("labtest_compile_cache_total", "Compile cache lookups by result (hit, fail_hit, miss)", labels=("result",))
+RUNS = Counter("labtest_runs_total", "Graded problem runs")
+CASE_CACHE = Counter("labtest_case_cache_total", "Case result cache lookups by result (hit, miss)", labels=("result",))
+JOBS_QUEUED = Gauge("labtest_jobs_queued", "Web grading jobs waiting for a worker")
+JOBS_RUNNING = Gauge("labtest_jobs_running", "Web grading jobs being graded")
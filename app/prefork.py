@@ -0,0 +1,174 @@
+import os
+import sys
+import time
+import errno
+import signal
+import socket
+import threading
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from werkzeug.serving import BaseWSGIServer, WSGIRequestHandler
+
+# Idle keep-alive connections are closed after this many seconds, so they
+# don't hold a worker thread
+KEEPALIVE_TIMEOUT = 5
+# Pause before replacing a worker that died, so a crashing app doesn't spin
+RESPAWN_DELAY_SEC = 1
+# Listen backlog shared by every worker
+BACKLOG = 128
+STOP_SIGNALS = {signal.SIGTERM, signal.SIGINT}
+
+class _Handler(WSGIRequestHandler):
+    timeout = KEEPALIVE_TIMEOUT
+
+class PoolWSGIServer(BaseWSGIServer):
+    """Werkzeug server handling connections on a fixed number of threads.
+
+    A connection is only accepted when a thread is free; until then it stays
+    in the listen backlog, where another worker process can take it.
+    """
+    multithread = True
+
+    def __init__(self, host, port, app, fd, threads):
+        super().__init__(host, port, app, handler=_Handler, fd=fd)
+        self.socket.setblocking(False) # Every worker wakes up on a new connection, one gets it
+        self.pool = ThreadPoolExecutor(max_workers=threads)
+        self.slots = threading.Semaphore(threads)
+
+    def get_request(self):
+        # Waits a bit at most, so shutdown() is noticed while every thread is busy
+        if not self.slots.acquire(timeout=0.5):
+            raise OSError(errno.EAGAIN, "No free thread")
+        try:
+            return super().get_request()
+        except BaseException:
+            self.slots.release()
+            raise
+
+    def process_request(self, request, client_address):
+        self.pool.submit(self._process, request, client_address)
+
+    def _process(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+            self.slots.release()
+
+def _run_worker(app_factory, sock, host, port, threads, on_stop):
+    """Serve on the shared socket until SIGTERM / SIGINT, then finish in-flight requests"""
+    state = {"server": None, "stopping": False}
+
+    def stop(signum, frame):
+        state["stopping"] = True
+        if state["server"]:
+            # shutdown() waits for serve_forever(), which runs on this thread
+            threading.Thread(target=state["server"].shutdown, daemon=True).start()
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    if hasattr(signal, "pthread_sigmask"):
+        signal.pthread_sigmask(signal.SIG_UNBLOCK, STOP_SIGNALS) # Blocked by spawn() around fork
+
+    app = app_factory()
+    server = PoolWSGIServer(host, port, app, sock.fileno(), threads)
+    state["server"] = server
+    if not state["stopping"]:
+        server.serve_forever()
+    server.pool.shutdown(wait=True)
+    server.server_close()
+    if on_stop:
+        on_stop(app)
+
+def serve(app_factory, host="0.0.0.0", port=8080, workers=2, threads=16, graceful_timeout=30, on_stop=None, on_worker_exit=None):
+    """Serve a WSGI app from pre-forked worker processes sharing one listening socket.
+
+    Each worker builds its own app with app_factory() and handles up to
+    threads connections at once. A worker that dies is replaced. SIGTERM
+    or Ctrl+C stops accepting and lets workers finish their requests (then
+    on_stop(app)) for up to graceful_timeout seconds before killing them;
+    a second Ctrl+C kills them right away. on_worker_exit(pid) is called
+    in this process for every worker that exits.
+
+    Without os.fork (Windows) the app is served from this process only.
+    """
+    sock = socket.create_server((host, port), backlog=BACKLOG)
+    sock.setblocking(False)
+
+    if not hasattr(os, "fork"):
+        print("⚠️  Pre-forked workers need os.fork, serving from a single process")
+        try:
+            _run_worker(app_factory, sock, host, port, threads, on_stop)
+        finally:
+            sock.close()
+        return 0
+
+    children = set()
+    state = {"stopping": False, "deadline": None}
+
+    def spawn():
+        # Until the child has its own handlers, a signal would run the parent's
+        signal.pthread_sigmask(signal.SIG_BLOCK, STOP_SIGNALS)
+        pid = os.fork()
+        if pid == 0:
+            code = 0
+            try:
+                _run_worker(app_factory, sock, host, port, threads, on_stop)
+            except BaseException:
+                traceback.print_exc()
+                code = 1
+            finally:
+                sys.stdout.flush()
+                sys.stderr.flush()
+                os._exit(code)
+        children.add(pid)
+        signal.pthread_sigmask(signal.SIG_UNBLOCK, STOP_SIGNALS)
+
+    def signal_all(signum):
+        for pid in list(children):
+            try:
+                os.kill(pid, signum)
+            except ProcessLookupError:
+                pass
+
+    def stop(signum, frame):
+        if state["stopping"]:
+            signal_all(signal.SIGKILL)
+            return
+        state["stopping"] = True
+        state["deadline"] = time.monotonic() + graceful_timeout
+        print(f"\n🛑 Stopping, waiting up to {graceful_timeout}s for running requests (Ctrl+C again to force)")
+        signal_all(signal.SIGTERM)
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    for _ in range(workers):
+        spawn()
+
+    try:
+        while children:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                break
+            if pid == 0:
+                if state["stopping"] and time.monotonic() > state["deadline"]:
+                    print(f"⚠️  {len(children)} worker(s) still busy after {graceful_timeout}s, killing them")
+                    signal_all(signal.SIGKILL)
+                    state["deadline"] = float("inf")
+                time.sleep(0.2)
+                continue
+            children.discard(pid)
+            if on_worker_exit:
+                on_worker_exit(pid)
+            if not state["stopping"]:
+                print(f"⚠️  Worker {pid} exited (status {status}), starting a new one")
+                time.sleep(RESPAWN_DELAY_SEC)
+                if not state["stopping"]:
+                    spawn()
+    finally:
+        sock.close()
+    return 0
@@ -0,0 +1,138 @@
+import os
+import json
+import gzip
+import hashlib
+import threading
+import markdown
+from app.config import get_problem_spec
+from app.manifest import get_manifest
+from app.fixtures import preview
+from app.compare import PREVIEW_LIMIT
+
+PROBLEMS_DIR = "problems"
+# Description languages looked up as problems/<prob>.<lang>.md, after problems/<prob>.md
+DESCRIPTION_LANGS = ['en', 'zh', 'zh-tw', 'zh-cn', 'ja', 'es', 'fr', 'de']
+MARKDOWN_EXTENSIONS = ['fenced_code', 'tables']
+# Rendered (prob, lang, preview) responses kept, oldest dropped first
+INFO_CACHE_SIZE = 256
+
+class InfoBody:
+    """A rendered /api/problem/<prob>/info body with its gzip copy and ETag"""
+    __slots__ = ("json", "gzip", "etag")
+
+    def __init__(self, payload):
+        self.json = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        self.gzip = gzip.compress(self.json, compresslevel=6, mtime=0)
+        self.etag = hashlib.sha256(self.json).hexdigest()[:32]
+
+# problems dir mtime_ns -> {prob: {lang: path}}
+_listing = {"stamp": None, "files": {}}
+# (prob, lang, preview) -> (stamp, InfoBody)
+_info_cache = {}
+_lock = threading.Lock()
+
+def _description_files(prob):
+    """lang -> description path for prob ('' is the default file), in lookup order.
+
+    The problems directory is listed once per change instead of probing
+    every language on each request.
+    """
+    try:
+        stamp = os.stat(PROBLEMS_DIR).st_mtime_ns
+    except OSError:
+        return {}
+    with _lock:
+        if _listing["stamp"] != stamp:
+            files = {}
+            known = {f".{lang}.md": lang for lang in DESCRIPTION_LANGS}
+            for name in os.listdir(PROBLEMS_DIR):
+                if not name.endswith(".md"):
+                    continue
+                base, dot, rest = name.partition(".")
+                lang = "" if rest == "md" else known.get(f".{rest}")
+                if lang is not None:
+                    files.setdefault(base, {})[lang] = os.path.join(PROBLEMS_DIR, name)
+            _listing.update(stamp=stamp, files=files)
+        found = _listing["files"].get(prob, {})
+    order = [''] + DESCRIPTION_LANGS
+    return {lang: found[lang] for lang in order if lang in found}
+
+def _render(prob, spec, desc_file, available_langs, cases, preview_bytes):
+    if desc_file:
+        with open(desc_file, 'r', encoding='utf-8') as f:
+            desc_content = markdown.markdown(f.read(), extensions=MARKDOWN_EXTENSIONS)
+    else:
+        desc_content = markdown.markdown(f"# {prob}\\nNo description available.", extensions=MARKDOWN_EXTENSIONS)
+
+    # Sample cases come from the manifest previews; preview_bytes reads
+    # just that many bytes of each fixture instead
+    test_cases = []
+    for case in cases or []:
+        if not case["output"]:
+            continue
+        if preview_bytes is None:
+            test_cases.append({
+                'input': case["in_preview"].strip(),
+                'expected': case["out_preview"].strip()
+            })
+        else:
+            limit = min(max(preview_bytes, 0), PREVIEW_LIMIT)
+            test_cases.append({
+                'input': preview(case["input"], limit).strip(),
+                'expected': preview(case["output"], limit).strip()
+            })
+
+    return {
+        "name": prob,
+        "display_name": spec.name,
+        "description_html": desc_content,
+        "points": spec.points,
+        "timeout": spec.timeout,
+        "forbidden": spec.forbidden,
+        "required": spec.required,
+        "test_cases": test_cases,
+        "available_langs": available_langs
+    }
+
+def get_problem_info(config, prob, lang='', preview_bytes=None):
+    """InfoBody of a problem's description (in lang, falling back to the
+    default then the first language found), settings and sample cases.
+
+    Rendered once per (prob, lang, preview_bytes) and reused until the
+    description file, the problems listing, the problem's config or its
+    test manifest change.
+    """
+    files = _description_files(prob)
+    available_langs = list(files)
+    if lang and lang in files:
+        desc_file = files[lang]
+    elif '' in files:
+        desc_file = files['']
+    else:
+        desc_file = next(iter(files.values()), None)
+    try:
+        st = os.stat(desc_file) if desc_file else None
+    except OSError:
+        desc_file, st = None, None
+
+    spec = get_problem_spec(config, prob)
+    cases = get_manifest(prob)
+    # The spec and case list are shared objects replaced on change, holding
+    # them in the stamp keeps identity comparisons safe
+    stamp = (desc_file, st and st.st_mtime_ns, st and st.st_size, tuple(available_langs), spec, cases)
+    key = (prob, lang, preview_bytes)
+    with _lock:
+        entry = _info_cache.get(key)
+    if entry and _same_stamp(entry[0], stamp):
+        return entry[1]
+
+    body = InfoBody(_render(prob, spec, desc_file, available_langs, cases, preview_bytes))
+    with _lock:
+        _info_cache.pop(key, None)
+        if len(_info_cache) >= INFO_CACHE_SIZE:
+            _info_cache.pop(next(iter(_info_cache)))
+        _info_cache[key] = (stamp, body)
+    return body
+
+def _same_stamp(a, b):
+    return a[:4] == b[:4] and a[4] is b[4] and a[5] is b[5]
@@ -0,0 +1,228 @@
+import os
+import json
+import time
+import hashlib
+import sqlite3
+import threading
+from app.utils import BUILD_DIR
+
+DB_PATH = os.path.join(BUILD_DIR, "results.db")
+SCHEMA_VERSION = 5
+# Cached case verdicts kept, oldest are dropped first
+CASE_CACHE_MAX_ROWS = 100000
+# Runs (and their cases) kept per submission and problem, older ones are dropped
+RUNS_KEPT_PER_PROB = 50
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY,
+    submission TEXT NOT NULL DEFAULT '',
+    prob TEXT NOT NULL,
+    finished_at REAL NOT NULL,
+    score INTEGER NOT NULL,
+    total_points INTEGER NOT NULL,
+    passed INTEGER NOT NULL,
+    total INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS runs_latest ON runs (submission, prob, id);
+CREATE INDEX IF NOT EXISTS runs_prob ON runs (prob, id);
+CREATE TABLE IF NOT EXISTS cases (
+    run_id INTEGER NOT NULL REFERENCES runs (id) ON DELETE CASCADE,
+    idx INTEGER NOT NULL,
+    name TEXT NOT NULL,
+    status TEXT NOT NULL,
+    msg TEXT,
+    mismatch_line INTEGER,
+    wall_ms INTEGER,
+    cpu_ms INTEGER,
+    peak_rss_kb INTEGER,
+    detail TEXT,
+    PRIMARY KEY (run_id, idx)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS case_cache (
+    key TEXT PRIMARY KEY,
+    verdict TEXT NOT NULL,
+    data TEXT,
+    usage TEXT,
+    created_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS case_cache_age ON case_cache (created_at);
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    name TEXT NOT NULL,
+    pid INTEGER NOT NULL,
+    state TEXT NOT NULL,
+    result TEXT,
+    created_at REAL NOT NULL,
+    finished_at REAL
+);
+CREATE INDEX IF NOT EXISTS jobs_state ON jobs (state, finished_at);
+CREATE TABLE IF NOT EXISTS job_events (
+    job_id TEXT NOT NULL REFERENCES jobs (id) ON DELETE CASCADE,
+    seq INTEGER NOT NULL,
+    event TEXT NOT NULL,
+    data TEXT NOT NULL,
+    PRIMARY KEY (job_id, seq)
+) WITHOUT ROWID;
+"""
+
+# sqlite3 connections can't be shared between threads, keep one per thread
+_local = threading.local()
+
+def _forget_connections():
+    global _local
+    _local = threading.local()
+
+# Nor between processes: a forked server worker opens its own
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_forget_connections)
+
+def _connect(path):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    conn = sqlite3.connect(path, timeout=10)
+    conn.row_factory = sqlite3.Row
+    # WAL lets the web server read while the CLI / daemon / batch runs write
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute("PRAGMA foreign_keys=ON")
+    if conn.execute("PRAGMA user_version").fetchone()[0] != SCHEMA_VERSION:
+        with conn:
+            conn.executescript(SCHEMA)
+            # Databases from before version 4 lack the full case detail
+            columns = [row[1] for row in conn.execute("PRAGMA table_info(cases)")]
+            if "detail" not in columns:
+                conn.execute("ALTER TABLE cases ADD COLUMN detail TEXT")
+            conn.execute(f"PRAGMA user_version={SCHEMA_VERSION}")
+    return conn
+
+def get_db(path=DB_PATH):
+    conns = getattr(_local, "conns", None)
+    if conns is None:
+        conns = _local.conns = {}
+    if path not in conns:
+        conns[path] = _connect(path)
+    return conns[path]
+
+def count_cases(details):
+    """(passed, total) test cases of a details list, compile / keyword failures count as 0 cases"""
+    cases = [d for d in details if d.get("case") not in ("Compilation", "Keyword Check")]
+    return sum(1 for d in cases if d.get("status") == "PASS"), len(cases)
+
+def record_run(prob, score, total_points, details, submission="", path=DB_PATH):
+    """Store one graded run and its cases in a single transaction, returns the run id"""
+    passed, total = count_cases(details)
+    conn = get_db(path)
+    with conn:
+        cur = conn.execute(
+            "INSERT INTO runs (submission, prob, finished_at, score, total_points, passed, total) VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (submission, prob, time.time(), score, total_points, passed, total)
+        )
+        run_id = cur.lastrowid
+        conn.executemany(
+            "INSERT INTO cases (run_id, idx, name, status, msg, mismatch_line, wall_ms, cpu_ms, peak_rss_kb, detail) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            [
+                (run_id, i, d.get("case", ""), d.get("status", ""), d.get("msg"), d.get("mismatch_line"),
+                 d.get("wall_ms"), d.get("cpu_ms"), d.get("peak_rss_kb"), json.dumps(d, ensure_ascii=False))
+                for i, d in enumerate(details)
+            ]
+        )
+        # Cases go with their runs (ON DELETE CASCADE)
+        conn.execute(
+            """DELETE FROM runs WHERE submission = ? AND prob = ? AND id <= (
+                   SELECT id FROM runs WHERE submission = ? AND prob = ? ORDER BY id DESC LIMIT 1 OFFSET ?
+               )""",
+            (submission, prob, submission, prob, RUNS_KEPT_PER_PROB)
+        )
+    return run_id
+
+def latest_results(submission="", path=DB_PATH):
+    """prob -> latest run row (score, total_points, passed, total, ...) of a submission"""
+    if not os.path.exists(path):
+        return {}
+    rows = get_db(path).execute(
+        """SELECT * FROM runs WHERE id IN (
+               SELECT MAX(id) FROM runs WHERE submission = ? GROUP BY prob
+           )""",
+        (submission,)
+    ).fetchall()
+    return {row["prob"]: dict(row) for row in rows}
+
+def get_run(run_id, path=DB_PATH):
+    """Run row of run_id, or None"""
+    if not os.path.exists(path):
+        return None
+    row = get_db(path).execute("SELECT * FROM runs WHERE id = ?", (run_id,)).fetchone()
+    return dict(row) if row else None
+
+def run_cases(run_id, offset=0, limit=-1, path=DB_PATH):
+    """Case rows of a run, in case order; limit=-1 returns every case from offset"""
+    rows = get_db(path).execute(
+        "SELECT * FROM cases WHERE run_id = ? ORDER BY idx LIMIT ? OFFSET ?", (run_id, limit, offset)
+    ).fetchall()
+    return [dict(row) for row in rows]
+
+def case_detail(row):
+    """Full detail dict of a case row, as built by the runner"""
+    if row.get("detail"):
+        return json.loads(row["detail"])
+    # Recorded before version 4: only the summary columns exist
+    keys = ("msg", "mismatch_line", "wall_ms", "cpu_ms", "peak_rss_kb")
+    detail = {"case": row["name"], "status": row["status"]}
+    detail.update((k, row[k]) for k in keys if row.get(k) is not None)
+    return detail
+
+def case_failure_rates(prob, recent_runs=200, path=DB_PATH):
+    """case name -> fraction of non-PASS results over the last recent_runs runs of prob (any submission)"""
+    if not os.path.exists(path):
+        return {}
+    rows = get_db(path).execute(
+        """SELECT name, AVG(status NOT IN ('PASS', 'SKIPPED')) AS rate FROM cases
+           WHERE status != 'SKIPPED' AND run_id IN (
+               SELECT id FROM runs WHERE prob = ? ORDER BY id DESC LIMIT ?
+           )
+           GROUP BY name""",
+        (prob, recent_runs)
+    ).fetchall()
+    return {row["name"]: row["rate"] for row in rows}
+
+def case_key(bin_digest, in_digest, out_digest, compare, timeout):
+    """Cache key of one case run: binary, input, expected output, comparator and limits"""
+    spec = json.dumps(compare or {}, sort_keys=True)
+    raw = "\0".join([bin_digest, in_digest, out_digest, spec, str(timeout)])
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+def cached_cases(keys, path=DB_PATH):
+    """key -> (verdict, data, usage) for the keys found in the case cache"""
+    keys = list(keys)
+    if not keys:
+        return {}
+    conn = get_db(path)
+    found = {}
+    # Stay below SQLite's bound-parameter limit
+    for i in range(0, len(keys), 500):
+        chunk = keys[i:i + 500]
+        rows = conn.execute(
+            f"SELECT key, verdict, data, usage FROM case_cache WHERE key IN ({','.join('?' * len(chunk))})",
+            chunk
+        ).fetchall()
+        for row in rows:
+            found[row["key"]] = (row["verdict"], json.loads(row["data"]), json.loads(row["usage"]))
+    return found
+
+def store_cases(entries, path=DB_PATH):
+    """Save [(key, verdict, data, usage), ...] to the case cache in one transaction"""
+    if not entries:
+        return
+    conn = get_db(path)
+    now = time.time()
+    with conn:
+        conn.executemany(
+            "INSERT OR REPLACE INTO case_cache (key, verdict, data, usage, created_at) VALUES (?, ?, ?, ?, ?)",
+            [(key, verdict, json.dumps(data), json.dumps(usage), now) for key, verdict, data, usage in entries]
+        )
+        count = conn.execute("SELECT COUNT(*) FROM case_cache").fetchone()[0]
+        if count > CASE_CACHE_MAX_ROWS:
+            conn.execute(
+                "DELETE FROM case_cache WHERE key IN (SELECT key FROM case_cache ORDER BY created_at LIMIT ?)",
+                (count - CASE_CACHE_MAX_ROWS,)
+            )
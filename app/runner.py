@@ -1,14 +1,25 @@
 import os
+import sys
 import time
-import glob
+import signal
+import threading
+import contextlib
 import subprocess
-from app.utils import Colors, get_prefixes, print_diff, BUILD_DIR, TESTS_DIR
-from app.config import get_config_val, get_problem_points, get_timeout
-from app.compiler import find_source, compile_problem_with_log
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
+from app.utils import get_prefixes, print_diff, BUILD_DIR, SRC_DIR
+from app.config import load_config, get_config_val, get_problem_spec, get_jobs, get_fail_fast, get_workspace_keep
+from app.compiler import find_source, compile_problem_with_log, binary_digest
+from app.compare import get_comparator, digest_kind, expected_digest, read_preview, diff_window, FAIL_PREVIEW_LIMIT
+from app.manifest import get_manifest
+from app.fixtures import open_fixture, is_plain, start_feed
+from app.lexer import scan_source, has_keyword
+from app.results import record_run, count_cases, case_key, cached_cases, store_cases, case_failure_rates
+from app.workspace import create_workspace, export_artifacts, release_workspace, write_atomic
+from app.usage import get_usage_helper, read_report
+from app.metrics import PHASE_SECONDS, VERDICTS, RUNS, CASE_CACHE
 
 def check_keywords(config, prob, src_file):
-    with open(src_file, 'r', encoding='utf-8', errors='ignore') as f:
-        content = f.read()
+    tokens = scan_source(src_file)
     
     prefixes = get_prefixes()
     
@@ -18,8 +29,7 @@ def check_keywords(config, prob, src_file):
         for keyword in forbidden.split(','):
             keyword = keyword.strip()
             if not keyword: continue
-            import re
-            if re.search(r'\b' + re.escape(keyword) + r'\b', content):
+            if has_keyword(tokens, keyword):
                 print(f"{prefixes['FAIL']} Forbidden keyword found: '{keyword}'")
                 return False
 
@@ -29,8 +39,7 @@ def check_keywords(config, prob, src_file):
         for keyword in required.split(','):
             keyword = keyword.strip()
             if not keyword: continue
-            import re
-            if not re.search(r'\b' + re.escape(keyword) + r'\b', content):
+            if not has_keyword(tokens, keyword):
                 print(f"{prefixes['FAIL']} Required keyword missing: '{keyword}'")
                 return False
                 
@@ -38,9 +47,6 @@ def check_keywords(config, prob, src_file):
 
 def check_keywords_detailed(config, prob, src_file):
     """Check keywords and return detailed result"""
-    with open(src_file, 'r', encoding='utf-8', errors='ignore') as f:
-        content = f.read()
-    
     result = {
         'passed': True,
         'message': '',
@@ -49,45 +55,26 @@ def check_keywords_detailed(config, prob, src_file):
         'violations': []
     }
     
-    # Get forbidden keywords
-    forbidden = None
-    if 'problems' in config and isinstance(config['problems'], dict):
-        if prob in config['problems'] and isinstance(config['problems'][prob], dict):
-            forbidden = config['problems'][prob].get('forbidden')
-    if forbidden is None:
-        forbidden_str = get_config_val(config, f"forbidden.{prob}")
-        if forbidden_str:
-            forbidden = [k.strip() for k in forbidden_str.split(',') if k.strip()]
+    spec = get_problem_spec(config, prob)
+    if not spec.forbidden and not spec.required:
+        return result
     
-    if forbidden:
-        if isinstance(forbidden, str):
-            forbidden = [k.strip() for k in forbidden.split(',') if k.strip()]
-        result['forbidden'] = forbidden
+    # Tokenized once per distinct source, comments and string literals are ignored
+    tokens = scan_source(src_file)
+    
+    if spec.forbidden:
+        result['forbidden'] = list(spec.forbidden)
         
-        for keyword in forbidden:
-            import re
-            if re.search(r'\b' + re.escape(keyword) + r'\b', content):
+        for keyword in spec.forbidden:
+            if has_keyword(tokens, keyword):
                 result['passed'] = False
                 result['violations'].append(f"Forbidden keyword found: '{keyword}'")
     
-    # Get required keywords
-    required = None
-    if 'problems' in config and isinstance(config['problems'], dict):
-        if prob in config['problems'] and isinstance(config['problems'][prob], dict):
-            required = config['problems'][prob].get('required')
-    if required is None:
-        required_str = get_config_val(config, f"required.{prob}")
-        if required_str:
-            required = [k.strip() for k in required_str.split(',') if k.strip()]
-    
-    if required:
-        if isinstance(required, str):
-            required = [k.strip() for k in required.split(',') if k.strip()]
-        result['required'] = required
+    if spec.required:
+        result['required'] = list(spec.required)
         
-        for keyword in required:
-            import re
-            if not re.search(r'\b' + re.escape(keyword) + r'\b', content):
+        for keyword in spec.required:
+            if not has_keyword(tokens, keyword):
                 result['passed'] = False
                 result['violations'].append(f"Required keyword missing: '{keyword}'")
     
@@ -96,75 +83,267 @@ def check_keywords_detailed(config, prob, src_file):
     
     return result
 
-def run_test_case(bin_path, input_file, expected_file, timeout_sec):
+# Deterministic verdicts are reused; TLE depends on machine load and is always rerun
+CACHEABLE_VERDICTS = ("PASS", "FAIL", "Runtime Error")
+# Extra seconds the usage helper gets to enforce the limit before its whole session is killed
+HELPER_GRACE_SEC = 1
+
+def _wait_with_usage(proc, timeout_sec, report=None):
+    """Wait for proc, killing it after timeout_sec.
+
+    Returns (timed_out, usage) where usage is {wall_ms, cpu_ms, peak_rss_kb}
+    (cpu / memory are None where os.wait4 is not available, e.g. on
+    Windows). When proc is the usage helper, report is the read end of its
+    pipe: the helper enforces the limit and reports the submission's own
+    rusage. Without it the rusage is proc's, whose peak RSS never drops
+    below the grader's resident size (Linux keeps it across exec).
+    """
+    start = time.monotonic()
+    if not hasattr(os, "wait4"):
+        try:
+            proc.wait(timeout=timeout_sec)
+            timed_out = False
+        except subprocess.TimeoutExpired:
+            proc.kill()
+            proc.wait() # Ensure it's dead
+            timed_out = True
+        return timed_out, {"wall_ms": round((time.monotonic() - start) * 1000), "cpu_ms": None, "peak_rss_kb": None}
+
+    state = {"done": False, "timed_out": False}
+    lock = threading.Lock()
+
+    def on_timeout():
+        with lock:
+            if not state["done"]:
+                state["timed_out"] = True
+                if report is None:
+                    proc.kill()
+                else:
+                    os.killpg(proc.pid, signal.SIGKILL) # Helper and submission
+
+    timer = threading.Timer(timeout_sec + (HELPER_GRACE_SEC if report is not None else 0), on_timeout)
+    timer.start()
+    try:
+        if hasattr(os, "waitid"):
+            # Leave the child a zombie until the timer can no longer kill it,
+            # so its pid is never reused under us
+            os.waitid(os.P_PID, proc.pid, os.WEXITED | os.WNOWAIT)
+        with lock:
+            state["done"] = True
+        _, status, rusage = os.wait4(proc.pid, 0)
+    finally:
+        timer.cancel()
+    wall = time.monotonic() - start
+    proc.returncode = os.waitstatus_to_exitcode(status)
+
+    timed_out = state["timed_out"]
+    peak_rss = rusage.ru_maxrss
+    cpu_ms = round((rusage.ru_utime + rusage.ru_stime) * 1000)
+    if report is not None:
+        measured = read_report(report)
+        if measured:
+            helper_timed_out, peak_rss, cpu_ms = measured
+            timed_out = timed_out or helper_timed_out
+        else:
+            peak_rss = None # Killed before it could report
+    if peak_rss is not None and sys.platform == "darwin":
+        peak_rss //= 1024 # bytes on macOS, KiB elsewhere
+    return timed_out, {
+        "wall_ms": round(wall * 1000),
+        "cpu_ms": cpu_ms,
+        "peak_rss_kb": peak_rss
+    }
+
+def format_usage(usage):
+    """Short `12 ms, cpu 8 ms, 3.1 MB` summary of a case's resource usage"""
+    if not usage:
+        return ""
+    parts = [f"{usage['wall_ms']} ms"]
+    if usage.get("cpu_ms") is not None:
+        parts.append(f"cpu {usage['cpu_ms']} ms")
+    if usage.get("peak_rss_kb") is not None:
+        parts.append(f"{usage['peak_rss_kb'] / 1024:.1f} MB")
+    return ", ".join(parts)
+
+def _compare_output(f_out, expected_file, mode, digest, find_mismatch, expected_hash=None):
+    """(verdict, data) of the output in f_out against expected_file"""
+    if expected_hash is None:
+        expected_hash = expected_digest(expected_file, mode)
+    f_out.seek(0)
+    if digest(f_out) == expected_hash:
+        return "PASS", None
+    
+    f_out.seek(0)
+    with open_fixture(expected_file) as fexp:
+        mismatch = find_mismatch(fexp, f_out)
+    if mismatch is None:
+        return "PASS", None
+    # Reopened rather than rewound, compressed streams can't seek back cheaply
+    with open_fixture(expected_file) as fexp:
+        expected = read_preview(fexp, FAIL_PREVIEW_LIMIT)
+    f_out.seek(0)
+    got = read_preview(f_out, FAIL_PREVIEW_LIMIT)
+    f_out.seek(0)
+    with open_fixture(expected_file) as fexp:
+        diff = diff_window(fexp, f_out, mismatch["line"], mode)
+    
+    return "FAIL", {
+        "expected": expected,
+        "got": got,
+        "line": mismatch["line"],
+        "offset": mismatch["offset"],
+        "diff": diff
+    }
+
+def _spawn(bin_path, input_file, f_out, f_err, timeout_sec):
+    """Start bin_path on a fixture, returns (proc, feeder thread or None, report fd or None).
+
+    A plain file is the child's stdin as is; compressed and packed fixtures
+    are decompressed into a pipe by a feeder thread as the child reads.
+    Where the usage helper is available, proc is the helper running
+    bin_path in its own session and report is the pipe it reports on.
+    """
+    fin = open_fixture(input_file)
+    plain = is_plain(input_file)
+    helper = get_usage_helper()
+    report = write_end = None
+    cmd = [os.path.abspath(bin_path)]
+    if helper:
+        report, write_end = os.pipe()
+        cmd = [helper, str(write_end), str(round(timeout_sec * 1000))] + cmd
+    try:
+        proc = subprocess.Popen(
+            cmd,
+            stdin=fin if plain else subprocess.PIPE,
+            stdout=f_out,
+            stderr=f_err,
+            pass_fds=(write_end,) if helper else (),
+            start_new_session=bool(helper)
+        )
+    except BaseException:
+        fin.close()
+        if helper:
+            os.close(report)
+        raise
+    finally:
+        if helper:
+            os.close(write_end)
+    if plain:
+        fin.close()
+        return proc, None, report
+    try:
+        return proc, start_feed(fin, proc.stdin), report
+    except Exception as e:
+        proc.kill()
+        proc.wait()
+        if report is not None:
+            os.close(report)
+        raise RuntimeError(f"Failed to read {input_file}: {e}") from e
+
+def run_test_case(bin_path, input_file, expected_file, timeout_sec, compare=None, expected_hash=None):
+    """Run one case, returns (verdict, data, usage); usage is None if the binary never ran.
+
+    input_file / expected_file are fixture refs: paths (optionally .gz /
+    .zst) or cases.zip members.
+    """
     import tempfile
     
     # Create temp files for stdout and stderr
-    # Open in text mode ('w+') to match Popen text=True
-    with tempfile.TemporaryFile(mode='w+') as f_out, tempfile.TemporaryFile(mode='w+') as f_err:
+    # Binary mode: output is compared as a byte stream, never loaded whole
+    with tempfile.TemporaryFile(mode='w+b') as f_out, tempfile.TemporaryFile(mode='w+b') as f_err:
+        usage = None
         try:
-            with open(input_file, 'r') as fin:
-                # Use Popen instead of run to have better control
-                proc = subprocess.Popen(
-                    [bin_path],
-                    stdin=fin,
-                    stdout=f_out,
-                    stderr=f_err,
-                    text=True,
-                    encoding='utf-8',
-                    errors='replace'
-                )
+            mode, digest, find_mismatch = get_comparator(compare)
+            
+            with PHASE_SECONDS.time("spawn"):
+                proc, feeder, report = _spawn(bin_path, input_file, f_out, f_err, timeout_sec)
                 
-            try:
-                proc.wait(timeout=timeout_sec)
-            except subprocess.TimeoutExpired:
-                proc.kill()
-                proc.wait() # Ensure it's dead
-                return "TLE", None
+            with PHASE_SECONDS.time("wait"):
+                timed_out, usage = _wait_with_usage(proc, timeout_sec, report)
+                if feeder:
+                    feeder.join()
+            if feeder and feeder.error:
+                return "Error", f"Failed to read {input_file}: {feeder.error}", usage
+            if timed_out:
+                return "TLE", None, usage
             
             if proc.returncode != 0:
                 f_err.seek(0)
-                content = f_err.read()
-                err_output = content.decode('utf-8', errors='replace') if isinstance(content, bytes) else content
-                return "Runtime Error", err_output
+                return "Runtime Error", read_preview(f_err), usage
                 
-            # Compare output
-            f_out.seek(0)
-            # Read with limit to avoid memory issues if output is huge (though TLE should catch infinite loops)
-            # But if it finished within time but produced 1GB of data, we don't want to crash.
-            got = f_out.read(1024 * 1024) # Limit to 1MB
-            if f_out.read(1): # Check if there's more
-                got += "\n... (output truncated)"
-            
-            # Normalize line endings
-            got = got.replace('\r\n', '\n')
-            
-            with open(expected_file, 'r') as fexp:
-                expected = fexp.read().replace('\r\n', '\n')
-            
-            if got.strip() == expected.strip(): # Use strip to be lenient on trailing newlines
-                return "PASS", None
-            else:
-                return "FAIL", (expected, got)
+            # Compare output: the expected side is only read on a digest mismatch
+            with PHASE_SECONDS.time("compare"):
+                return _compare_output(f_out, expected_file, mode, digest, find_mismatch, expected_hash) + (usage,)
                     
         except Exception as e:
-            return "Error", str(e)
+            return "Error", str(e), usage
+
+def run_case(bin_path, case, timeout_sec, compare=None):
+    """Run one manifest case against its expected output, safe to call from worker threads"""
+    if not case["output"]:
+        return "Missing", None, None
+    
+    try:
+        kind = digest_kind((compare or {}).get("mode", "exact"))
+    except ValueError:
+        kind = None # run_test_case reports the bad mode
+    return run_test_case(bin_path, case["input"], case["output"], timeout_sec, compare, case["digests"].get(kind))
+
+def finish_workspace(workspace, build_dir):
+    """Export a run's binary and compile log to build_dir, then release its workspace"""
+    try:
+        export_artifacts(workspace, build_dir)
+    finally:
+        release_workspace(workspace, get_workspace_keep(load_config()))
 
-def run_problem(prob, config, capture_logs=False):
+def save_result(prob, build_dir, score, total_points, details, submission="", on_saved=None, workspace=None):
+    """Record a finished run in the results store and export build/<prob>.score / .cases.
+
+    on_saved(run_id) is called with the results-store id of the run. The
+    run's workspace, if any, is exported and released afterwards.
+    """
+    passed_count, total_count = count_cases(details)
+    RUNS.inc()
+    run_id = record_run(prob, score, total_points, details, submission=submission)
+    if on_saved:
+        on_saved(run_id)
+    
+    # Plain-text artifacts are kept for the autograding workflow
+    # Swapped in whole, concurrent runs of a problem never interleave them
+    write_atomic(os.path.join(build_dir, f"{prob}.score"), f"{score} {total_points}")
+    write_atomic(os.path.join(build_dir, f"{prob}.cases"), f"{passed_count} {total_count}")
+    if workspace:
+        finish_workspace(workspace, build_dir)
+
+def prepare_problem(prob, config, capture_logs=False, out=None, src_dir=SRC_DIR, build_dir=BUILD_DIR, submission="", fail_fast=None, on_saved=None, cpu_slots=None):
+    """Find, keyword-check and compile a problem.
+
+    Returns (plan, None) when the problem is ready to run its cases, or
+    (None, result) with the final (fail, score, total_score, details) tuple
+    when it stops early. src_dir / build_dir default to the local src/ and
+    build/, batch grading points them at each submission (named submission
+    in the results store). fail_fast overrides test.stop_on_first_fail.
+    on_saved is passed to save_result when the run stops early.
+    cpu_slots (a semaphore) is held while compiling and while each case
+    runs, so compile and case pools working at once share one CPU budget.
+    """
     prefixes = get_prefixes()
     if not capture_logs:
-        print("========================================================")
+        print("========================================================", file=out)
     
-    src = find_source(prob)
+    with PHASE_SECONDS.time("discovery"):
+        src = find_source(prob, src_dir)
     if not src:
-        if not capture_logs: print(f"❌ No source for {prob}")
-        return 0, 0, 0, [] # fail, score, total_score, details
+        if not capture_logs: print(f"❌ No source for {prob}", file=out)
+        return None, (0, 0, 0, []) # fail, score, total_score, details
+
+    spec = get_problem_spec(config, prob)
 
     # Keyword Check
-    keyword_check_result = check_keywords_detailed(config, prob, src)
+    with PHASE_SECONDS.time("keyword_check"):
+        keyword_check_result = check_keywords_detailed(config, prob, src)
     if not keyword_check_result['passed']:
-        total_points = get_problem_points(config, prob)
-        return 1, 0, total_points, [{
+        details = [{
             "case": "Keyword Check", 
             "status": "FAIL", 
             "msg": keyword_check_result['message'],
@@ -172,78 +351,191 @@ def run_problem(prob, config, capture_logs=False):
             "required": keyword_check_result.get('required', []),
             "violations": keyword_check_result.get('violations', [])
         }]
+        os.makedirs(build_dir, exist_ok=True)
+        save_result(prob, build_dir, 0, spec.points, details, submission, on_saved)
+        return None, (1, 0, spec.points, details)
 
-    # Compile
-    if not os.path.exists(BUILD_DIR):
-        os.makedirs(BUILD_DIR)
+    # Compile into a private workspace, concurrent runs of prob never share files
+    os.makedirs(build_dir, exist_ok=True)
+    workspace = create_workspace(prob)
         
-    bin_path, compile_log = compile_problem_with_log(prob, src, BUILD_DIR)
+    with PHASE_SECONDS.time("compile"), cpu_slots or contextlib.nullcontext():
+        bin_path, compile_log = compile_problem_with_log(prob, src, workspace)
     if not bin_path:
         if not capture_logs:
-            print(f"{prefixes['FAIL']} Compilation failed:")
-            print(compile_log)
+            print(f"{prefixes['FAIL']} Compilation failed:", file=out)
+            print(compile_log, file=out)
             
-        total_points = get_problem_points(config, prob)
-        return 1, 0, total_points, [{
+        details = [{
             "case": "Compilation", 
             "status": "FAIL", 
             "msg": "Compilation failed",
             "log": compile_log
         }]
+        save_result(prob, build_dir, 0, spec.points, details, submission, on_saved, workspace)
+        return None, (1, 0, spec.points, details)
 
     # Discover tests
-    prob_tests_dir = os.path.join(TESTS_DIR, prob)
-    inputs_dir = os.path.join(prob_tests_dir, "inputs")
-    outputs_dir = os.path.join(prob_tests_dir, "outputs")
+    try:
+        kinds = (digest_kind(spec.compare.get("mode", "exact")),)
+    except ValueError:
+        kinds = () # Reported on every case by run_test_case
+    with PHASE_SECONDS.time("discovery"):
+        cases = get_manifest(prob, kinds)
+    
+    if cases is None:
+        if not capture_logs: print(f"{prefixes['FAIL']} No tests found for {prob}", file=out)
+        finish_workspace(workspace, build_dir)
+        return None, (1, 0, 0, [])
+
+    if not cases:
+        if not capture_logs: print(f"{prefixes['FAIL']} No input files found", file=out)
+        finish_workspace(workspace, build_dir)
+        return None, (1, 0, 0, [])
+
+    return {
+        "prob": prob,
+        "submission": submission,
+        "build_dir": build_dir,
+        "workspace": workspace,
+        "bin_path": bin_path,
+        "cases": cases,
+        "total_points": spec.points,
+        "timeout": spec.timeout,
+        "compare": spec.compare,
+        "fail_fast": get_fail_fast(config) if fail_fast is None else fail_fast,
+        "cpu_slots": cpu_slots,
+    }, None
+
+def _case_keys(plan):
+    """Result-cache key per case (None when the case can't be cached)"""
+    try:
+        kind = digest_kind(plan["compare"].get("mode", "exact"))
+    except ValueError:
+        return [None] * len(plan["cases"])
+    bin_digest = binary_digest(plan["bin_path"])
+    return [
+        case_key(bin_digest, case["in_digest"], case["digests"][kind], plan["compare"], plan["timeout"])
+        if case["output"] and kind in case["digests"] else None
+        for case in plan["cases"]
+    ]
+
+def submit_cases(plan, pool, force=False):
+    """Queue every case of a prepared problem on pool, returns futures in case order.
+
+    Cases whose binary, input, expected output, comparator and timeout are
+    unchanged since a cached run get an already completed future with that
+    result, unless force is set.
+    """
+    keys = _case_keys(plan)
+    cached = {} if force else cached_cases(k for k in keys if k)
+    plan["case_keys"] = keys
+    plan["cached_keys"] = set(cached)
+    
+    order = range(len(plan["cases"]))
+    if plan["fail_fast"]:
+        # Cases that failed most often recently go first, so a failing run stops early
+        rates = case_failure_rates(plan["prob"])
+        order = sorted(order, key=lambda i: -rates.get(plan["cases"][i]["case"], 0))
+    
+    # Set by the first failing case; checked by workers before they start a case
+    stop = threading.Event()
+    
+    def run_unless_stopped(case):
+        if stop.is_set():
+            return "SKIPPED", None, None
+        # Timeouts are wall-clock: never run more processes than the CPU budget allows
+        with plan["cpu_slots"] or contextlib.nullcontext():
+            return run_case(plan["bin_path"], case, plan["timeout"], plan["compare"])
+    
+    def check_failure(future):
+        # Runs in the worker thread as soon as the case finishes
+        if not future.cancelled() and future.result()[0] not in ("PASS", "SKIPPED"):
+            stop.set()
     
-    if not os.path.exists(inputs_dir) or not os.path.exists(outputs_dir):
-        if not capture_logs: print(f"{prefixes['FAIL']} No tests found for {prob}")
-        return 1, 0, 0, []
+    futures = [None] * len(plan["cases"])
+    for i in order:
+        case, key = plan["cases"][i], keys[i]
+        if plan["fail_fast"] and stop.is_set():
+            future = Future()
+            future.set_result(("SKIPPED", None, None))
+        elif key in cached:
+            CASE_CACHE.inc("hit")
+            future = Future()
+            future.set_result(tuple(cached[key]))
+        else:
+            CASE_CACHE.inc("miss")
+            future = pool.submit(run_unless_stopped, case)
+        if plan["fail_fast"]:
+            future.add_done_callback(check_failure)
+        futures[i] = future
+    return futures
+
+def _stop_at_first_failure(futures):
+    """Wait until every case passed, or cancel the ones not started after the first failure"""
+    for future in as_completed(futures):
+        if future.result()[0] not in ("PASS", "SKIPPED"):
+            for other in futures:
+                other.cancel()
+            return
 
-    input_files = sorted(glob.glob(os.path.join(inputs_dir, "*.in")))
-    if not input_files:
-        if not capture_logs: print(f"{prefixes['FAIL']} No input files found")
-        return 1, 0, 0, []
+def collect_cases(plan, futures, capture_logs=False, out=None, on_case=None, on_saved=None):
+    """Wait for the case futures in order, report them and write the score artifacts.
 
-    total_points = get_problem_points(config, prob)
-    timeout = get_timeout(config, prob)
+    on_case(index, total, detail) is called as soon as each case is reported,
+    on_saved(run_id) once the run is in the results store.
+    """
+    prefixes = get_prefixes()
+    prob = plan["prob"]
+    total_points = plan["total_points"]
+    timeout = plan["timeout"]
     
     passed_count = 0
     total_count = 0
     
     details = []
 
-    for infile in input_files:
+    keys = plan.get("case_keys") or [None] * len(plan["cases"])
+    cached_keys = plan.get("cached_keys", set())
+    new_results = []
+    
+    if plan.get("fail_fast"):
+        _stop_at_first_failure(futures)
+
+    # Futures are consumed in sorted case order, so output below is printed
+    # as soon as each case (and every case before it) is available
+    for case, key, future in zip(plan["cases"], keys, futures):
+        if future.cancelled():
+            result, data, usage = "SKIPPED", None, None
+        else:
+            result, data, usage = future.result()
+        if key and key not in cached_keys and result in CACHEABLE_VERDICTS:
+            new_results.append((key, result, data, usage))
+        VERDICTS.inc(result)
+        base = case["case"]
+        usage_note = f" [{format_usage(usage)}{', cached' if key in cached_keys else ''}]" if usage else ""
         total_count += 1
-        base = os.path.basename(infile)
-        case_name = os.path.splitext(base)[0]
-        outfile = os.path.join(outputs_dir, f"{case_name}.out")
         
-        if not os.path.exists(outfile):
-            if not capture_logs: print(f"{prefixes['FAIL']} {prob}:{base} (missing output)")
-            details.append({"case": base, "status": "ERROR", "msg": "Missing expected output file"})
-            continue
-            
-        result, data = run_test_case(bin_path, infile, outfile, timeout)
+        # Input / output shown in details come from the manifest previews
+        input_content = case["in_preview"]
         
-        # Read input content for display
-        with open(infile, 'r') as f:
-            input_content = f.read()
-
-        if result == "PASS":
-            if not capture_logs: print(f"{prefixes['PASS']} {prob}:{base}")
+        if result == "SKIPPED":
+            if not capture_logs: print(f"{prefixes['SKIP']} {prob}:{base} (fail-fast)", file=out)
+            details.append({"case": base, "status": "SKIPPED", "msg": "Skipped after an earlier failure (fail-fast)"})
+        elif result == "Missing":
+            if not capture_logs: print(f"{prefixes['FAIL']} {prob}:{base} (missing output)", file=out)
+            details.append({"case": base, "status": "ERROR", "msg": "Missing expected output file"})
+        elif result == "PASS":
+            if not capture_logs: print(f"{prefixes['PASS']} {prob}:{base}{usage_note}", file=out)
             passed_count += 1
-            # Read output for display
-            with open(outfile, 'r') as f:
-                output_content = f.read()
             details.append({
                 "case": base, 
                 "status": "PASS",
                 "input": input_content,
-                "output": output_content
+                "output": case["out_preview"]
             })
         elif result == "TLE":
-            if not capture_logs: print(f"{prefixes['TLE']} {prob}:{base} (Time Limit Exceeded: {timeout}s)")
+            if not capture_logs: print(f"{prefixes['TLE']} {prob}:{base} (Time Limit Exceeded: {timeout}s){usage_note}", file=out)
             details.append({
                 "case": base, 
                 "status": "TLE", 
@@ -251,27 +543,28 @@ def run_problem(prob, config, capture_logs=False):
                 "input": input_content
             })
         elif result == "FAIL":
-            expected, got = data
+            # Results cached before bounded diffs existed have no "diff"
+            diff = data.get("diff")
+            summary = diff["summary"] if diff else f"first mismatch at line {data['line']}"
             if not capture_logs:
-                print(f"{prefixes['FAIL']} {prob}:{base}")
-                print(f"{Colors.YELLOW}----- Expected -----{Colors.RESET}")
-                print(expected.rstrip())
-                print(f"{Colors.YELLOW}----- Got -----{Colors.RESET}")
-                print(got.rstrip())
-                print(f"{Colors.YELLOW}----- Diff -----{Colors.RESET}")
-                print_diff(expected, got)
+                print(f"{prefixes['FAIL']} {prob}:{base} ({summary}){usage_note}", file=out)
+                if diff:
+                    print_diff(diff, file=out)
             
             details.append({
                 "case": base, 
                 "status": "FAIL", 
                 "input": input_content,
-                "expected": expected,
-                "got": got
+                "expected": data["expected"],
+                "got": data["got"],
+                "mismatch_line": data["line"],
+                "mismatch_offset": data["offset"],
+                "diff": diff
             })
         else:
             if not capture_logs:
-                print(f"{prefixes['FAIL']} {prob}:{base} ({result})")
-                if data: print(f"-- stderr --\n{data}")
+                print(f"{prefixes['FAIL']} {prob}:{base} ({result}){usage_note}", file=out)
+                if data: print(f"-- stderr --\n{data}", file=out)
             
             details.append({
                 "case": base, 
@@ -279,22 +572,39 @@ def run_problem(prob, config, capture_logs=False):
                 "msg": result,
                 "stderr": data if data else ""
             })
+        
+        if usage:
+            details[-1].update(usage)
+        if key in cached_keys:
+            details[-1]["cached"] = True
+        
+        if on_case:
+            on_case(len(details) - 1, len(plan["cases"]), details[-1])
 
     if not capture_logs:
-        print()
+        print(file=out)
     
     score = 0
     if passed_count == total_count:
         score = total_points
     
     if not capture_logs:
-        print(f"{prefixes['RESULT']} {prob} Result: {passed_count}/{total_count} tests passed | Score: {score}/{total_points}")
-        print("========================================================")
+        print(f"{prefixes['RESULT']} {prob} Result: {passed_count}/{total_count} tests passed | Score: {score}/{total_points}", file=out)
+        print("========================================================", file=out)
     
-    # Write artifacts for summary (optional, but good for consistency)
-    with open(os.path.join(BUILD_DIR, f"{prob}.score"), "w") as f:
-        f.write(f"{score} {total_points}")
-    with open(os.path.join(BUILD_DIR, f"{prob}.cases"), "w") as f:
-        f.write(f"{passed_count} {total_count}")
+    store_cases(new_results)
+    save_result(prob, plan["build_dir"], score, total_points, details, plan["submission"], on_saved, plan["workspace"])
 
     return (total_count - passed_count), score, total_points, details
+
+def run_problem(prob, config, capture_logs=False, jobs=None, out=None, on_case=None, force=False, fail_fast=None, on_saved=None):
+    plan, result = prepare_problem(prob, config, capture_logs=capture_logs, out=out, fail_fast=fail_fast, on_saved=on_saved)
+    if result is not None:
+        return result
+    
+    jobs = get_jobs(config, jobs)
+    
+    # Cases run concurrently on a bounded pool
+    with ThreadPoolExecutor(max_workers=max(1, min(jobs, len(plan["cases"])))) as pool:
+        futures = submit_cases(plan, pool, force=force)
+        return collect_cases(plan, futures, capture_logs=capture_logs, out=out, on_case=on_case, on_saved=on_saved)
@@ -1,16 +1,100 @@
 import os
 import sys
 import glob
-import markdown
+import shutil
+import gzip
 import webbrowser
 import threading
-from flask import Flask, jsonify, render_template, send_from_directory, request
-from app.utils import SRC_DIR, BUILD_DIR, TESTS_DIR
-from app.config import load_config, get_problem_points, get_problem_name, get_app_title, get_app_description, get_timeout
+from flask import Flask, Response, jsonify, render_template, send_file, send_from_directory, request
+from app.utils import SRC_DIR, BUILD_DIR
+from app.config import load_config, get_problem_spec, get_app_title, get_app_description, get_job_limits, get_serve_options
 from app.compiler import find_source
 from app.runner import run_problem
+from app.manifest import get_manifest
+from app.fixtures import fixture_size, iter_range
+from app.compare import TRUNCATION_MARKER
+from app.problem_info import get_problem_info
+from app.assets import AssetStore, IMMUTABLE
+from app.jobs import JobQueue, QueueFull, abandon_jobs
+from app.results import latest_results, count_cases, get_run, run_cases, case_detail
+from app.metrics import render_metrics, share_metrics, flush_metrics, JOBS_QUEUED, JOBS_RUNNING
 
-def start_server(debug=False):
+# Per-case fields left out of /api/run payloads, fetched on demand from
+# /api/runs/<run_id>/cases instead
+DETAIL_FIELDS = ("input", "output", "expected", "got", "stderr")
+# Case fields served raw (with byte ranges) by /api/runs/<run_id>/cases/<index>/<field>
+RAW_FIELDS = ("input", "expected", "got", "stderr")
+# JSON bodies smaller than this are sent uncompressed
+GZIP_MIN_BYTES = 1024
+GZIP_LEVEL = 6
+# Seconds a client is asked to wait before queueing again when the queue is full
+QUEUE_RETRY_SEC = 2
+# Per-process metric snapshots of the production server's workers
+METRICS_DIR = os.path.join(BUILD_DIR, ".metrics")
+
+def compact_detail(index, detail):
+    """Case summary sent with a run: status, usage, bounded diff, without the texts"""
+    summary = {k: v for k, v in detail.items() if k not in DETAIL_FIELDS}
+    summary["index"] = index
+    return summary
+
+def run_summary(prob, config, on_case=None, force=False, fail_fast=None):
+    """Run a problem without console output and return the /api/run payload.
+
+    details (and what on_case receives) are compact case summaries; the full
+    case is fetched with the returned run_id.
+    """
+    saved = {}
+    if on_case:
+        report = lambda index, total, detail: on_case(index, total, compact_detail(index, detail))
+    else:
+        report = None
+    # Run with capture_logs=True to suppress stdout
+    fail_count, score, max_score, details = run_problem(
+        prob, config, capture_logs=True, on_case=report, force=force, fail_fast=fail_fast,
+        on_saved=lambda run_id: saved.update(run_id=run_id)
+    )
+    pass_count, total_count = count_cases(details)
+    fail_count = total_count - pass_count
+    
+    return {
+        "run_id": saved.get("run_id"),
+        "score": score,
+        "total_points": max_score,
+        "passed_count": pass_count,
+        "total_count": total_count,
+        "fail_count": fail_count,
+        "details": [compact_detail(i, d) for i, d in enumerate(details)]
+    }
+
+def _byte_range(size):
+    """(start, stop, status) for the request's Range header over size bytes"""
+    rng = request.range
+    if rng is None or rng.units != 'bytes' or len(rng.ranges) != 1:
+        return 0, size, 200
+    bounds = rng.range_for_length(size)
+    if bounds is None:
+        return None, None, 416
+    return bounds[0], bounds[1], 206
+
+def _range_response(chunks, start, stop, size, status, truncated=False):
+    """Text body of a byte range; truncated marks a preview that stops before the real end"""
+    extra = {'X-Truncated': 'true'} if truncated else {}
+    if status == 416:
+        return Response(status=416, headers={'Content-Range': f"bytes */{size}", **extra})
+    headers = {'Accept-Ranges': 'bytes', 'Content-Length': str(stop - start), **extra}
+    if status == 206:
+        headers['Content-Range'] = f"bytes {start}-{stop - 1}/{size}"
+    return Response(chunks, status=status, mimetype='text/plain', headers=headers)
+
+def _run_flags():
+    """force / fail_fast query flags of a run request (fail_fast None = config default)"""
+    force = request.args.get('force') in ('1', 'true')
+    fail_fast = request.args.get('fail_fast')
+    return force, None if fail_fast is None else fail_fast in ('1', 'true')
+
+def create_app():
+    """Build the Flask app with every route registered"""
     # Determine template folder path (works for source and PyInstaller)
     if getattr(sys, 'frozen', False):
         template_folder = os.path.join(sys._MEIPASS, 'templates')
@@ -20,6 +104,42 @@ def start_server(debug=False):
         static_folder = os.path.abspath('static')
 
     app = Flask(__name__, template_folder=template_folder, static_folder=static_folder)
+    assets = AssetStore(static_folder)
+    assets.build()
+    app.jinja_env.globals['asset_url'] = assets.url
+    job_workers, max_queued = get_job_limits(load_config())
+    job_queue = JobQueue(max_workers=job_workers, max_pending=max_queued)
+    app.extensions['job_queue'] = job_queue
+    JOBS_QUEUED.callback = job_queue.queued_count
+    JOBS_RUNNING.callback = job_queue.running_count
+
+    @app.after_request
+    def compress_json(response):
+        """gzip JSON bodies for clients that accept it"""
+        if response.mimetype != 'application/json' or response.direct_passthrough:
+            return response
+        response.vary.add('Accept-Encoding')
+        if 'Content-Encoding' in response.headers or not request.accept_encodings['gzip']:
+            return response
+        data = response.get_data()
+        if len(data) >= GZIP_MIN_BYTES:
+            response.set_data(gzip.compress(data, compresslevel=GZIP_LEVEL))
+            response.headers['Content-Encoding'] = 'gzip'
+        return response
+
+    @app.route('/assets/<name>')
+    def asset(name):
+        """Fingerprinted static file, precompressed variant picked from Accept-Encoding"""
+        found = assets.lookup(name, request.accept_encodings)
+        if found is None:
+            return jsonify({'error': 'Unknown asset'}), 404
+        path, mimetype, encoding = found
+        response = send_file(path, mimetype=mimetype, conditional=False, etag=False)
+        response.headers['Cache-Control'] = IMMUTABLE
+        response.vary.add('Accept-Encoding')
+        if encoding:
+            response.headers['Content-Encoding'] = encoding
+        return response
 
     @app.route('/api/code/<prob>', methods=['GET', 'POST'])
     def handle_code(prob):
@@ -65,7 +185,7 @@ def start_server(debug=False):
     @app.route('/api/problems')
     def api_problems():
         config = load_config()
-        print(f"DEBUG: Config loaded keys: {list(config.keys())}")
+        app.logger.debug("Config loaded keys: %s", list(config.keys()))
         
         files = glob.glob(os.path.join(SRC_DIR, "p*.cpp"))
         seen = set()
@@ -75,13 +195,13 @@ def start_server(debug=False):
         
         # Add from config
         if 'problems' in config:
-            print(f"DEBUG: Problems in config: {list(config['problems'].keys())}")
+            app.logger.debug("Problems in config: %s", list(config['problems'].keys()))
             for p in config['problems']:
                 if p not in seen:
                     prob_names.append(p)
                     seen.add(p)
         else:
-            print("DEBUG: 'problems' key not found in config")
+            app.logger.debug("'problems' key not found in config")
 
         # Add from files
         for f in files:
@@ -92,55 +212,23 @@ def start_server(debug=False):
                 seen.add(base)
         prob_names.sort()
         
-        print(f"DEBUG: Final problem list: {prob_names}")
+        app.logger.debug("Final problem list: %s", prob_names)
         
-        # Then gather data for each
+        # Then gather data for each, latest runs come from one results-store query
+        latest = latest_results()
         data = []
         for p in prob_names:
-            # Default values
-            score = 0
-            total_points = get_problem_points(config, p)
-            passed = 0
-            total_tests = 0
-            has_run = False
-            
-            # Try to read artifacts
-            score_file = os.path.join(BUILD_DIR, f"{p}.score")
-            cases_file = os.path.join(BUILD_DIR, f"{p}.cases")
-            
-            if os.path.exists(score_file):
-                try:
-                    with open(score_file, 'r') as f:
-                        parts = f.read().split()
-                        if len(parts) >= 2:
-                            score = int(parts[0])
-                            has_run = True
-                except: pass
-                
-            if os.path.exists(cases_file):
-                try:
-                    with open(cases_file, 'r') as f:
-                        parts = f.read().split()
-                        if len(parts) >= 2:
-                            passed = int(parts[0])
-                            total_tests = int(parts[1])
-                            has_run = True
-                except: pass
-            
-            # Get details if run
-            details = []
-            # Note: We don't store full details in files currently, only summary.
-            # If we want details on load, we might need to store them or just show summary.
-            # For now, let's just return summary data.
+            spec = get_problem_spec(config, p)
+            run = latest.get(p)
             
             data.append({
                 "name": p,
-                "display_name": get_problem_name(config, p),
-                "score": score,
-                "total_points": total_points,
-                "passed": passed,
-                "total_tests": total_tests,
-                "has_run": has_run,
+                "display_name": spec.name,
+                "score": run["score"] if run else 0,
+                "total_points": spec.points,
+                "passed": run["passed"] if run else 0,
+                "total_tests": run["total"] if run else 0,
+                "has_run": run is not None,
                 "details": [] # Empty initially
             })
         
@@ -151,122 +239,136 @@ def start_server(debug=False):
             "problems": data
         })
 
+    @app.route('/metrics')
+    def metrics():
+        """Prometheus scrape endpoint, rendered only when requested"""
+        return Response(render_metrics(), mimetype='text/plain; version=0.0.4')
+
     @app.route('/api/run/<prob>', methods=['POST'])
     def api_run(prob):
+        force, fail_fast = _run_flags()
+        return jsonify(run_summary(prob, load_config(), force=force, fail_fast=fail_fast))
+
+    @app.route('/api/run/<prob>/async', methods=['POST'])
+    def api_run_async(prob):
+        """Queue a run; progress is streamed from /api/jobs/<job_id>/events"""
         config = load_config()
+        force, fail_fast = _run_flags()
         
-        # Run with capture_logs=True to suppress stdout
-        fail_count, score, max_score, details = run_problem(prob, config, capture_logs=True)
-            
-        # Read stats
-        pass_count = 0
-        total_count = 0
-        if os.path.exists(os.path.join(BUILD_DIR, f"{prob}.cases")):
-            with open(os.path.join(BUILD_DIR, f"{prob}.cases"), 'r') as cf:
-                parts = cf.read().split()
-                if len(parts) >= 2:
-                    pass_count = int(parts[0])
-                    total_count = int(parts[1])
-        
-        fail_count = total_count - pass_count
+        def grade(job):
+            on_case = lambda index, total, detail: job.publish("case", {"index": index, "total": total, "detail": detail})
+            return run_summary(prob, config, on_case=on_case, force=force, fail_fast=fail_fast)
         
+        try:
+            job = job_queue.submit(prob, grade)
+        except QueueFull as e:
+            # Clients wait and queue again instead of grading outside the queue
+            return jsonify({'error': str(e)}), 503, {'Retry-After': str(QUEUE_RETRY_SEC)}
+        return jsonify({
+            "job_id": job.id,
+            "events_url": f"/api/jobs/{job.id}/events"
+        }), 202
+
+    @app.route('/api/jobs/<job_id>')
+    def api_job(job_id):
+        job = job_queue.get(job_id)
+        if not job:
+            return jsonify({'error': 'Unknown job'}), 404
+        return jsonify({"job_id": job.id, "prob": job.name, "done": job.done, "result": job.result})
+
+    @app.route('/api/jobs/<job_id>/events')
+    def api_job_events(job_id):
+        """Server-sent events: one `case` per finished case, then `done` (or `failed`)"""
+        job = job_queue.get(job_id)
+        if not job:
+            return jsonify({'error': 'Unknown job'}), 404
+        last_id = request.headers.get('Last-Event-ID', '')
+        start = int(last_id) + 1 if last_id.isdigit() else 0
+        return Response(job.stream(start), mimetype='text/event-stream', headers={
+            'Cache-Control': 'no-cache',
+            'X-Accel-Buffering': 'no'
+        })
+
+    @app.route('/api/runs/<int:run_id>/cases')
+    def api_run_cases(run_id):
+        """Full case details of a run, a page at a time (?offset=0&limit=20)"""
+        run = get_run(run_id)
+        if not run:
+            return jsonify({'error': 'Unknown run'}), 404
+        offset = max(request.args.get('offset', 0, type=int), 0)
+        limit = min(max(request.args.get('limit', 20, type=int), 1), 100)
+        cases = [case_detail(row) for row in run_cases(run_id, offset, limit)]
+        for index, detail in enumerate(cases, offset):
+            detail["index"] = index
         return jsonify({
-            "score": score,
-            "total_points": max_score,
-            "passed_count": pass_count,
-            "total_count": total_count,
-            "fail_count": fail_count,
-            "details": details
+            "run_id": run_id,
+            "prob": run["prob"],
+            "total": run["total"],
+            "offset": offset,
+            "limit": limit,
+            "cases": cases
         })
 
+    @app.route('/api/runs/<int:run_id>/cases/<int:index>')
+    def api_run_case(run_id, index):
+        rows = run_cases(run_id, index, 1)
+        if not rows:
+            return jsonify({'error': 'Unknown case'}), 404
+        detail = case_detail(rows[0])
+        detail["index"] = index
+        return jsonify(detail)
+
+    @app.route('/api/runs/<int:run_id>/cases/<int:index>/<field>')
+    def api_run_case_field(run_id, index, field):
+        """One text of a case as text/plain, honouring a `Range: bytes=` header.
+
+        input / expected are streamed from the current test fixtures; got and
+        stderr are the previews kept with the run. Ranges address the preview
+        bytes only (416 past them), `X-Truncated: true` marks a preview that
+        is shorter than the program's real output.
+        """
+        run = get_run(run_id)
+        rows = run_cases(run_id, index, 1) if run else []
+        if field not in RAW_FIELDS or not rows:
+            return jsonify({'error': 'Unknown case'}), 404
+        detail = case_detail(rows[0])
+
+        if field in ("input", "expected"):
+            case = next((c for c in get_manifest(run["prob"]) or [] if c["case"] == detail["case"]), None)
+            ref = case and case["input" if field == "input" else "output"]
+            if not ref:
+                return jsonify({'error': f'No {field} for this case'}), 404
+            size = fixture_size(ref)
+            start, stop, status = _byte_range(size)
+            chunks = iter_range(ref, start, stop) if status != 416 else []
+            return _range_response(chunks, start, stop, size, status)
+
+        text = detail.get(field)
+        if text is None:
+            return jsonify({'error': f'No {field} for this case'}), 404
+        truncated = text.endswith(TRUNCATION_MARKER)
+        if truncated:
+            text = text[:-len(TRUNCATION_MARKER)]
+        data = text.encode('utf-8')
+        start, stop, status = _byte_range(len(data))
+        return _range_response([data[start:stop]] if status != 416 else [], start, stop, len(data), status, truncated)
+
     @app.route('/api/problem/<prob>/info')
     def api_problem_info(prob):
-        config = load_config()
+        """Description, settings and sample cases (?lang=, ?preview=N), with ETag revalidation"""
         lang = request.args.get('lang', '')  # Get language parameter
-        
-        # Detect available languages
-        available_langs = []
-        problems_dir = 'problems'
-        
-        # Check for default (no lang suffix)
-        default_file = os.path.join(problems_dir, f"{prob}.md")
-        if os.path.exists(default_file):
-            available_langs.append('')  # Empty string represents default
-        
-        # Check for language-specific files
-        for possible_lang in ['en', 'zh', 'zh-tw', 'zh-cn', 'ja', 'es', 'fr', 'de']:
-            lang_file = os.path.join(problems_dir, f"{prob}.{possible_lang}.md")
-            if os.path.exists(lang_file):
-                available_langs.append(possible_lang)
-        
-        # Determine which file to load
-        desc_file = None
-        if lang and lang in available_langs:
-            desc_file = os.path.join(problems_dir, f"{prob}.{lang}.md")
-        elif '' in available_langs:
-            desc_file = os.path.join(problems_dir, f"{prob}.md")
-        elif available_langs:
-            # Fallback to first available language
-            desc_file = os.path.join(problems_dir, f"{prob}.{available_langs[0]}.md")
-        
-        # Get description from markdown file
-        desc_content = ""
-        if desc_file and os.path.exists(desc_file):
-            with open(desc_file, 'r', encoding='utf-8') as f:
-                desc_md = f.read()
-                # Convert markdown to HTML using the markdown library
-                desc_content = markdown.markdown(desc_md, extensions=['fenced_code', 'tables'])
-        else:
-            desc_content = markdown.markdown(f"# {prob}\\nNo description available.", extensions=['fenced_code', 'tables'])
-        
-        # Get forbidden and required keywords
-        forbidden = []
-        required = []
-        if 'problems' in config and isinstance(config['problems'], dict):
-            if prob in config['problems'] and isinstance(config['problems'][prob], dict):
-                forbidden_val = config['problems'][prob].get('forbidden', [])
-                required_val = config['problems'][prob].get('required', [])
-                if isinstance(forbidden_val, list):
-                    forbidden = forbidden_val
-                if isinstance(required_val, list):
-                    required = required_val
-        
-        # Load test cases
-        test_cases = []
-        test_input_dir = os.path.join(TESTS_DIR, prob, 'inputs')
-        test_output_dir = os.path.join(TESTS_DIR, prob, 'outputs')
-        
-        if os.path.exists(test_input_dir) and os.path.exists(test_output_dir):
-            input_files = sorted(glob.glob(os.path.join(test_input_dir, '*.in')))
-            for input_file in input_files:
-                basename = os.path.basename(input_file).replace('.in', '')
-                output_file = os.path.join(test_output_dir, f"{basename}.out")
-                
-                if os.path.exists(output_file):
-                    try:
-                        with open(input_file, 'r', encoding='utf-8') as f:
-                            input_content = f.read().strip()
-                        with open(output_file, 'r', encoding='utf-8') as f:
-                            output_content = f.read().strip()
-                        
-                        test_cases.append({
-                            'input': input_content,
-                            'expected': output_content
-                        })
-                    except Exception as e:
-                        print(f"Error reading test case {basename}: {e}")
-            
-        return jsonify({
-            "name": prob,
-            "display_name": get_problem_name(config, prob),
-            "description_html": desc_content,
-            "points": get_problem_points(config, prob),
-            "timeout": get_timeout(config, prob),
-            "forbidden": forbidden,
-            "required": required,
-            "test_cases": test_cases,
-            "available_langs": available_langs
-        })
+        preview_bytes = request.args.get('preview', type=int)
+        info = get_problem_info(load_config(), prob, lang, preview_bytes)
+
+        # The gzip copy is its own representation, so it gets its own tag
+        use_gzip = bool(request.accept_encodings['gzip'])
+        etag = f"{info.etag}-gz" if use_gzip else info.etag
+        headers = {'ETag': f'"{etag}"', 'Cache-Control': 'no-cache', 'Vary': 'Accept-Encoding'}
+        if etag in request.if_none_match:
+            return Response(status=304, headers=headers)
+        if use_gzip:
+            headers['Content-Encoding'] = 'gzip'
+        return Response(info.gzip if use_gzip else info.json, mimetype='application/json', headers=headers)
 
     @app.route('/api/git_push', methods=['POST'])
     def git_push():
@@ -414,6 +516,13 @@ def start_server(debug=False):
                 'details': str(e)
             })
 
+    return app
+
+def start_server(debug=False):
+    # Runs left unfinished by a previous server would count against server.max_queued
+    abandon_jobs()
+    app = create_app()
+
     def open_browser():
         """在伺服器啟動後自動打開瀏覽器"""
         import time
@@ -434,3 +543,36 @@ def start_server(debug=False):
     print("="*60 + "\n")
     
     app.run(host='0.0.0.0', port=8080, debug=debug)
+
+def _worker_app():
+    share_metrics(METRICS_DIR)
+    return create_app()
+
+def _stop_worker(app):
+    """Let a worker's accepted grading jobs finish before it exits"""
+    app.extensions['job_queue'].shutdown()
+    flush_metrics()
+
+def serve_production():
+    """Serve the web UI from pre-forked workers (server.workers × server.threads)"""
+    from app.prefork import serve
+
+    options = get_serve_options(load_config())
+    abandon_jobs()
+    # Counters start over with the new set of workers
+    shutil.rmtree(METRICS_DIR, ignore_errors=True)
+
+    print("\n" + "="*60)
+    print("🚀 C++ Lab 測試系統 - 網頁介面（多程序模式）")
+    print("="*60)
+    print(f"📡 伺服器位址: http://{options['host']}:{options['port']}")
+    print(f"👷 {options['workers']} 個 worker 程序 × 每個 {options['threads']} 個執行緒")
+    print(f"💡 提示: 按 Ctrl+C 或送出 SIGTERM 停止伺服器（最多等待 {options['graceful_timeout']} 秒完成進行中的評測）")
+    print("="*60 + "\n")
+
+    return serve(
+        _worker_app, options['host'], options['port'],
+        workers=options['workers'], threads=options['threads'],
+        graceful_timeout=options['graceful_timeout'],
+        on_stop=_stop_worker, on_worker_exit=abandon_jobs
+    )
@@ -0,0 +1,113 @@
+import os
+import hashlib
+import threading
+import subprocess
+from app.config import load_config, get_compiler_path, get_compile_cache
+
+# Linux keeps the peak RSS of a process across exec, so a submission forked
+# straight from the grader reports at least the grader's own resident size.
+# This helper is forked instead: it forks the submission from its own tiny
+# image, enforces the time limit, and writes "<timed out> <peak rss> <cpu us>"
+# of that child to the file descriptor given as argv[1].
+HELPER_SOURCE = r"""
+#include <cerrno>
+#include <csignal>
+#include <cstdio>
+#include <cstdlib>
+#include <sys/resource.h>
+#include <sys/time.h>
+#include <sys/wait.h>
+#include <unistd.h>
+
+static volatile pid_t child = 0;
+static volatile sig_atomic_t timed_out = 0;
+
+static void on_alarm(int) {
+    timed_out = 1;
+    if (child > 0) kill(child, SIGKILL);
+}
+
+// usage: helper <report fd> <timeout ms> <program> [args...]
+int main(int argc, char** argv) {
+    if (argc < 4) return 127;
+    int fd = atoi(argv[1]);
+    long timeout_ms = atol(argv[2]);
+    child = fork();
+    if (child < 0) return 127;
+    if (child == 0) {
+        close(fd);
+        execv(argv[3], argv + 3);
+        _exit(127);
+    }
+    struct sigaction sa = {};
+    sa.sa_handler = on_alarm;
+    sigaction(SIGALRM, &sa, nullptr);
+    struct itimerval limit = {};
+    limit.it_value.tv_sec = timeout_ms / 1000;
+    limit.it_value.tv_usec = (timeout_ms % 1000) * 1000;
+    setitimer(ITIMER_REAL, &limit, nullptr);
+
+    int status = 0;
+    struct rusage ru = {};
+    while (wait4(child, &status, 0, &ru) < 0 && errno == EINTR) {}
+    long cpu_us = (ru.ru_utime.tv_sec + ru.ru_stime.tv_sec) * 1000000L + ru.ru_utime.tv_usec + ru.ru_stime.tv_usec;
+    dprintf(fd, "%d %ld %ld\n", (int)timed_out, (long)ru.ru_maxrss, cpu_us);
+    close(fd);
+
+    if (WIFSIGNALED(status)) {
+        // Die the same way, so the grader sees the child's signal (without a core file)
+        struct rlimit no_core = {0, 0};
+        setrlimit(RLIMIT_CORE, &no_core);
+        signal(WTERMSIG(status), SIG_DFL);
+        kill(getpid(), WTERMSIG(status));
+    }
+    return WIFEXITED(status) ? WEXITSTATUS(status) : 1;
+}
+"""
+
+# Built once per process (None: unavailable, the child is spawned directly)
+_helper = {}
+_helper_lock = threading.Lock()
+
+def get_usage_helper():
+    """Path of the compiled usage helper, or None where it can't be built or used"""
+    if not hasattr(os, "fork") or not hasattr(os, "wait4"):
+        return None
+    config = load_config()
+    compiler = get_compiler_path(config)
+    cache_dir, _ = get_compile_cache(config)
+    with _helper_lock:
+        if compiler not in _helper:
+            _helper[compiler] = _build_helper(compiler, cache_dir)
+        return _helper[compiler]
+
+def _build_helper(compiler, cache_dir):
+    key = hashlib.sha256((compiler + "\0" + HELPER_SOURCE).encode()).hexdigest()[:16]
+    helper_dir = os.path.join(cache_dir, "helpers")
+    path = os.path.abspath(os.path.join(helper_dir, f"usage-{key}"))
+    if os.path.exists(path):
+        return path
+    os.makedirs(helper_dir, exist_ok=True)
+    tmp = f"{path}.tmp{os.getpid()}"
+    try:
+        proc = subprocess.run(
+            [compiler, "-x", "c++", "-O2", "-o", tmp, "-"],
+            input=HELPER_SOURCE.encode(), capture_output=True, timeout=60
+        )
+    except (OSError, subprocess.SubprocessError):
+        return None
+    if proc.returncode != 0 or not os.path.exists(tmp):
+        return None
+    os.replace(tmp, path)
+    return path
+
+def read_report(fd):
+    """(timed_out, peak_rss, cpu_ms) written by the helper, None if it died before reporting"""
+    try:
+        data = os.read(fd, 256).decode().split()
+    finally:
+        os.close(fd)
+    if len(data) != 3:
+        return None
+    timed_out, peak_rss, cpu_us = (int(x) for x in data)
+    return bool(timed_out), peak_rss, round(cpu_us / 1000)
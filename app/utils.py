@@ -1,5 +1,4 @@
 import os
-import difflib
 
 # --- Configuration ---
 CONFIG_DIR = "config"
@@ -18,6 +17,16 @@ class Colors:
     BOLD = "\033[1m"
     RESET = "\033[0m"
 
+    @staticmethod
+    def enable():
+        Colors.RED = "\033[31m"
+        Colors.GREEN = "\033[32m"
+        Colors.YELLOW = "\033[33m"
+        Colors.BLUE = "\033[34m"
+        Colors.CYAN = "\033[36m"
+        Colors.BOLD = "\033[1m"
+        Colors.RESET = "\033[0m"
+
     @staticmethod
     def disable():
         Colors.RED = ""
@@ -34,27 +43,21 @@ def get_prefixes():
         "PASS": f"{Colors.GREEN}✅ PASS{Colors.RESET}",
         "FAIL": f"{Colors.RED}❌ FAIL{Colors.RESET}",
         "TLE": f"{Colors.YELLOW}⏱️ TLE{Colors.RESET}",
+        "SKIP": f"{Colors.YELLOW}⏭️ SKIP{Colors.RESET}",
         "BUILD": f"{Colors.BLUE}🔧 BUILD{Colors.RESET}",
         "RESULT": f"{Colors.BOLD}📄 RESULT{Colors.RESET}",
         "TOTAL": f"{Colors.BOLD}📊 TOTAL{Colors.RESET}",
     }
 
-def print_diff(expected, got):
-    # Simple unified diff
-    diff = difflib.unified_diff(
-        expected.splitlines(keepends=True),
-        got.splitlines(keepends=True),
-        fromfile='expected',
-        tofile='got',
-    )
-    
-    # Colorize diff
-    for line in diff:
-        if line.startswith('+'):
-            print(f"{Colors.GREEN}{line.rstrip()}{Colors.RESET}")
-        elif line.startswith('-'):
-            print(f"{Colors.RED}{line.rstrip()}{Colors.RESET}")
-        elif line.startswith('@'):
-            print(f"{Colors.BLUE}{Colors.BOLD}{line.rstrip()}{Colors.RESET}")
-        else:
-            print(line.rstrip())
+def print_diff(diff, file=None):
+    """Print a bounded diff window (app.compare.diff_window) with line numbers"""
+    print(f"{Colors.YELLOW}----- Diff (- expected, + got) -----{Colors.RESET}", file=file)
+    for row in diff["rows"]:
+        n = row["line"]
+        if row["same"]:
+            print(f"{n:>6}   {row['expected']}", file=file)
+            continue
+        if row["expected"] is not None:
+            print(f"{Colors.RED}{n:>6} - {row['expected']}{Colors.RESET}", file=file)
+        if row["got"] is not None:
+            print(f"{Colors.GREEN}{n:>6} + {row['got']}{Colors.RESET}", file=file)
@@ -0,0 +1,158 @@
+import os
+import time
+import shutil
+import tempfile
+import threading
+try:
+    import fcntl
+except ImportError:
+    fcntl = None # Windows: other processes' workspaces are only judged by age
+from app.utils import BUILD_DIR
+
+# Every run compiles and executes in its own build/.runs/<prob>-XXXX directory
+WORKSPACE_DIR = os.path.join(BUILD_DIR, ".runs")
+# Written into a workspace once its run has finished, it may be pruned from then on
+DONE_MARKER = ".done"
+# Locked by the process owning an unfinished workspace, for as long as it lives
+LOCK_NAME = ".lock"
+# Without a lock to check, unfinished workspaces older than this belong to a crashed run
+STALE_SECONDS = 3600
+
+_prune_lock = threading.Lock()
+# Unfinished workspaces of this process -> their open (locked) lock file
+_live = {}
+_live_lock = threading.Lock()
+
+def create_workspace(prob, root=WORKSPACE_DIR):
+    """Fresh, private directory for one run of prob.
+
+    It stays live (never pruned) until release_workspace(), however long
+    the run waits for its cases, e.g. behind a large batch.
+    """
+    os.makedirs(root, exist_ok=True)
+    workspace = tempfile.mkdtemp(prefix=f"{prob}-", dir=root)
+    lock = open(os.path.join(workspace, LOCK_NAME), "w")
+    if fcntl:
+        fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    with _live_lock:
+        _live[workspace] = lock
+    return workspace
+
+def _is_live(path):
+    """True if an unfinished workspace still belongs to a running process"""
+    with _live_lock:
+        if path in _live:
+            return True
+    lock_path = os.path.join(path, LOCK_NAME)
+    if fcntl is None or not os.path.exists(lock_path):
+        # No lock yet (just created) or no way to test it: go by age
+        try:
+            return time.time() - os.stat(path).st_mtime <= STALE_SECONDS
+        except OSError:
+            return False
+    try:
+        with open(lock_path) as f:
+            fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        return True
+    except OSError:
+        return False
+    return False # Nobody holds the lock: its process is gone
+
+def _replace(path, target):
+    """Atomically place a copy (hardlink when possible) of path at target"""
+    try:
+        if os.path.samefile(path, target):
+            return # Already the same cache entry
+    except OSError:
+        pass
+    tmp = f"{target}.tmp{os.getpid()}.{threading.get_ident()}"
+    try:
+        os.link(path, tmp)
+    except OSError:
+        shutil.copy2(path, tmp)
+    os.replace(tmp, target)
+    # Renaming onto a hardlink of the same file is a no-op that leaves tmp behind
+    if os.path.lexists(tmp):
+        os.remove(tmp)
+
+def write_atomic(path, text):
+    """Write a small text file so readers see either the old or the new content"""
+    tmp = f"{path}.tmp{os.getpid()}.{threading.get_ident()}"
+    with open(tmp, "w") as f:
+        f.write(text)
+    os.replace(tmp, path)
+
+def export_artifacts(workspace, build_dir):
+    """Copy the binary and compile log of a workspace to build_dir (build/<prob>, .compile.log).
+
+    Each file is swapped in atomically, the last run to finish wins. Runs
+    never execute the exported binary, only their own workspace copy.
+    """
+    os.makedirs(build_dir, exist_ok=True)
+    try:
+        names = os.listdir(workspace)
+    except FileNotFoundError:
+        return # Removed by hand, nothing left to export
+    for name in names:
+        if name in (DONE_MARKER, LOCK_NAME):
+            continue
+        try:
+            _replace(os.path.join(workspace, name), os.path.join(build_dir, name))
+        except FileNotFoundError:
+            pass
+
+def release_workspace(workspace, keep_bytes):
+    """Mark a run's workspace finished and prune old ones down to keep_bytes"""
+    try:
+        with open(os.path.join(workspace, DONE_MARKER), "w"):
+            pass
+    except FileNotFoundError:
+        pass
+    with _live_lock:
+        lock = _live.pop(workspace, None)
+    if lock:
+        lock.close()
+    prune_workspaces(os.path.dirname(workspace), keep_bytes)
+
+def _dir_size(path):
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.lstat(os.path.join(root, name)).st_size
+            except OSError:
+                pass
+    return total
+
+def prune_workspaces(root, keep_bytes):
+    """Delete finished workspaces, oldest first, until the rest fit in keep_bytes.
+
+    Workspaces of runs still in progress are left alone; unfinished ones
+    whose process has exited are deleted.
+    """
+    with _prune_lock:
+        try:
+            names = os.listdir(root)
+        except OSError:
+            return
+        finished = []
+        total = 0
+        for name in names:
+            path = os.path.join(root, name)
+            try:
+                done = os.stat(os.path.join(path, DONE_MARKER)).st_mtime
+            except OSError:
+                if os.path.isdir(path) and not _is_live(path):
+                    shutil.rmtree(path, ignore_errors=True)
+                continue
+            size = _dir_size(path)
+            finished.append((done, size, path))
+            total += size
+
+        finished.sort()
+        for _, size, path in finished:
+            if total <= keep_bytes:
+                break
+            shutil.rmtree(path, ignore_errors=True)
+            total -= size
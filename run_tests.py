@@ -1,12 +1,11 @@
 #!/usr/bin/env python3
 import sys
 import os
-import glob
 import argparse
-from app.utils import Colors, SRC_DIR, BUILD_DIR
-from app.config import load_config
-from app.runner import run_problem, print_diff # print_diff might be needed if I moved it to utils? Yes I did.
-from app.server import start_server
+from app.utils import Colors, BUILD_DIR
+from app import daemon
+# Grading modules (runner, results store, batch) are imported where they are
+# used, so an invocation forwarded to the daemon never loads them
 
 # Need to re-implement print_summary or move it to utils/runner?
 # It was in run_tests.py. Let's put it here or in utils.
@@ -72,15 +71,175 @@ def print_summary(results):
     print_sep("└┴─┘")
     print("========================================================")
 
-def main():
+def grade_problems(problems, config, jobs=None, force=False, fail_fast=None):
+    """Grade problems with compilation running ahead of test execution.
+
+    Every problem is keyword-checked and compiled on a compile pool; as soon
+    as its binary is ready, its cases are queued on the shared execution
+    pool. Results are yielded (and their output printed) in problem order.
+    """
+    import io
+    import threading
+    from concurrent.futures import ThreadPoolExecutor
+    from app.config import get_jobs
+    from app.runner import prepare_problem, submit_cases, collect_cases
+
+    jobs = get_jobs(config, jobs)
+    
+    # Compiles and cases both take a slot, at most `jobs` of them run at once
+    cpu_slots = threading.Semaphore(jobs)
+    
+    # compile_pool is shut down first, it is the only one feeding case_pool
+    with ThreadPoolExecutor(max_workers=jobs) as case_pool, \
+         ThreadPoolExecutor(max_workers=jobs) as compile_pool:
+        
+        def stage(prob):
+            # Output of problems still waiting for their turn is buffered
+            log = io.StringIO()
+            plan, result = prepare_problem(prob, config, out=log, fail_fast=fail_fast, cpu_slots=cpu_slots)
+            futures = submit_cases(plan, case_pool, force=force) if plan else None
+            return log.getvalue(), plan, result, futures
+        
+        staged = [compile_pool.submit(stage, prob) for prob in problems]
+        
+        for prob, future in zip(problems, staged):
+            log, plan, result, futures = future.result()
+            sys.stdout.write(log)
+            if result is None:
+                result = collect_cases(plan, futures)
+            yield prob, result
+
+def run_batch(args, config):
+    from app.batch import load_submissions, batch_problems, grade_batch, open_writer
+
+    submissions = load_submissions(args.batch)
+    problems = [args.problem] if args.problem else batch_problems(config)
+    if not submissions:
+        print(f"❌ No submissions found in {args.batch}")
+        sys.exit(1)
+    if not problems:
+        print("❌ No problems discovered in tests/ or config")
+        sys.exit(1)
+    
+    print(f"📚 Batch  : {len(submissions)} submissions x {len(problems)} problems")
+    write_row, close = open_writer(args.output, args.format)
+    
+    done = 0
+    student_score = student_max = 0
+    try:
+        for row in grade_batch(submissions, problems, config, jobs=args.jobs, force=args.force, fail_fast=args.fail_fast):
+            write_row(row)
+            student_score += row["score"]
+            student_max += row["total_points"]
+            if row["problem"] == problems[-1]:
+                done += 1
+                print(f"[{done}/{len(submissions)}] {row['student']}: {student_score}/{student_max}")
+                student_score = student_max = 0
+    finally:
+        close()
+    
+    print(f"📦 Results written to {Colors.CYAN}{args.output}{Colors.RESET}")
+    print(f"{Colors.BLUE}{Colors.BOLD}────────────────────────────────────────────────────────{Colors.RESET}")
+
+def build_parser():
     parser = argparse.ArgumentParser(description="Lab Test Runner")
     parser.add_argument("problem", nargs="?", help="Specific problem to run (e.g. p1)")
     parser.add_argument("--color", action="store_true", help="Force color output")
     parser.add_argument("--no-color", action="store_true", help="Disable color output")
     parser.add_argument("--gui", action="store_true", help="Launch Web UI")
+    parser.add_argument("--serve", action="store_true", help="Serve the Web UI from pre-forked worker processes (server.workers / server.threads), for shared lab servers")
     parser.add_argument("--debug", action="store_true", help="Enable debug mode (for developers)")
+    parser.add_argument("-j", "--jobs", type=int, help="Number of test cases to run in parallel, 0 for one per CPU (default: defaults.jobs or CPU count)")
+    parser.add_argument("--force", action="store_true", help="Rerun every test case, ignoring cached results")
+    parser.add_argument("--fail-fast", action="store_true", default=None, help="Stop each problem at its first failing case (default: test.stop_on_first_fail)")
+    parser.add_argument("--batch", metavar="PATH", help="Grade many submissions: a directory with one folder per student, or a manifest file")
+    parser.add_argument("-o", "--output", default=os.path.join(BUILD_DIR, "batch_results.jsonl"), help="Batch results file, .jsonl or .csv (default: build/batch_results.jsonl)")
+    parser.add_argument("--format", choices=["jsonl", "csv"], help="Batch results format (default: from --output extension)")
+    parser.add_argument("--daemon", action="store_true", help="Keep a grading daemon running so later invocations skip start-up")
+    parser.add_argument("--no-daemon", action="store_true", help="Grade in this process even if a daemon is running")
+    return parser
+
+def discover_problems(config):
+    problems = []
+    import glob
+    from app.utils import SRC_DIR
+
+    files = glob.glob(os.path.join(SRC_DIR, "p*.cpp"))
+    seen = set()
+    
+    # Add from config
+    if 'problems' in config:
+        for p in config['problems']:
+            if p not in seen:
+                problems.append(p)
+                seen.add(p)
+
+    for f in files:
+        name = os.path.basename(f).replace(".cpp", "")
+        base = name.split('_')[0]
+        if base not in seen:
+            problems.append(base)
+            seen.add(base)
+    problems.sort()
+    return problems
+
+def print_banner():
+    print(f"{Colors.BLUE}{Colors.BOLD}────────────────────────────────────────────────────────{Colors.RESET}")
+    print(f"{Colors.BOLD}🧪 Lab Test Runner (Python){Colors.RESET}")
+    print(f"📁 Root   : {Colors.CYAN}{os.getcwd()}{Colors.RESET}")
+    print(f"📦 Results: {Colors.CYAN}{BUILD_DIR}{Colors.RESET}")
+    print(f"{Colors.BLUE}{Colors.BOLD}────────────────────────────────────────────────────────{Colors.RESET}")
+
+def run_cli(args):
+    """Grade from the command line (in this process or on the daemon), returns the exit code"""
+    from app.config import load_config
+    from app.results import count_cases
+
+    config = load_config()
+    print_banner()
     
-    args = parser.parse_args()
+    problems = []
+    if args.problem:
+        problems = [args.problem]
+    else:
+        # Discover all
+        problems = discover_problems(config)
+        if not problems:
+            print("❌ No problems discovered in src/ or config")
+            return 1
+
+    results = {} # prob -> (fail, score, max, pass, total)
+    overall_fail = 0
+    
+    for prob, (fail_count, score, max_score, details) in grade_problems(problems, config, jobs=args.jobs, force=args.force, fail_fast=args.fail_fast):
+        pass_count, case_total = count_cases(details)
+        
+        results[prob] = (fail_count, score, max_score, pass_count, case_total)
+        overall_fail += fail_count
+
+    if len(problems) > 1 or not args.problem:
+        # Calculate total score
+        total_score = sum(r[1] for r in results.values())
+        total_max = sum(r[2] for r in results.values())
+        if total_max > 0:
+             print(f"{Colors.BOLD}📊 TOTAL Total Score: {total_score}/{total_max}{Colors.RESET}")
+             print("========================================================")
+        
+        print_summary(results)
+        
+    print(f"{Colors.BLUE}{Colors.BOLD}────────────────────────────────────────────────────────{Colors.RESET}")
+    return overall_fail
+
+def daemon_request(argv):
+    """Handle one forwarded invocation inside the daemon"""
+    args = build_parser().parse_args(argv)
+    if args.gui or args.serve or args.batch or args.daemon:
+        print("❌ Only grading runs are forwarded to the daemon")
+        return 2
+    return run_cli(args)
+
+def main():
+    args = build_parser().parse_args()
     
     # Handle Color
     if args.no_color:
@@ -90,76 +249,32 @@ def main():
     elif not sys.stdout.isatty():
         Colors.disable()
 
-    config = load_config()
+    if args.daemon:
+        print_banner()
+        sys.exit(daemon.serve(daemon_request))
     
-    # Banner
-    print(f"{Colors.BLUE}{Colors.BOLD}────────────────────────────────────────────────────────{Colors.RESET}")
-    print(f"{Colors.BOLD}🧪 Lab Test Runner (Python){Colors.RESET}")
-    print(f"📁 Root   : {Colors.CYAN}{os.getcwd()}{Colors.RESET}")
-    print(f"📦 Results: {Colors.CYAN}{BUILD_DIR}{Colors.RESET}")
-    print(f"{Colors.BLUE}{Colors.BOLD}────────────────────────────────────────────────────────{Colors.RESET}")
+    if not (args.gui or args.serve or args.batch or args.no_daemon):
+        # A running daemon already has config, manifests and compilers warm
+        code = daemon.forward(sys.argv[1:], color=bool(Colors.RESET))
+        if code is not None:
+            sys.exit(code)
 
     if args.gui:
+        # Flask and markdown are only imported for the web UI
+        from app.server import start_server
+        print_banner()
         start_server(debug=args.debug)
+    elif args.serve:
+        from app.server import serve_production
+        print_banner()
+        sys.exit(serve_production())
+    elif args.batch:
+        print_banner()
+        from app.config import load_config
+        run_batch(args, load_config())
     else:
         # CLI Mode
-        problems = []
-        if args.problem:
-            problems = [args.problem]
-        else:
-            # Discover all
-            files = glob.glob(os.path.join(SRC_DIR, "p*.cpp"))
-            seen = set()
-            
-            # Add from config
-            if 'problems' in config:
-                for p in config['problems']:
-                    if p not in seen:
-                        problems.append(p)
-                        seen.add(p)
-
-            for f in files:
-                name = os.path.basename(f).replace(".cpp", "")
-                base = name.split('_')[0]
-                if base not in seen:
-                    problems.append(base)
-                    seen.add(base)
-            problems.sort()
-            
-            if not problems:
-                print("❌ No problems discovered in src/ or config")
-                sys.exit(1)
-
-        results = {} # prob -> (fail, score, max, pass, total)
-        overall_fail = 0
-        
-        for prob in problems:
-            fail_count, score, max_score, _ = run_problem(prob, config)
-            
-            pass_count = 0
-            case_total = 0
-            if os.path.exists(os.path.join(BUILD_DIR, f"{prob}.cases")):
-                with open(os.path.join(BUILD_DIR, f"{prob}.cases"), 'r') as f:
-                    parts = f.read().split()
-                    if len(parts) >= 2:
-                        pass_count = int(parts[0])
-                        case_total = int(parts[1])
-            
-            results[prob] = (fail_count, score, max_score, pass_count, case_total)
-            overall_fail += fail_count
-
-        if len(problems) > 1 or not args.problem:
-            # Calculate total score
-            total_score = sum(r[1] for r in results.values())
-            total_max = sum(r[2] for r in results.values())
-            if total_max > 0:
-                 print(f"{Colors.BOLD}📊 TOTAL Total Score: {total_score}/{total_max}{Colors.RESET}")
-                 print("========================================================")
-            
-            print_summary(results)
-            
-        print(f"{Colors.BLUE}{Colors.BOLD}────────────────────────────────────────────────────────{Colors.RESET}")
-        sys.exit(overall_fail)
+        sys.exit(run_cli(args))
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,322 @@
+#!/usr/bin/env python3
+"""
+Benchmark the grading pipeline on synthetic problems.
+
+Builds a throw-away workspace (src/, tests/, config/, build/) with
+generated problems, times the runner, compiler and web endpoints against
+it, and writes the figures as JSON. Exits with status 1 when a metric is
+worse than the baseline by more than --tolerance; --quick runs are checked
+against the committed scripts/benchmark_baseline.json unless --baseline
+names another file.
+
+    python3 scripts/benchmark.py --quick                  # CI gate against scripts/benchmark_baseline.json
+    python3 scripts/benchmark.py --quick --save-baseline scripts/benchmark_baseline.json
+    python3 scripts/benchmark.py                          # full run, writes build/benchmark.json
+    python3 scripts/benchmark.py --baseline build/full_baseline.json --tolerance 0.3
+
+Only needs python3 and g++; nothing is downloaded.
+"""
+import io
+import os
+import sys
+import json
+import time
+import shutil
+import zipfile
+import argparse
+import platform
+import resource
+import tempfile
+import tracemalloc
+import contextlib
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+ECHO_SRC = """#include <cstdio>
+int main() {
+    int c;
+    while ((c = getchar()) != EOF) putchar(c);
+    return 0;
+}
+"""
+
+# Prints n lines of "i i*i"
+LINES_SRC = """#include <cstdio>
+int main() {
+    long long n;
+    if (scanf("%lld", &n) != 1) return 1;
+    for (long long i = 0; i < n; i++) printf("%lld %lld\\n", i, i * i);
+    return 0;
+}
+"""
+
+# Thousands of template instantiations on top of the standard library headers
+SLOW_COMPILE_SRC = """#include <bits/stdc++.h>
+template <int N> struct Tri { static constexpr long long v = Tri<N - 1>::v + N; };
+template <> struct Tri<0> { static constexpr long long v = 0; };
+template <std::size_t... I> long long total(std::index_sequence<I...>) {
+    std::map<int, std::vector<std::string>> m;
+    return (0LL + ... + (Tri<I % 400>::v + (long long)m.size()));
+}
+int main() {
+    std::cout << total(std::make_index_sequence<@N@>{}) << std::endl;
+    return 0;
+}
+"""
+
+# Recorded with --quick on the reference machine, checked by default on --quick runs
+DEFAULT_BASELINE = os.path.join(ROOT, "scripts", "benchmark_baseline.json")
+# metric name suffixes where a larger value is better
+HIGHER_IS_BETTER = ("_per_sec",)
+# Absolute slack for millisecond latencies, so sub-millisecond jitter doesn't fail the gate
+MS_SLACK = 0.5
+
+def write(path, content):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w') as f:
+        f.write(content)
+
+def add_problem(prob, src, cases, timeout=5, packed=False):
+    """Write src/<prob>.cpp and tests/<prob> from a list of (input, expected) strings.
+
+    With packed, the cases go to a deflated tests/<prob>/cases.zip instead of loose files.
+    """
+    write(os.path.join("src", f"{prob}.cpp"), src)
+    if packed:
+        os.makedirs(os.path.join("tests", prob), exist_ok=True)
+        with zipfile.ZipFile(os.path.join("tests", prob, "cases.zip"), 'w', zipfile.ZIP_DEFLATED) as z:
+            for i, (given, expected) in enumerate(cases, 1):
+                z.writestr(f"inputs/{i:03d}.in", given)
+                z.writestr(f"outputs/{i:03d}.out", expected)
+    else:
+        for i, (given, expected) in enumerate(cases, 1):
+            write(os.path.join("tests", prob, "inputs", f"{i:03d}.in"), given)
+            write(os.path.join("tests", prob, "outputs", f"{i:03d}.out"), expected)
+    return f"  {prob}:\n    name: {prob}\n    points: 10\n    timeout: {timeout}\n"
+
+def lines_output(n):
+    return "".join(f"{i} {i * i}\n" for i in range(n))
+
+def build_workspace(sizes):
+    """Generate every synthetic problem in the current directory, returns problem groups"""
+    problems = ""
+    tiny = [(f"case {i}\n", f"case {i}\n") for i in range(sizes["tiny_cases"])]
+    problems += add_problem("tiny", ECHO_SRC, tiny)
+    problems += add_problem("packed", ECHO_SRC + "// packed\n", tiny, packed=True)
+    huge = [(f"{sizes['huge_lines']}\n", lines_output(sizes["huge_lines"]))] * sizes["huge_cases"]
+    problems += add_problem("huge", LINES_SRC, huge, timeout=30)
+    many = []
+    for i in range(sizes["many_problems"]):
+        prob = f"m{i:03d}"
+        # Distinct sources, so every problem is a real compile
+        problems += add_problem(prob, ECHO_SRC + f"// {prob}\n", [(f"{j}\n", f"{j}\n") for j in range(5)])
+        many.append(prob)
+    write(os.path.join("src", "slow.cpp"), SLOW_COMPILE_SRC.replace("@N@", str(sizes["slow_instantiations"])))
+
+    write(os.path.join("config", "config.yaml"), (
+        "compiler_path: g++\n"
+        "compiler:\n"
+        "  flags: -std=c++17 -O2\n"
+        "  pch: [bits/stdc++.h]\n"
+        f"defaults:\n  timeout: 5\n  jobs: {os.cpu_count() or 1}\n"
+        "problems:\n" + problems
+    ))
+    os.makedirs("build", exist_ok=True)
+    return many
+
+@contextlib.contextmanager
+def measure(results, name):
+    """Record wall seconds and the Python allocation peak of the block in results[name]"""
+    entry = results.setdefault(name, {})
+    tracemalloc.start()
+    start = time.perf_counter()
+    try:
+        yield entry
+    finally:
+        entry["wall_sec"] = round(time.perf_counter() - start, 4)
+        entry["py_peak_mb"] = round(tracemalloc.get_traced_memory()[1] / 2**20, 2)
+        tracemalloc.stop()
+
+def bench_compile(results, sizes):
+    from app.compiler import compile_problem_with_log
+    src = os.path.join("src", "slow.cpp")
+
+    # First call also builds the precompiled headers, keep it out of the figures
+    with measure(results, "compile_pch_build") as r:
+        bin_path, log = compile_problem_with_log("echo_pch", os.path.join("src", "tiny.cpp"), "build")
+        r["ok"] = bool(bin_path)
+
+    with measure(results, "compile_cold") as r:
+        start = time.perf_counter()
+        bin_path, log = compile_problem_with_log("slow", src, "build")
+        r["latency_ms"] = round((time.perf_counter() - start) * 1000, 1)
+        r["ok"] = bool(bin_path)
+        if not bin_path:
+            print(log)
+
+    with measure(results, "compile_cached") as r:
+        start = time.perf_counter()
+        for _ in range(sizes["repeat"]):
+            compile_problem_with_log("slow", src, "build")
+        r["latency_ms"] = round((time.perf_counter() - start) * 1000 / sizes["repeat"], 2)
+
+def bench_run_test_case(results, sizes):
+    from app.runner import run_test_case
+    from app.compiler import compile_problem_with_log
+    bin_path, _ = compile_problem_with_log("tiny", os.path.join("src", "tiny.cpp"), "build")
+    case_in = os.path.join("tests", "tiny", "inputs", "001.in")
+    case_out = os.path.join("tests", "tiny", "outputs", "001.out")
+
+    with measure(results, "run_test_case") as r:
+        start = time.perf_counter()
+        for _ in range(sizes["repeat"]):
+            status, _, _ = run_test_case(bin_path, case_in, case_out, 5)
+            assert status == "PASS", status
+        r["latency_ms"] = round((time.perf_counter() - start) * 1000 / sizes["repeat"], 3)
+
+def bench_run_problem(results, prob, name, config, cases, output_bytes=0):
+    from app.runner import run_problem
+    with measure(results, name) as r:
+        start = time.perf_counter()
+        fail, score, total, details = run_problem(prob, config, capture_logs=True)
+        elapsed = time.perf_counter() - start
+        assert fail == 0, details[:1]
+        r["per_case_ms"] = round(elapsed * 1000 / cases, 3)
+        r["cases_per_sec"] = round(cases / elapsed, 1)
+        if output_bytes:
+            r["output_mb_per_sec"] = round(output_bytes / 2**20 / elapsed, 1)
+
+def bench_many_problems(results, many, config):
+    import run_tests
+    with measure(results, "many_problems") as r:
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            graded = list(run_tests.grade_problems(many, config))
+        elapsed = time.perf_counter() - start
+        assert all(res[0] == 0 for _, res in graded)
+        r["problems_per_sec"] = round(len(many) / elapsed, 2)
+
+def bench_endpoints(results, sizes):
+    try:
+        from app.server import create_app
+    except ImportError as e:
+        results["endpoints"] = {"skipped": str(e)}
+        return
+    client = create_app().test_client()
+    for name, url in (("api_problems", "/api/problems"), ("api_problem_info", "/api/problem/tiny/info")):
+        with measure(results, name) as r:
+            start = time.perf_counter()
+            for _ in range(sizes["repeat"]):
+                assert client.get(url).status_code == 200
+            r["latency_ms"] = round((time.perf_counter() - start) * 1000 / sizes["repeat"], 3)
+
+def compare(results, baseline, tolerance):
+    """List of regression messages of results against baseline"""
+    regressions = []
+    for name, metrics in baseline.get("results", {}).items():
+        for metric, base in metrics.items():
+            value = results.get(name, {}).get(metric)
+            if not isinstance(base, (int, float)) or isinstance(base, bool) or not isinstance(value, (int, float)):
+                continue
+            if metric == "wall_sec" or base == 0:
+                continue # Scenario totals are informational; rates, latencies and memory are gated
+            if metric.endswith(HIGHER_IS_BETTER):
+                worse = value < base * (1 - tolerance)
+            else:
+                worse = value > base * (1 + tolerance) + (MS_SLACK if metric.endswith("_ms") else 0)
+            if worse:
+                regressions.append(f"{name}.{metric}: {value} (baseline {base}, tolerance {tolerance:.0%})")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the grading pipeline")
+    parser.add_argument("--quick", action="store_true", help="Smaller workloads (for CI)")
+    parser.add_argument("-o", "--output", default=os.path.join(ROOT, "build", "benchmark.json"), help="JSON results file")
+    parser.add_argument("--baseline", help="Fail if results regress against this JSON file (default with --quick: scripts/benchmark_baseline.json)")
+    parser.add_argument("--no-baseline", action="store_true", help="Only measure, don't compare against a baseline")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Allowed regression as a fraction (default: 0.25)")
+    parser.add_argument("--save-baseline", metavar="PATH", help="Also write the results as a new baseline")
+    parser.add_argument("--keep", action="store_true", help="Keep the generated workspace")
+    args = parser.parse_args()
+
+    if shutil.which("g++") is None:
+        print("❌ g++ not found")
+        sys.exit(2)
+
+    baseline_path = args.baseline
+    if baseline_path is None and args.quick and not args.save_baseline:
+        baseline_path = DEFAULT_BASELINE
+    if args.no_baseline:
+        baseline_path = None
+    if baseline_path and not os.path.isfile(baseline_path):
+        # Checked up front, a gate with nothing to compare against must not pass silently
+        print(f"❌ Baseline not found: {baseline_path} (record one with --save-baseline, or pass --no-baseline)")
+        sys.exit(2)
+
+    sizes = {
+        "tiny_cases": 100 if args.quick else 500,
+        "huge_cases": 2 if args.quick else 4,
+        "huge_lines": 200_000 if args.quick else 1_000_000,
+        "many_problems": 8 if args.quick else 30,
+        "slow_instantiations": 2000 if args.quick else 6000,
+        "repeat": 20 if args.quick else 100,
+    }
+
+    workspace = tempfile.mkdtemp(prefix="labtest-bench-")
+    cwd = os.getcwd()
+    results = {}
+    try:
+        # The app resolves src/, tests/, config/ and build/ against the working directory
+        os.chdir(workspace)
+        many = build_workspace(sizes)
+        from app.config import load_config
+        config = load_config()
+
+        bench_compile(results, sizes)
+        bench_run_test_case(results, sizes)
+        bench_run_problem(results, "tiny", "tiny_cases", config, sizes["tiny_cases"])
+        bench_run_problem(results, "packed", "packed_cases", config, sizes["tiny_cases"])
+        huge_bytes = len(lines_output(sizes["huge_lines"])) * sizes["huge_cases"]
+        bench_run_problem(results, "huge", "huge_output", config, sizes["huge_cases"], huge_bytes)
+        bench_many_problems(results, many, config)
+        bench_endpoints(results, sizes)
+        results["process"] = {"peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)}
+    finally:
+        os.chdir(cwd)
+        if args.keep:
+            print(f"📁 Workspace kept at {workspace}")
+        else:
+            shutil.rmtree(workspace, ignore_errors=True)
+
+    report = {
+        "meta": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "quick": args.quick,
+            "sizes": sizes,
+        },
+        "results": results,
+    }
+    for path in filter(None, (args.output, args.save_baseline)):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with open(path, 'w') as f:
+            json.dump(report, f, indent=2)
+    print(json.dumps(results, indent=2))
+
+    if baseline_path:
+        with open(baseline_path) as f:
+            baseline = json.load(f)
+        if baseline.get("meta", {}).get("quick") != args.quick:
+            print("⚠️  Baseline was recorded with a different --quick setting")
+        regressions = compare(results, baseline, args.tolerance)
+        if regressions:
+            print("❌ Regressions:")
+            for line in regressions:
+                print(f"  {line}")
+            sys.exit(1)
+        print("✅ No regressions against the baseline")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+import os
+import sys
+import shutil
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, ROOT)
+
+from app import config, manifest, results, usage
+
+@pytest.fixture(scope="session")
+def cache_dir(tmp_path_factory):
+    # One compile cache (and usage helper) for the whole session
+    return str(tmp_path_factory.mktemp("cache"))
+
+@pytest.fixture
+def workspace(tmp_path, monkeypatch, cache_dir):
+    """Empty project (config/, src/, tests/, build/) as the working directory.
+
+    The app resolves every path against the working directory; caches that
+    outlive a chdir are reset so nothing leaks between tests.
+    """
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setitem(config._config_cache, "stamp", None)
+    monkeypatch.setattr(manifest, "_manifests", {})
+    monkeypatch.setattr(manifest, "_scanned", {})
+    monkeypatch.setattr(usage, "_helper", {})
+    results._forget_connections()
+    os.makedirs("config")
+    with open(os.path.join("config", "config.yaml"), "w") as f:
+        f.write(
+            "compiler_path: g++\n"
+            f"compiler:\n  flags: -std=c++17 -O0\n  cache_dir: {cache_dir}\n"
+            "defaults:\n  timeout: 2\n  jobs: 2\n"
+            "problems:\n"
+        )
+    yield tmp_path
+    results._forget_connections()
+
+def add_problem(prob, src, fixtures, **spec):
+    """Write src/<prob>.cpp, tests/<prob>/{inputs,outputs} and the problem's config entry.
+
+    fixtures is a list of (input, expected) strings (expected None: no output file).
+    """
+    os.makedirs("src", exist_ok=True)
+    with open(os.path.join("src", f"{prob}.cpp"), "w") as f:
+        f.write(src)
+    for sub in ("inputs", "outputs"):
+        os.makedirs(os.path.join("tests", prob, sub), exist_ok=True)
+    for i, (given, expected) in enumerate(fixtures, 1):
+        with open(os.path.join("tests", prob, "inputs", f"{i:02d}.in"), "w") as f:
+            f.write(given)
+        if expected is not None:
+            with open(os.path.join("tests", prob, "outputs", f"{i:02d}.out"), "w") as f:
+                f.write(expected)
+    spec = {"name": prob, "points": 10, "timeout": 2, **spec}
+    with open(os.path.join("config", "config.yaml"), "a") as f:
+        f.write(f"  {prob}:\n" + "".join(f"    {k}: {_yaml(v)}\n" for k, v in spec.items()))
+
+def _yaml(value):
+    if isinstance(value, dict):
+        return "{" + ", ".join(f"'{k}': {v}" for k, v in value.items()) + "}"
+    if isinstance(value, list):
+        return "[" + ", ".join(value) + "]"
+    return value
+
+needs_gxx = pytest.mark.skipif(not shutil.which("g++"), reason="needs g++")
+
+ECHO = """#include <cstdio>
+int main() { int c; while ((c = getchar()) != EOF) putchar(c); return 0; }
+"""
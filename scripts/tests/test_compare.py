@@ -0,0 +1,83 @@
+import io
+import hashlib
+
+import pytest
+
+from app.compare import (
+    CHUNK_SIZE, get_comparator, first_mismatch, iter_tokens, iter_lines, diff_window,
+)
+
+def _check(mode, expected, got, **spec):
+    """Mismatch of got against expected under a compare mode, None on a pass.
+
+    Also checks the digest fast path agrees: equal digests must mean a pass.
+    """
+    _, digest, mismatch = get_comparator({"mode": mode, **spec})
+    result = mismatch(io.BytesIO(expected), io.BytesIO(got))
+    if digest(io.BytesIO(expected)) == digest(io.BytesIO(got)):
+        assert result is None
+    return result
+
+def test_exact_ignores_line_endings_and_outer_whitespace():
+    assert _check("exact", b"1 2\n3\n", b"\n1 2\r\n3\r\n\n\n") is None
+    assert _check("exact", b"1 2\n3\n", b"1  2\n3\n") == {"offset": 2, "line": 1}
+
+def test_exact_counts_lines_after_leading_whitespace():
+    assert first_mismatch(io.BytesIO(b"\n\na\nb\n"), io.BytesIO(b"a\nc\n"))["line"] == 2
+
+def test_line_mode_ignores_trailing_whitespace_only():
+    assert _check("line", b"a b\nc\n", b"a b  \nc\n\n") is None
+    assert _check("line", b"a b\nc\n", b"a  b\nc\n") == {"offset": None, "line": 1}
+
+def test_token_mode_ignores_all_whitespace():
+    assert _check("token", b"1 2\n3\n", b"1\n2 3") is None
+    assert _check("token", b"1 2\n3\n", b"1 2\n\n4")["line"] == 2
+
+def test_float_mode_tolerances():
+    assert _check("float", b"0.3333333\n", b"0.33333331\n") is None
+    assert _check("float", b"1.0\n", b"1.1\n") is not None
+    assert _check("float", b"1.0\n", b"1.1\n", abs_eps=0.2) is None
+    assert _check("float", b"nan\n", b"nan\n") is None
+    assert _check("float", b"nan\n", b"1\n") is not None
+
+def test_unknown_mode_is_rejected():
+    with pytest.raises(ValueError):
+        get_comparator({"mode": "fuzzy"})
+
+@pytest.mark.parametrize("chunk_size", [1, 2, 3, 7, 64])
+def test_tokens_across_chunk_boundaries(chunk_size):
+    data = b"ab  c\n\nlongtoken x\n"
+    tokens = list(iter_tokens(io.BytesIO(data), chunk_size))
+    expected = [(b"ab", 1, 0), (b"c", 1, 4), (b"longtoken", 3, 7), (b"x", 3, 17)]
+    # Tokens longer than a chunk are compared by hash
+    assert tokens == [(t if len(t) <= chunk_size else b" " + hashlib.sha256(t).digest(), l, o)
+                      for t, l, o in expected]
+
+def test_huge_token_is_hashed_and_compared():
+    token = b"7" * (3 * CHUNK_SIZE + 5)
+    tokens = list(iter_tokens(io.BytesIO(b"1 " + token + b"\n2")))
+    assert tokens[1] == (b" " + hashlib.sha256(token).digest(), 1, 2)
+    assert _check("token", b"1 " + token + b" 2", b"1\n" + token + b"\n2\n") is None
+    assert _check("token", b"1 " + token + b" 2", b"1 " + token + b"8 2") is not None
+
+def test_long_lines_equal_up_to_trailing_whitespace():
+    line = b"x" * (CHUNK_SIZE - 1)
+    assert list(iter_lines(io.BytesIO(line + b"   \n"))) == list(iter_lines(io.BytesIO(line + b"\n")))
+    long_line = b"y" * (2 * CHUNK_SIZE)
+    assert _check("line", long_line + b"\n", long_line + b" \t\n") is None
+    assert _check("line", long_line + b"\n", long_line + b"z\n") == {"offset": None, "line": 1}
+
+def test_diff_window_rows_follow_comparator_lines():
+    expected, got = b"\n\n1\n2\n3\n4\n", b"1\n2\nX\n4\n"
+    line = first_mismatch(io.BytesIO(expected), io.BytesIO(got))["line"]
+    diff = diff_window(io.BytesIO(expected), io.BytesIO(got), line)
+    assert diff["first_line"] == 3
+    assert diff["differing_lines"] == 1
+    rows = {row["line"]: row for row in diff["rows"]}
+    assert (rows[3]["expected"], rows[3]["got"], rows[3]["same"]) == ("3", "X", False)
+    assert all(rows[n]["same"] and rows[n]["expected"] == rows[n]["got"] for n in (1, 2, 4))
+
+def test_diff_window_reports_missing_lines():
+    diff = diff_window(io.BytesIO(b"a\nb\nc\n"), io.BytesIO(b"a\n"), 2, mode="line")
+    assert diff["expected_lines"] == 3 and diff["got_lines"] == 1
+    assert diff["rows"][-1]["got"] is None
@@ -0,0 +1,38 @@
+from app.lexer import tokenize, has_keyword
+
+SOURCE = r'''#include <algorithm>
+#include "helper.h"
+// for every item, while we can
+/* goto
+   do */
+int main() {
+    const char* s = "for while \" goto";
+    const char* r = R"x(do ) " for)x";
+    char c = 'f';
+    std::sort(v.begin(), v.end());
+    return factorial(5);
+}
+'''
+
+def test_comments_and_literals_are_not_code():
+    tokens = tokenize(SOURCE)
+    for keyword in ("for", "while", "goto", "do"):
+        assert not has_keyword(tokens, keyword), keyword
+    assert "factorial" in tokens.identifiers
+
+def test_include_header_names_count_as_code():
+    tokens = tokenize(SOURCE)
+    assert has_keyword(tokens, "algorithm")
+    assert has_keyword(tokens, "#include <algorithm>")
+
+def test_qualified_names_match_across_whitespace():
+    tokens = tokenize(SOURCE)
+    assert has_keyword(tokens, "std::sort")
+    assert has_keyword(tokens, "std :: sort")
+    assert not has_keyword(tokens, "std::stable_sort")
+
+def test_identifiers_match_whole_words():
+    tokens = tokenize("int format = 0; while_loop();")
+    assert not has_keyword(tokens, "for")
+    assert not has_keyword(tokens, "while")
+    assert has_keyword(tokens, "while_loop")
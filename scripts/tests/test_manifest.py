@@ -0,0 +1,59 @@
+import os
+import zipfile
+
+from app.compare import expected_digest
+from app.manifest import get_manifest
+from conftest import add_problem
+
+def _write(path, text):
+    with open(path, "w") as f:
+        f.write(text)
+
+def test_no_tests_is_none(workspace):
+    assert get_manifest("p1") is None
+
+def test_cases_and_digests(workspace):
+    add_problem("p1", "", [("1\n", "2\n"), ("3\n", None)])
+    cases = get_manifest("p1", ("exact",))
+    assert [c["case"] for c in cases] == ["01.in", "02.in"]
+    assert cases[0]["in_preview"] == "1\n"
+    assert cases[0]["digests"]["exact"] == expected_digest(cases[0]["output"])
+    assert cases[1]["output"] is None
+
+def test_output_rewritten_in_place_is_rehashed(workspace):
+    add_problem("p1", "", [("1\n", "2\n")])
+    before = get_manifest("p1", ("exact",))[0]["digests"]["exact"]
+    # Same size, same directory mtime: only the file itself changed
+    _write(os.path.join("tests", "p1", "outputs", "01.out"), "3\n")
+    case = get_manifest("p1", ("exact",))[0]
+    assert case["digests"]["exact"] != before
+    assert case["digests"]["exact"] == expected_digest(case["output"])
+
+def test_added_and_removed_cases(workspace):
+    add_problem("p1", "", [("1\n", "1\n")])
+    assert len(get_manifest("p1")) == 1
+    _write(os.path.join("tests", "p1", "inputs", "02.in"), "2\n")
+    assert [c["id"] for c in get_manifest("p1")] == ["01", "02"]
+    os.remove(os.path.join("tests", "p1", "inputs", "01.in"))
+    assert [c["id"] for c in get_manifest("p1")] == ["02"]
+
+def test_unchanged_manifest_is_reused(workspace):
+    add_problem("p1", "", [("1\n", "1\n")])
+    assert get_manifest("p1") is get_manifest("p1")
+
+def test_packed_cases_and_loose_override(workspace):
+    os.makedirs(os.path.join("tests", "p1"))
+    with zipfile.ZipFile(os.path.join("tests", "p1", "cases.zip"), "w") as z:
+        z.writestr("inputs/01.in", "packed in\n")
+        z.writestr("outputs/01.out", "packed out\n")
+        z.writestr("inputs/02.in", "second\n")
+    cases = get_manifest("p1")
+    assert [c["in_preview"] for c in cases] == ["packed in\n", "second\n"]
+    assert cases[1]["output"] is None
+
+    os.makedirs(os.path.join("tests", "p1", "inputs"))
+    os.makedirs(os.path.join("tests", "p1", "outputs"))
+    _write(os.path.join("tests", "p1", "outputs", "01.out"), "loose out\n")
+    case = get_manifest("p1")[0]
+    assert case["out_preview"] == "loose out\n"
+    assert case["in_preview"] == "packed in\n"
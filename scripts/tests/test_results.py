@@ -0,0 +1,30 @@
+from app import results
+from app.results import record_run, get_run, run_cases, latest_results, store_cases, cached_cases, get_db
+
+DETAILS = [{"case": "01.in", "status": "PASS"}, {"case": "02.in", "status": "FAIL", "got": "x"}]
+
+def test_record_and_read_back(workspace):
+    run_id = record_run("p1", 5, 10, DETAILS, submission="alice")
+    run = get_run(run_id)
+    assert (run["score"], run["passed"], run["total"]) == (5, 1, 2)
+    assert [row["status"] for row in run_cases(run_id)] == ["PASS", "FAIL"]
+    assert [row["name"] for row in run_cases(run_id, 1, 1)] == ["02.in"]
+    assert latest_results("alice")["p1"]["id"] == run_id
+    assert latest_results() == {}
+
+def test_only_latest_runs_are_kept(workspace, monkeypatch):
+    monkeypatch.setattr(results, "RUNS_KEPT_PER_PROB", 2)
+    ids = [record_run("p1", 0, 10, DETAILS) for _ in range(4)]
+    other = record_run("p1", 0, 10, DETAILS, submission="bob")
+    assert [get_run(i) is not None for i in ids] == [False, False, True, True]
+    assert get_run(other) is not None
+    # Cases of dropped runs go with them
+    kept = get_db().execute("SELECT COUNT(*) FROM cases").fetchone()[0]
+    assert kept == 3 * len(DETAILS)
+
+def test_case_cache_round_trip(workspace):
+    store_cases([("k1", "PASS", None, {"wall_ms": 3}), ("k2", "FAIL", {"line": 2}, None)])
+    cached = cached_cases(["k1", "k2", "missing"])
+    assert cached["k1"] == ("PASS", None, {"wall_ms": 3})
+    assert cached["k2"][:2] == ("FAIL", {"line": 2})
+    assert "missing" not in cached
@@ -0,0 +1,83 @@
+import io
+import os
+import stat
+import shutil
+
+from app.runner import run_problem
+from app.config import load_config
+from conftest import add_problem, needs_gxx, ECHO
+
+pytestmark = needs_gxx
+
+def _run(prob, **kwargs):
+    out = io.StringIO()
+    fail, score, total, details = run_problem(prob, load_config(), out=out, **kwargs)
+    return score, [d["status"] for d in details], out.getvalue()
+
+def test_passing_and_failing_cases(workspace):
+    add_problem("p1", ECHO, [("1\n", "1\n"), ("2\n", "3\n"), ("3\n", None)])
+    add_problem("p2", ECHO, [("1\n", "1\n")])
+    assert _run("p1")[:2] == (0, ["PASS", "FAIL", "ERROR"])
+    assert _run("p2")[:2] == (10, ["PASS"])
+    with open(os.path.join("build", "p2.score")) as f:
+        assert f.read() == "10 10"
+
+def test_compare_mode_from_config(workspace):
+    add_problem("p1", ECHO, [("1  2\n", "1 2\n")], compare={"mode": "token"})
+    assert _run("p1")[1] == ["PASS"]
+
+def test_unchanged_cases_come_from_the_cache(workspace):
+    add_problem("p1", ECHO, [("1\n", "1\n"), ("2\n", "3\n")])
+    first = _run("p1")
+    second = _run("p1")
+    assert first[1] == second[1] == ["PASS", "FAIL"]
+    assert ", cached" not in first[2]
+    assert ", cached" in second[2]
+    assert ", cached" not in _run("p1", force=True)[2]
+
+def test_changed_expected_output_is_not_served_from_the_cache(workspace):
+    add_problem("p1", ECHO, [("1\n", "1\n")])
+    assert _run("p1")[1] == ["PASS"]
+    with open(os.path.join("tests", "p1", "outputs", "01.out"), "w") as f:
+        f.write("2\n")
+    assert _run("p1")[1] == ["FAIL"]
+
+def test_fail_fast_skips_the_remaining_cases(workspace):
+    add_problem("p1", ECHO, [("1\n", "0\n"), ("2\n", "2\n"), ("3\n", "3\n")])
+    _, statuses, _ = _run("p1", jobs=1, fail_fast=True)
+    assert statuses == ["FAIL", "SKIPPED", "SKIPPED"]
+    assert _run("p1", jobs=1, fail_fast=False, force=True)[1] == ["FAIL", "PASS", "PASS"]
+
+def test_forbidden_keyword_fails_before_compiling(workspace):
+    add_problem("p1", ECHO, [("1\n", "1\n")], forbidden=["while"])
+    assert _run("p1")[1] == ["FAIL"]
+    assert not os.path.exists(os.path.join("build", "p1"))
+
+def test_compiler_killed_by_a_signal_is_not_cached(workspace):
+    gxx = shutil.which("g++")
+    wrapper = os.path.abspath("cxx")
+    with open(wrapper, "w") as f:
+        f.write(
+            "#!/bin/sh\n"
+            f'case "$*" in *--version*) exec {gxx} --version;; esac\n'
+            f'[ -f "{workspace}/healthy" ] && exec {gxx} "$@"\n'
+            "kill -9 $$\n"
+        )
+    os.chmod(wrapper, os.stat(wrapper).st_mode | stat.S_IEXEC)
+    with open(os.path.join("config", "config.yaml")) as f:
+        text = f.read()
+    with open(os.path.join("config", "config.yaml"), "w") as f:
+        f.write(text.replace("compiler_path: g++", f"compiler_path: {wrapper}"))
+    add_problem("p1", ECHO, [("1\n", "1\n")])
+
+    assert _run("p1")[1] == ["FAIL"]
+    open(os.path.join(workspace, "healthy"), "w").close()
+    assert _run("p1")[1] == ["PASS"]
+
+def test_compile_errors_are_reported(workspace):
+    add_problem("p1", "int main() { return x; }\n", [("1\n", "1\n")])
+    _, statuses, _ = _run("p1")
+    assert statuses == ["FAIL"]
+    # The second identical compile is served from the cache with the same log
+    fail, _, _, details = run_problem("p1", load_config(), capture_logs=True)
+    assert details[0]["case"] == "Compilation" and "x" in details[0]["log"]
@@ -0,0 +1,62 @@
+import pytest
+
+pytest.importorskip("flask")
+
+from app.server import create_app
+from app.runner import run_problem
+from app.config import load_config
+from app.compare import TRUNCATION_MARKER
+from app.results import record_run
+from conftest import add_problem, needs_gxx, ECHO
+
+@pytest.fixture
+def client(workspace):
+    return create_app().test_client()
+
+def _graded_run(cases):
+    add_problem("p1", ECHO, cases)
+    saved = {}
+    run_problem("p1", load_config(), capture_logs=True, on_saved=lambda run_id: saved.update(run_id=run_id))
+    return saved["run_id"]
+
+@needs_gxx
+def test_case_pages(client):
+    run_id = _graded_run([(f"{i}\n", f"{i}\n") for i in range(5)])
+    page = client.get(f"/api/runs/{run_id}/cases?offset=3&limit=10").get_json()
+    assert (page["total"], page["offset"], page["limit"]) == (5, 3, 10)
+    assert [c["index"] for c in page["cases"]] == [3, 4]
+    assert page["cases"][0]["case"] == "04.in"
+    # limit is clamped to 1..100
+    assert client.get(f"/api/runs/{run_id}/cases?limit=0").get_json()["limit"] == 1
+    assert client.get(f"/api/runs/{run_id}/cases/4").get_json()["index"] == 4
+    assert client.get(f"/api/runs/{run_id}/cases/5").status_code == 404
+    assert client.get("/api/runs/999999/cases").status_code == 404
+
+@needs_gxx
+def test_input_byte_ranges(client):
+    run_id = _graded_run([("0123456789\n", "0123456789\n")])
+    url = f"/api/runs/{run_id}/cases/0/input"
+    full = client.get(url)
+    assert (full.status_code, full.data) == (200, b"0123456789\n")
+    part = client.get(url, headers={"Range": "bytes=2-5"})
+    assert (part.status_code, part.data) == (206, b"2345")
+    assert part.headers["Content-Range"] == "bytes 2-5/11"
+    assert client.get(url, headers={"Range": "bytes=-3"}).data == b"89\n"
+    past = client.get(url, headers={"Range": "bytes=50-60"})
+    assert (past.status_code, past.headers["Content-Range"]) == (416, "bytes */11")
+    assert client.get(f"/api/runs/{run_id}/cases/0/nope").status_code == 404
+
+def test_got_preview_is_marked_truncated(client):
+    got = "x" * 4096
+    run_id = record_run("p1", 0, 10, [
+        {"case": "01.in", "status": "FAIL", "got": got + TRUNCATION_MARKER},
+        {"case": "02.in", "status": "FAIL", "got": "short"},
+    ])
+    url = f"/api/runs/{run_id}/cases/0/got"
+    full = client.get(url)
+    assert (full.data, full.headers["X-Truncated"]) == (got.encode(), "true")
+    past = client.get(url, headers={"Range": "bytes=5000-6000"})
+    assert (past.status_code, past.headers["Content-Range"]) == (416, "bytes */4096")
+    assert past.headers["X-Truncated"] == "true"
+    short = client.get(f"/api/runs/{run_id}/cases/1/got")
+    assert (short.data, "X-Truncated" in short.headers) == (b"short", False)
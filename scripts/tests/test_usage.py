@@ -0,0 +1,59 @@
+import os
+import shutil
+import subprocess
+
+import pytest
+
+from app.runner import run_test_case
+from app.usage import get_usage_helper
+
+pytestmark = pytest.mark.skipif(
+    not shutil.which("g++") or not hasattr(os, "fork"),
+    reason="needs g++ and fork"
+)
+
+TRIVIAL = "int main() { return 0; }\n"
+# Touches 64 MB so it is resident
+LARGE = """
+#include <cstdlib>
+#include <cstring>
+int main() { char* p = (char*)malloc(64 << 20); memset(p, 1, 64 << 20); return p[12345] - 1; }
+"""
+CRASH = "int main() { volatile int* p = nullptr; return *p; }\n"
+SPIN = "int main() { for (;;) {} }\n"
+
+def _compile(tmp_path, name, source):
+    src = tmp_path / f"{name}.cpp"
+    src.write_text(source)
+    binary = tmp_path / name
+    subprocess.run(["g++", "-O0", str(src), "-o", str(binary)], check=True)
+    return str(binary)
+
+def _run(tmp_path, binary, timeout_sec=5):
+    empty = tmp_path / "empty.in"
+    empty.write_text("")
+    expected = tmp_path / "empty.out"
+    expected.write_text("")
+    return run_test_case(binary, str(empty), str(expected), timeout_sec)
+
+def test_trivial_program_reports_small_rss(tmp_path):
+    assert get_usage_helper(), "usage helper failed to build"
+    verdict, _, usage = _run(tmp_path, _compile(tmp_path, "trivial", TRIVIAL))
+    assert verdict == "PASS"
+    # The grader itself is well over 20 MB; a bare C++ program is a few MB
+    assert usage["peak_rss_kb"] < 10 * 1024
+
+def test_rss_follows_the_program(tmp_path):
+    verdict, _, usage = _run(tmp_path, _compile(tmp_path, "large", LARGE))
+    assert verdict == "PASS"
+    assert 64 * 1024 <= usage["peak_rss_kb"] < 80 * 1024
+
+def test_crash_is_a_runtime_error(tmp_path):
+    verdict, _, usage = _run(tmp_path, _compile(tmp_path, "crash", CRASH))
+    assert verdict == "Runtime Error"
+    assert usage["peak_rss_kb"] < 10 * 1024
+
+def test_time_limit_is_enforced(tmp_path):
+    verdict, _, usage = _run(tmp_path, _compile(tmp_path, "spin", SPIN), timeout_sec=0.5)
+    assert verdict == "TLE"
+    assert usage["wall_ms"] < 1500
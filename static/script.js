@@ -122,7 +122,86 @@ function updateProgressIndicator() {
     `;
 }
 
-    async function runProblem(e, probName) {
+    // Run a problem as a background job and stream per-case results (SSE).
+    // onCase(details) is called with the results so far; resolves with the
+    // same payload as POST /api/run. idleMs aborts when no event arrives in time.
+    // Attempts at queueing a run while the server answers 503 (queue full)
+    const BUSY_RETRIES = 6;
+
+    async function runStreamed(probName, onCase, idleMs = 0, force = false, onBusy = null) {
+        // force: rerun every case instead of reusing cached results
+        const query = force ? '?force=1' : '';
+        if (typeof EventSource === 'undefined') {
+            // No SSE support: use the blocking endpoint
+            const sync = await fetch(`/api/run/${probName}${query}`, { method: 'POST' });
+            if (!sync.ok) throw new Error(`HTTP error! status: ${sync.status}`);
+            return sync.json();
+        }
+        let res;
+        for (let attempt = 0; ; attempt++) {
+            res = await fetch(`/api/run/${probName}/async${query}`, { method: 'POST' });
+            if (res.status !== 503) break;
+            // Queue full: wait and queue again, grading elsewhere would bypass server.max_queued
+            if (attempt + 1 >= BUSY_RETRIES) {
+                const err = new Error('伺服器忙碌中，請稍後再試');
+                err.name = 'BusyError';
+                throw err;
+            }
+            const waitSec = Number(res.headers.get('Retry-After')) || Math.min(2 ** (attempt + 1), 30);
+            if (onBusy) onBusy(waitSec, attempt + 1);
+            await new Promise(r => setTimeout(r, waitSec * 1000));
+        }
+        if (!res.ok) {
+            throw new Error(`HTTP error! status: ${res.status}`);
+        }
+        const job = await res.json();
+        
+        return new Promise((resolve, reject) => {
+            const source = new EventSource(job.events_url);
+            const details = [];
+            let idleTimer = null;
+            const armIdle = () => {
+                if (!idleMs) return;
+                clearTimeout(idleTimer);
+                idleTimer = setTimeout(() => {
+                    source.close();
+                    const err = new Error('timeout');
+                    err.name = 'AbortError';
+                    reject(err);
+                }, idleMs);
+            };
+            const finish = () => {
+                clearTimeout(idleTimer);
+                source.close();
+            };
+            
+            armIdle();
+            source.addEventListener('case', (ev) => {
+                const msg = JSON.parse(ev.data);
+                details[msg.index] = msg.detail;
+                armIdle();
+                if (onCase) onCase(details.filter(Boolean), msg.total);
+            });
+            source.addEventListener('done', (ev) => {
+                finish();
+                resolve(JSON.parse(ev.data));
+            });
+            source.addEventListener('failed', (ev) => {
+                finish();
+                reject(new Error(JSON.parse(ev.data).error || '執行失敗'));
+            });
+            // EventSource reconnects by itself (resuming with Last-Event-ID);
+            // only give up once the browser has closed the stream
+            source.onerror = () => {
+                if (source.readyState === EventSource.CLOSED) {
+                    finish();
+                    reject(new Error('連線中斷'));
+                }
+            };
+        });
+    }
+
+    async function runProblem(e, probName, force = false) {
         if (e) e.stopPropagation();
             const status = document.getElementById(`status-${probName}`);
         if (status) {
@@ -138,9 +217,16 @@ function updateProgressIndicator() {
                 </div>`;
         }
         
+        const isViewing = () => currentProb === probName && document.getElementById('problem-view').classList.contains('is-visible');
+        
         try {
-            const res = await fetch(`/api/run/${probName}`, { method: 'POST' });
-            const data = await res.json();
+            const data = await runStreamed(probName, (details) => {
+                if (isViewing()) {
+                    document.getElementById('results-container-view').innerHTML = renderTestResults(details);
+                }
+            }, 0, force, (waitSec) => {
+                if (isViewing()) showBusy(waitSec);
+            });
             const idx = problems.findIndex(p => p.name === probName);
             if (idx !== -1) {
                 problems[idx].score = data.score;
@@ -154,10 +240,10 @@ function updateProgressIndicator() {
             updateStats();
             
             // If currently viewing this problem, update results and status badge
-            if (currentProb === probName && document.getElementById('problem-view').classList.contains('is-visible')) {
+            if (isViewing()) {
                 updateHeaderStatus(probName);
                 if (data.details && data.details.length > 0) {
-                    document.getElementById('results-container-view').innerHTML = renderTestResults(data.details);
+                    document.getElementById('results-container-view').innerHTML = renderTestResults(data.details, data.run_id);
                 } else {
                     document.getElementById('results-container-view').innerHTML = '<div style="text-align:center; padding: 32px; color: var(--cds-text-secondary);">沒有測試結果</div>';
                 }
@@ -165,9 +251,21 @@ function updateProgressIndicator() {
         } catch (err) {
             console.error(err);
             if (status) status.className = 'status-indicator fail';
+            if (err.name === 'BusyError' && isViewing()) {
+                document.getElementById('results-container-view').innerHTML = '<p style="color:var(--cds-danger); text-align:center; padding: 32px;">' + err.message + '</p>';
+            }
         }
     }
 
+    // Shown while a run waits for room in the server's queue
+    function showBusy(waitSec) {
+        document.getElementById('results-container-view').innerHTML = `
+            <div class="loading-container">
+                <div class="spinner"></div>
+                <p>伺服器忙碌中，${waitSec} 秒後自動重試...</p>
+            </div>`;
+    }
+
     async function runAll() {
         for (const p of problems) {
             await runProblem(null, p.name);
@@ -327,33 +425,93 @@ function updateProgressIndicator() {
         return saveCode();
     }
 
-    function renderTestResults(details) {
+    // Bounded diff from the server: a summary and a few numbered lines around the first mismatch
+    function renderDiffWindow(diff) {
+        if (!diff) return '';
+        const rows = diff.rows.map(r => {
+            if (r.same) return `<div class="diff-line"><span class="diff-num">${r.line}</span>  ${r.expected}</div>`;
+            let html = '';
+            if (r.expected !== null) html += `<div class="diff-line diff-del"><span class="diff-num">${r.line}</span>- ${r.expected}</div>`;
+            if (r.got !== null) html += `<div class="diff-line diff-add"><span class="diff-num">${r.line}</span>+ ${r.got}</div>`;
+            return html;
+        }).join('');
+        return `<div class="keyword-info">${diff.summary}</div><div class="mt-1"><h5>差異 (Diff)</h5><div class="diff-box diff-window">${rows}</div></div>`;
+    }
+
+    // Content of one case; needs the full detail (input / expected / got)
+    function renderCaseContent(d) {
+        if (d.status === 'PASS') {
+            return `<div class="diff-block"><div class="diff-col"><h5>輸入 (Input)</h5><div class="diff-box">${d.input}</div></div><div class="diff-col"><h5>輸出 (Output)</h5><div class="diff-box">${d.output}</div></div></div>`;
+        } else if (d.status === 'FAIL' && d.case === 'Keyword Check') {
+            const forbiddenList = d.forbidden ? d.forbidden.join(', ') : '無';
+            const requiredList = d.required ? d.required.join(', ') : '無';
+            const violations = d.violations ? d.violations.join('<br>') : d.msg;
+            return `<div class="keyword-info"><div><strong>禁止關鍵字:</strong> ${forbiddenList}</div><div><strong>必須關鍵字:</strong> ${requiredList}</div><div style="margin-top:8px"><strong>違規項目:</strong><br>${violations}</div></div>`;
+        } else if (d.status === 'FAIL' && d.case === 'Compilation') {
+            return `<div class="compile-log"><strong>編譯錯誤日誌:</strong><br><br>${d.log || '無日誌'}</div>`;
+        } else if (d.status === 'FAIL') {
+            return renderDiffWindow(d.diff) + `<div class="diff-block"><div class="diff-col"><h5>預期輸出 (Expected)</h5><div class="diff-box">${d.expected}</div></div><div class="diff-col"><h5>實際輸出 (Got)</h5><div class="diff-box">${d.got}</div></div></div><div class="mt-1"><h5>輸入 (Input)</h5><div class="diff-box">${d.input}</div></div>`;
+        } else if (d.status === 'TLE') {
+            return `<div>時間限制: ${d.timeout}s</div><div class="mt-1"><h5>輸入 (Input)</h5><div class="diff-box">${d.input}</div></div>`;
+        } else if (d.status === 'SKIPPED') {
+            return `<div>已略過：前面的測資未通過（fail-fast）</div>`;
+        } else if (d.status === 'ERROR') {
+            return `<div class="keyword-info"><strong>執行錯誤:</strong> ${d.msg}</div>`;
+        }
+        return '';
+    }
+
+    // /api/run only sends case summaries; inputs and outputs are fetched when a case is opened
+    function needsCaseDetail(d) {
+        return d.input === undefined && ['PASS', 'FAIL', 'TLE'].includes(d.status)
+            && d.case !== 'Keyword Check' && d.case !== 'Compilation';
+    }
+
+    async function toggleCase(summary) {
+        const box = summary.nextElementSibling;
+        box.classList.toggle('is-open');
+        const runId = box.dataset.run;
+        if (!runId || box.dataset.loaded) return;
+        box.dataset.loaded = '1';
+        try {
+            const res = await fetch(`/api/runs/${runId}/cases/${box.dataset.index}`);
+            if (!res.ok) throw new Error(`HTTP error! status: ${res.status}`);
+            box.innerHTML = renderCaseContent(await res.json());
+        } catch (err) {
+            console.error(err);
+            delete box.dataset.loaded;
+            box.innerHTML = '<div class="keyword-info">載入失敗，請再點一次。</div>';
+        }
+    }
+
+    // runId: set once the run is saved, lets closed cases load their details
+    function renderTestResults(details, runId) {
         if (!details || details.length === 0) return '<p style="padding:16px">無測試資料。</p>';
         return details.map((d, i) => {
             const statusClass = d.status.toLowerCase();
             let content = '';
-            if (d.status === 'PASS') {
-                content = `<div class="diff-block"><div class="diff-col"><h5>輸入 (Input)</h5><div class="diff-box">${d.input}</div></div><div class="diff-col"><h5>輸出 (Output)</h5><div class="diff-box">${d.output}</div></div></div>`;
-            } else if (d.status === 'FAIL' && d.case === 'Keyword Check') {
-                const forbiddenList = d.forbidden ? d.forbidden.join(', ') : '無';
-                const requiredList = d.required ? d.required.join(', ') : '無';
-                const violations = d.violations ? d.violations.join('<br>') : d.msg;
-                content = `<div class="keyword-info"><div><strong>禁止關鍵字:</strong> ${forbiddenList}</div><div><strong>必須關鍵字:</strong> ${requiredList}</div><div style="margin-top:8px"><strong>違規項目:</strong><br>${violations}</div></div>`;
-            } else if (d.status === 'FAIL' && d.case === 'Compilation') {
-                content = `<div class="compile-log"><strong>編譯錯誤日誌:</strong><br><br>${d.log || '無日誌'}</div>`;
-            } else if (d.status === 'FAIL') {
-                content = `<div class="diff-block"><div class="diff-col"><h5>預期輸出 (Expected)</h5><div class="diff-box">${d.expected}</div></div><div class="diff-col"><h5>實際輸出 (Got)</h5><div class="diff-box">${d.got}</div></div></div><div class="mt-1"><h5>輸入 (Input)</h5><div class="diff-box">${d.input}</div></div>`;
-            } else if (d.status === 'TLE') {
-                content = `<div>時間限制: ${d.timeout}s</div><div class="mt-1"><h5>輸入 (Input)</h5><div class="diff-box">${d.input}</div></div>`;
-            } else if (d.status === 'ERROR') {
-                content = `<div class="keyword-info"><strong>執行錯誤:</strong> ${d.msg}</div>`;
+            let lazy = '';
+            if (needsCaseDetail(d)) {
+                // The bounded diff comes with the summary, the rest on demand
+                content = (d.diff ? renderDiffWindow(d.diff) : '')
+                    + `<div style="color: var(--cds-text-secondary);">${runId ? '載入中...' : '測試完成後可查看詳細內容'}</div>`;
+                if (runId) lazy = ` data-run="${runId}" data-index="${d.index !== undefined ? d.index : i}"`;
+            } else {
+                content = renderCaseContent(d);
             }
-            return `<div class="result-item"><div class="result-summary ${statusClass}" onclick="this.nextElementSibling.classList.toggle('is-open')">測試 #${i+1}: ${d.status}</div><div class="result-details">${content}</div></div>`;
+            let usage = '';
+            if (d.wall_ms !== undefined) {
+                usage = ` <span style="color: var(--cds-text-secondary); font-weight: 400;">(${d.wall_ms} ms`;
+                if (d.cpu_ms !== null && d.cpu_ms !== undefined) usage += `, CPU ${d.cpu_ms} ms`;
+                if (d.peak_rss_kb !== null && d.peak_rss_kb !== undefined) usage += `, ${(d.peak_rss_kb / 1024).toFixed(1)} MB`;
+                usage += ')</span>';
+            }
+            return `<div class="result-item"><div class="result-summary ${statusClass}" onclick="toggleCase(this)">測試 #${i+1}: ${d.status}${usage}</div><div class="result-details"${lazy}>${content}</div></div>`;
         }).join('');
     }
 
     function rerunCurrent() {
-        if (currentProb) runProblem(null, currentProb);
+        if (currentProb) runProblem(null, currentProb, true);
     }
 
     function closeProblemView() { // Was closeModal
@@ -505,7 +663,7 @@ function updateProgressIndicator() {
     function openHelpModal() {
         document.getElementById('help-modal-overlay').classList.add('is-visible');
         // Load markdown content
-        fetch('/static/help.md')
+        fetch(document.body.dataset.helpUrl || '/static/help.md')
             .then(res => res.text())
             .then(md => {
                 const html = renderMarkdown(md);
@@ -633,25 +791,19 @@ function updateProgressIndicator() {
             <p>執行測試中...</p>
         </div>`;
             
+        const prob = currentProb;
         try {
-            // Add timeout to prevent indefinite loading
-            const controller = new AbortController();
-            const timeoutId = setTimeout(() => controller.abort(), 30000); // 30 second timeout
-            
-            const res = await fetch(`/api/run/${currentProb}`, { 
-                method: 'POST',
-                signal: controller.signal
+            // Results are shown case by case; give up if nothing arrives for 30 seconds
+            const data = await runStreamed(prob, (details) => {
+                if (currentProb === prob) {
+                    document.getElementById('results-container-view').innerHTML = renderTestResults(details);
+                }
+            }, 30000, false, (waitSec) => {
+                if (currentProb === prob) showBusy(waitSec);
             });
-            clearTimeout(timeoutId);
-            
-            if (!res.ok) {
-                throw new Error(`HTTP error! status: ${res.status}`);
-            }
-            
-            const data = await res.json();
             
             // Update the problem data
-            const p = problems.find(x => x.name === currentProb);
+            const p = problems.find(x => x.name === prob);
             if (p) {
                 p.score = data.score;
                 p.total_points = data.total_points;
@@ -665,11 +817,11 @@ function updateProgressIndicator() {
             renderTable();
             
             // Update status badge in header
-            updateHeaderStatus(currentProb);
+            updateHeaderStatus(prob);
             
             // Render results in Results View
             if (data.details && data.details.length > 0) {
-                document.getElementById('results-container-view').innerHTML = renderTestResults(data.details);
+                document.getElementById('results-container-view').innerHTML = renderTestResults(data.details, data.run_id);
             } else {
                 document.getElementById('results-container-view').innerHTML = '<div style="text-align:center; padding: 32px; color: var(--cds-text-secondary);">沒有測試結果</div>';
             }
@@ -679,6 +831,8 @@ function updateProgressIndicator() {
             let errorMsg = '執行失敗';
             if (err.name === 'AbortError') {
                 errorMsg = '執行逾時（超過30秒）';
+            } else if (err.name === 'BusyError') {
+                errorMsg = err.message;
             } else if (err.message) {
                 errorMsg = '執行失敗: ' + err.message;
             }